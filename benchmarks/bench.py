@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the scene queries and the conversion pipeline
+
+Runs against the `stubcmds` stand-in for maya.cmds and the fake converter
+next to this script, so it needs neither Maya nor V-Ray:
+
+    python benchmarks/bench.py --sizes 10,1000,10000 --output before.json
+    # change things
+    python benchmarks/bench.py --sizes 10,1000,10000 --compare before.json
+
+Every benchmark runs on a synthetic scene per size. Conversions are capped
+at --max-textures unique textures, larger scenes share textures between
+nodes like production scenes do.
+"""
+from __future__ import division, print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from img2tiledexrtool import stubcmds  # noqa: E402
+
+stubcmds.install()
+
+from img2tiledexrtool import img2tiledexrtool  # noqa: E402
+from img2tiledexrtool import mayalib  # noqa: E402
+
+FAKE_CONVERTER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'fake_img2tiledexr.py')
+
+BENCHMARKS = ('model_data', 'convert_files', 'revert_nodes',
+              'convert_img_2_exr')
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def latency_stats(values):
+    return {
+        'p50': percentile(values, 0.5),
+        'p90': percentile(values, 0.9),
+        'p99': percentile(values, 0.99),
+        'max': max(values) if values else None,
+    }
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes, None on windows"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on mac
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Bench(object):
+    def __init__(self, args):
+        self.args = args
+        self.root = tempfile.mkdtemp(prefix='img2exr_bench_')
+        self.results = []
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def scene(self, nodes):
+        """Build a stub scene, returns the unique texture paths"""
+        shared = max(1, -(-nodes // self.args.max_textures))
+        texture_dir = os.path.join(self.root, 'textures_{}'.format(nodes))
+        paths = stubcmds.build_scene(nodes, texture_dir, shared=shared)
+        if not os.path.isdir(texture_dir):
+            os.makedirs(texture_dir)
+            data = b'\0' * self.args.texture_size
+            for path in paths:
+                with open(path, 'wb') as f:
+                    f.write(data)
+        # start every conversion from scratch
+        for name in os.listdir(texture_dir):
+            if name.endswith('.exr') or name.endswith('.json'):
+                os.remove(os.path.join(texture_dir, name))
+        return paths
+
+    def measure(self, name, nodes, func, finish=None):
+        """
+        Run func, store its timings merged with the dict it returns
+
+        finish is called with the result to add figures that depend on the
+        time taken.
+        """
+        if self.args.trace_memory:
+            tracemalloc.start()
+        stubcmds.calls.clear()
+        start = time.time()
+        extra = func() or {}
+        seconds = time.time() - start
+        result = {
+            'benchmark': name,
+            'nodes': nodes,
+            'seconds': seconds,
+            'nodes_per_second': nodes / seconds if seconds else None,
+            'cmds_calls': sum(stubcmds.calls.values()),
+            'peak_rss': peak_rss(),
+        }
+        if self.args.trace_memory:
+            result['peak_python_memory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        result.update(extra)
+        if finish is not None:
+            finish(result)
+        self.results.append(result)
+        print(format_result(result))
+        return result
+
+    def model_data(self, nodes):
+        self.scene(nodes)
+
+        def run():
+            mayalib.get_file_texture_model_data()
+        self.measure('model_data', nodes, run)
+
+    def convert_files(self, nodes):
+        paths = self.scene(nodes)
+        data = mayalib.get_file_texture_model_data()
+
+        def run():
+            mayalib.convert_files(FAKE_CONVERTER, data, False,
+                                  threads=self.args.threads)
+            return {'files': len(paths)}
+        self.measure('convert_files', nodes, run)
+
+    def revert_nodes(self, nodes):
+        self.scene(nodes)
+        data = mayalib.get_file_texture_model_data()
+        mayalib.convert_files(FAKE_CONVERTER, data, False,
+                              threads=self.args.threads)
+        self.measure('revert_nodes', nodes,
+                     lambda: mayalib.revert_nodes(data, '_tiled', True,
+                                                  False, ''))
+
+    def convert_img_2_exr(self, nodes):
+        paths = self.scene(nodes)
+        lock = threading.Lock()
+        started = {}
+        durations = []
+        submitted = []
+
+        def on_start(file_in):
+            with lock:
+                started[file_in] = time.time()
+
+        def callback(file_in, file_out, status):
+            with lock:
+                if file_in in started:
+                    durations.append(time.time() - started[file_in])
+
+        def run():
+            submitted.append(time.time())
+            results = img2tiledexrtool.convert_img_2_exr(
+                FAKE_CONVERTER, paths, threads=self.args.threads,
+                on_start=on_start, callback=callback)
+            failed = [r for r in results
+                      if not img2tiledexrtool.is_usable(r[2])]
+            return {'files': len(paths), 'failed': len(failed)}
+
+        def finish(result):
+            waits = [t - submitted[0] for t in started.values()]
+            threads = self.args.threads or img2tiledexrtool.default_threads()
+            result.update({
+                'files_per_second': len(paths) / result['seconds'],
+                'latency': latency_stats(durations),
+                'queue_wait': latency_stats(waits),
+                'threads': threads,
+                'utilisation': sum(durations) / (result['seconds'] * threads),
+            })
+
+        self.measure('convert_img_2_exr', nodes, run, finish)
+
+    def run(self):
+        for nodes in self.args.sizes:
+            for name in self.args.only:
+                getattr(self, name)(nodes)
+
+
+def format_result(result):
+    text = '{benchmark:<18} {nodes:>7} nodes {seconds:9.3f}s'.format(**result)
+    if result['nodes_per_second']:
+        text += ' {:10.0f} nodes/s'.format(result['nodes_per_second'])
+    text += ' {:8d} cmds'.format(result['cmds_calls'])
+    if result.get('latency'):
+        text += ' p50 {p50:.3f}s p99 {p99:.3f}s'.format(**result['latency'])
+        text += ' util {:.0%}'.format(result['utilisation'])
+    return text
+
+
+def compare(results, previous):
+    """Print the time of each benchmark relative to a previous run"""
+    old = dict(((r['benchmark'], r['nodes']), r) for r in previous)
+    for result in results:
+        before = old.get((result['benchmark'], result['nodes']))
+        if before is None or not before['seconds']:
+            continue
+        ratio = result['seconds'] / before['seconds']
+        print('{:<18} {:>7} nodes {:9.3f}s -> {:9.3f}s  x{:.2f}'.format(
+            result['benchmark'], result['nodes'], before['seconds'],
+            result['seconds'], ratio))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='10,1000,10000,50000',
+                        help="comma separated scene sizes in file nodes")
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help="comma separated benchmarks to run, from "
+                             "{}".format(', '.join(BENCHMARKS)))
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--max-textures', type=int, default=1000,
+                        help="unique textures per scene")
+    parser.add_argument('--texture-size', type=int, default=4096,
+                        help="bytes per fake texture")
+    parser.add_argument('--latency', default='0.01',
+                        help="fake converter seconds per file, or min:max")
+    parser.add_argument('--busy', action='store_true',
+                        help="fake converter burns cpu instead of sleeping")
+    parser.add_argument('--output-size', type=int, default=None,
+                        help="fake converter output bytes")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="measure peak python memory, slows down the "
+                             "benchmarks")
+    parser.add_argument('--output', help="write the results as json")
+    parser.add_argument('--compare', help="json of a previous run")
+    args = parser.parse_args(argv)
+    args.sizes = [int(size) for size in args.sizes.split(',')]
+    args.only = [name for name in args.only.split(',') if name]
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmarks: {}".format(', '.join(unknown)))
+    if args.trace_memory and tracemalloc is None:
+        parser.error("--trace-memory needs python 3")
+
+    os.environ['FAKE_IMG2EXR_LATENCY'] = args.latency
+    os.environ['FAKE_IMG2EXR_BUSY'] = '1' if args.busy else '0'
+    if args.output_size is not None:
+        os.environ['FAKE_IMG2EXR_SIZE'] = str(args.output_size)
+
+    bench = Bench(args)
+    try:
+        bench.run()
+    finally:
+        bench.close()
+
+    report = {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': img2tiledexrtool.default_threads(),
+        'arguments': dict((k, v) for k, v in vars(args).items()
+                          if k not in ('output', 'compare')),
+        'results': bench.results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(bench.results, json.load(f)['results'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Stand-in for V-Ray's img2tiledexr, for benchmarks on machines without V-Ray
+
+Takes the same arguments (file_in file_out [-option value ...]), waits a
+while and writes a tiled exr of a given size, with the requested tile size
+and compression in its header and zeros as pixel data. Configured through the environment
+so the converter's command line stays the real one:
+
+    FAKE_IMG2EXR_LATENCY  seconds per file, or min:max for a uniform random
+                          latency (default 0.01)
+    FAKE_IMG2EXR_BUSY     1 to spend the latency in a busy loop instead of
+                          sleeping, like a cpu bound converter
+    FAKE_IMG2EXR_SIZE     output size in bytes, by default the input size
+    FAKE_IMG2EXR_FAIL     fraction of files that fail with exit code 1
+"""
+import os
+import random
+import struct
+import sys
+import time
+
+COMPRESSIONS = ('none', 'rle', 'zips', 'zip', 'piz', 'pxr24', 'b44', 'b44a',
+                'dwaa', 'dwab')
+
+
+def latency():
+    value = os.environ.get('FAKE_IMG2EXR_LATENCY', '0.01')
+    if ':' in value:
+        low, high = value.split(':', 1)
+        return random.uniform(float(low), float(high))
+    return float(value)
+
+
+def attribute(name, kind, value):
+    return (name.encode() + b'\0' + kind.encode() + b'\0' +
+            struct.pack('<i', len(value)) + value)
+
+
+def write_exr(path, size, tile_size=64, compression='zips'):
+    """A single tile, single channel exr padded to size bytes"""
+    box = struct.pack('<iiii', 0, 0, tile_size - 1, tile_size - 1)
+    header = (b'\x76\x2f\x31\x01' + struct.pack('<i', 2 | 0x200) +
+              attribute('channels', 'chlist',
+                        b'Y\0' + struct.pack('<iB3xii', 1, 0, 1, 1) + b'\0') +
+              attribute('compression', 'compression',
+                        struct.pack('<B', COMPRESSIONS.index(compression))) +
+              attribute('dataWindow', 'box2i', box) +
+              attribute('displayWindow', 'box2i', box) +
+              attribute('lineOrder', 'lineOrder', b'\0') +
+              attribute('pixelAspectRatio', 'float', struct.pack('<f', 1)) +
+              attribute('screenWindowCenter', 'v2f', struct.pack('<ff', 0, 0)) +
+              attribute('screenWindowWidth', 'float', struct.pack('<f', 1)) +
+              attribute('tiles', 'tiledesc',
+                        struct.pack('<IIB', tile_size, tile_size, 0)) +
+              b'\0')
+    offset = len(header) + 8
+    data = max(size - offset - 20, 0)
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(struct.pack('<Q', offset))
+        f.write(struct.pack('<iiiii', 0, 0, 0, 0, data))
+        f.write(b'\0' * data)
+
+
+def option(argv, name, default):
+    if name in argv[:-1]:
+        return argv[argv.index(name) + 1]
+    return default
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.stderr.write("usage: fake_img2tiledexr.py file_in file_out "
+                         "[options]\n")
+        return 2
+    file_in, file_out = argv[:2]
+    if not os.path.isfile(file_in):
+        sys.stderr.write("Could not open {}\n".format(file_in))
+        return 1
+
+    seconds = latency()
+    if os.environ.get('FAKE_IMG2EXR_BUSY') == '1':
+        end = time.time() + seconds
+        while time.time() < end:
+            pass
+    else:
+        time.sleep(seconds)
+
+    if random.random() < float(os.environ.get('FAKE_IMG2EXR_FAIL', '0')):
+        sys.stderr.write("Failed to convert {}\n".format(file_in))
+        return 1
+
+    size = os.environ.get('FAKE_IMG2EXR_SIZE')
+    size = int(size) if size else os.path.getsize(file_in)
+    write_exr(file_out, size, int(option(argv, '-tileSize', 64)),
+              option(argv, '-compression', 'zips'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
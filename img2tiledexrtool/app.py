@@ -6,29 +6,82 @@ scene. If a selection is made, it will filter and show all file nodes in your
 selection.
 """
 from avalon.vendor.Qt import QtWidgets, QtCore, QtGui
+import logging
 import os
+import threading
+import time
 
 # Workaround to PyCharm not autocompleting, without mucking in Qt.py source.
 # if False: from PyQt5 import QtWidgets, QtCore, QtGui
 
+from . import backends
+from . import fsstatus
 from . import mayalib
+from . import store
+from . import img2tiledexrtool
+from . import udim
 
 # reload(mayalib)
 
+log = logging.getLogger("img2exr App")
+
 
 class CustomListModel(QtCore.QAbstractListModel):
     """
     Custom model for our listview that shows an icon and node name
+
+    Rows only hold node names, the state and file of a row are read from the
+    scene when the view first asks for them, a block of rows at a time.
+    Scene changes are applied as row inserts, removals and data changes so
+    the view keeps its selection and only repaints what changed.
+
+    With a `fsstatus.StatusScanner` loaded rows also get their files checked
+    on disk in the background, rows with a missing or outdated exr or a
+    missing source get a warning icon.
     """
-    def __init__(self, data, parent=None):
+    # rows loaded together when the view asks for an unloaded row
+    BLOCK_SIZE = 256
+
+    # emitted from the scanner thread, handled on the main thread
+    file_statuses_found = QtCore.Signal(object)
+
+    # file status: (standard icon, shown for every state), otherwise only
+    # for nodes that have been converted before
+    STATUS_ICONS = {
+        fsstatus.SOURCE_MISSING: ('SP_MessageBoxCritical', True),
+        fsstatus.EXR_INVALID: ('SP_MessageBoxCritical', True),
+        fsstatus.EXR_STALE: ('SP_MessageBoxWarning', True),
+        fsstatus.EXR_MISSING: ('SP_MessageBoxWarning', False),
+    }
+
+    def __init__(self, nodes, loader=None, scanner=None, source_loader=None,
+                 postfix='_tiled', parent=None):
+        """
+        Args:
+            nodes: file node names
+            loader: callable taking a list of nodes, returning a dict of
+                node: (state, node, path), defaults to
+                `mayalib.get_file_texture_items`
+            scanner (fsstatus.StatusScanner): checks files on disk, its
+                callback has to be set to `file_statuses_found.emit`
+            source_loader: callable taking a list of nodes, returning a dict
+                of node: source candidates, defaults to
+                `mayalib.get_file_texture_sources`
+            postfix: tiled exr postfix the scanner looks for
+        """
         super(CustomListModel, self).__init__(parent)
-        self.items = data
-        index = QtCore.QModelIndex()
-        self.beginInsertRows(index, 0, len(data))
-        for item in data:
-            self.beginInsertRows(index, 0, 0)
-            pass
-        self.endInsertRows()
+        self.loader = loader or mayalib.get_file_texture_items
+        self.scanner = scanner
+        self.source_loader = source_loader or mayalib.get_file_texture_sources
+        self.postfix = postfix
+        # node: fsstatus status
+        self.file_statuses = {}
+        self.file_statuses_found.connect(self.set_file_statuses)
+        self.nodes = list(nodes)
+        self.row_index = dict((node, row) for row, node in
+                              enumerate(self.nodes))
+        # node: (state, node, path), filled in lazily
+        self.items = {}
 
         self.icons = []
         app_path = os.path.dirname(os.path.realpath(__file__))
@@ -39,25 +92,218 @@ class CustomListModel(QtCore.QAbstractListModel):
         # self.icons.append(QtGui.QIcon('res/source.png'))
         # self.icons.append(QtGui.QIcon('res/exr.png'))
 
+        # node: conversion status text shown next to the node name
+        self.statuses = {}
+
+    def set_file_statuses(self, statuses):
+        """Scanner results, dict of node: fsstatus status"""
+        statuses = dict((node, status) for node, status in statuses.items()
+                        if node in self.row_index)
+        self.file_statuses.update(statuses)
+        self.emit_changed(self.rows(statuses))
+
+    def scan(self, nodes):
+        """Check the files of nodes on disk again"""
+        if self.scanner is None or not nodes:
+            return
+        for node, candidates in self.source_loader(nodes).items():
+            self.scanner.request(node, candidates, self.postfix)
+
+    def set_postfix(self, postfix):
+        if postfix == self.postfix:
+            return
+        self.postfix = postfix
+        self.file_statuses.clear()
+        self.invalidate(self.nodes)
+
+    def set_status(self, nodes, status):
+        """Show a conversion status for nodes, None clears it"""
+        for node in nodes:
+            if status is None:
+                self.statuses.pop(node, None)
+            else:
+                self.statuses[node] = status
+        self.emit_changed(self.rows(nodes))
+
+    def update_item(self, node, state, path):
+        """Update the state and file of a node without rebuilding the list"""
+        if node in self.row_index:
+            self.items[node] = (state, node, path)
+            self.emit_changed(self.rows([node]))
+            self.scan([node])
+
+    def rows(self, nodes):
+        return sorted(self.row_index[node] for node in set(nodes)
+                      if node in self.row_index)
+
+    def emit_changed(self, rows):
+        """Emit dataChanged for rows, one signal per consecutive range"""
+        for first, last in row_ranges(rows):
+            self.dataChanged.emit(self.index(first), self.index(last))
+
+    def invalidate(self, nodes):
+        """Read nodes from the scene again next time they are shown"""
+        for node in nodes:
+            self.items.pop(node, None)
+        self.emit_changed(self.rows(nodes))
+
+    def set_nodes(self, nodes):
+        """Update the list to show nodes, keeps rows that didn't change"""
+        nodes = list(nodes)
+        wanted = set(nodes)
+        self.remove_nodes([node for node in self.nodes if node not in wanted])
+        self.add_nodes(nodes)
+        self.invalidate(nodes)
+
+    def add_nodes(self, nodes):
+        """Append nodes that aren't in the list yet"""
+        new = []
+        for node in nodes:
+            if node not in self.row_index and node not in new:
+                new.append(node)
+        if not new:
+            return
+        first = len(self.nodes)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(new) - 1)
+        for row, node in enumerate(new, first):
+            self.nodes.append(node)
+            self.row_index[node] = row
+        self.endInsertRows()
+
+    def remove_nodes(self, nodes):
+        """Remove nodes, one removal per consecutive range of rows"""
+        rows = self.rows(nodes)
+        if not rows:
+            return
+        # from the bottom up so the earlier ranges keep their rows
+        for first, last in reversed(row_ranges(rows)):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            for node in self.nodes[first:last + 1]:
+                self.items.pop(node, None)
+                self.statuses.pop(node, None)
+                self.file_statuses.pop(node, None)
+            del self.nodes[first:last + 1]
+            self.endRemoveRows()
+        self.row_index = dict((node, row) for row, node in
+                              enumerate(self.nodes))
+
+    def rename_node(self, old_name, new_name):
+        row = self.row_index.pop(old_name, None)
+        if row is None:
+            return
+        self.nodes[row] = new_name
+        self.row_index[new_name] = row
+        self.items.pop(old_name, None)
+        if old_name in self.statuses:
+            self.statuses[new_name] = self.statuses.pop(old_name)
+        if old_name in self.file_statuses:
+            self.file_statuses[new_name] = self.file_statuses.pop(old_name)
+        self.emit_changed([row])
+
+    def item(self, row):
+        node = self.nodes[row]
+        if node not in self.items:
+            block = row - row % self.BLOCK_SIZE
+            missing = [n for n in self.nodes[block:block + self.BLOCK_SIZE]
+                       if n not in self.items]
+            self.items.update(self.loader(missing))
+            # a node that is gone from the scene shows as not converted
+            self.items.setdefault(node, (0, node, None))
+            self.scan(missing)
+        return self.items[node]
+
+    def file_status_icon(self, row):
+        """Standard icon for the file status of a row, or None"""
+        node = self.nodes[row]
+        icon = self.STATUS_ICONS.get(self.file_statuses.get(node))
+        if icon is None:
+            return None
+        name, always = icon
+        if not always and not self.item(row)[0]:
+            return None
+        style = QtWidgets.QApplication.style()
+        return style.standardIcon(getattr(QtWidgets.QStyle, name))
+
     def rowCount(self, parent=None, *args, **kwargs):
-        return len(self.items)
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self.nodes)
 
     def data(self, index, role=None):
         if not index.isValid() or not (
-                0 <= index.row() < len(self.items)):  return QtCore.QVariant()
+                0 <= index.row() < len(self.nodes)):  return QtCore.QVariant()
         if role == QtCore.Qt.DisplayRole:
-            return self.items[index.row()][1]
+            node = self.nodes[index.row()]
+            if node in self.statuses:
+                return '{}  [{}]'.format(node, self.statuses[node])
+            return node
         elif role == QtCore.Qt.DecorationRole:
-            return self.icons[self.items[index.row()][0]]
+            return self.file_status_icon(index.row()) or \
+                self.icons[self.item(index.row())[0]]
+        elif role == QtCore.Qt.ToolTipRole:
+            state, node, path = self.item(index.row())
+            status = self.file_statuses.get(node)
+            if status is None:
+                return path
+            return '{}\n{}'.format(path, status)
         elif role == QtCore.Qt.UserRole:
-            return self.items[index.row()]
+            return self.item(index.row())
 
-    # def addItems(self):
-    #     for key in self.modelDict:
-    #         index=QtCore.QModelIndex()
-    #         self.beginInsertRows(index, 0, 0)
-    #         self.items.append(key)
-    #     self.endInsertRows()
+
+def row_ranges(rows):
+    """Sorted rows as a list of (first, last) consecutive ranges"""
+    ranges = []
+    for row in rows:
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(r) for r in ranges]
+
+
+class BackgroundConversion(QtCore.QObject):
+    """
+    Runs a conversion batch in a background thread
+
+    The signals are emitted from the worker threads, Qt queues them so the
+    connected slots run on the main thread where it's safe to touch Maya.
+    """
+    file_started = QtCore.Signal(str)
+    file_finished = QtCore.Signal(str, str, object)
+    finished = QtCore.Signal()
+
+    def __init__(self, executable, file_paths, parent=None, **kwargs):
+        super(BackgroundConversion, self).__init__(parent)
+        self.executable = executable
+        self.file_paths = file_paths
+        self.kwargs = kwargs
+        self.cancel_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _run(self):
+        try:
+            img2tiledexrtool.convert_img_2_exr(
+                self.executable, self.file_paths,
+                cancel_event=self.cancel_event,
+                callback=self.file_finished.emit,
+                on_start=self.file_started.emit,
+                **self.kwargs)
+        finally:
+            self.finished.emit()
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{:d}:{:02d}:{:02d}'.format(hours, minutes, seconds)
 
 
 # class CustomList(QtWidgets.QListView):
@@ -67,7 +313,7 @@ class CustomListModel(QtCore.QAbstractListModel):
 
 class App(QtWidgets.QWidget):
     """Main application for tiled EXR conversion"""
-    file_nodes = []
+    job = None
 
     def __init__(self, parent=None):
         #QtWidgets.QWidget.__init__(self, parent)
@@ -83,11 +329,12 @@ class App(QtWidgets.QWidget):
 
         self.postfix_value.setText("_tiled")
         self.preserve_filter_value.setText('NORMAL,NORMALS,GLOSS,BUMP,AO,OPACITY,DEPTH,ROUGHNESS')
+        self.create_backend_options()
         self.create_compression_options()
         self.create_linearcolor_options()
 
         self.populate_file_list()
-        self.executable_filename.setText(mayalib.get_tiled_exr_exe_dir())
+        self.update_executable()
 
     def setup_ui(self):
         """Build the initial UI"""
@@ -119,6 +366,14 @@ class App(QtWidgets.QWidget):
         postfix_hlayout.addWidget(postfix_label)
         postfix_hlayout.addWidget(postfix_value)
 
+        backend_hlayout = QtWidgets.QHBoxLayout()
+        backend_label = QtWidgets.QLabel("Converter")
+        backend_value = QtWidgets.QComboBox()
+        backend_value.setToolTip("Tool used to convert, the executable above "
+                                 "overrides the one found on the PATH")
+        backend_hlayout.addWidget(backend_label)
+        backend_hlayout.addWidget(backend_value)
+
         compression_hlayout = QtWidgets.QHBoxLayout()
         compression_label = QtWidgets.QLabel("Compression")
         compression_value = QtWidgets.QComboBox()
@@ -138,6 +393,39 @@ class App(QtWidgets.QWidget):
         tilesize_hlayout.addWidget(tilesize_label)
         tilesize_hlayout.addWidget(tilesize_value)
 
+        threads_hlayout = QtWidgets.QHBoxLayout()
+        threads_label = QtWidgets.QLabel("Threads")
+        threads_value = QtWidgets.QSpinBox()
+        threads_value.setRange(0, 256)
+        threads_value.setValue(0)
+        threads_value.setSpecialValueText("Auto")
+        threads_value.setToolTip("Conversions running at the same time, Auto "
+                                 "uses one per cpu")
+        threads_hlayout.addWidget(threads_label)
+        threads_hlayout.addWidget(threads_value)
+
+        memory_hlayout = QtWidgets.QHBoxLayout()
+        memory_label = QtWidgets.QLabel("Memory Budget (GB)")
+        memory_value = QtWidgets.QSpinBox()
+        memory_value.setRange(0, 4096)
+        memory_value.setValue(0)
+        memory_value.setSpecialValueText("Auto")
+        memory_value.setToolTip("Estimated memory all running conversions may "
+                                "use together, Auto uses half of the RAM")
+        memory_hlayout.addWidget(memory_label)
+        memory_hlayout.addWidget(memory_value)
+
+        timeout_hlayout = QtWidgets.QHBoxLayout()
+        timeout_label = QtWidgets.QLabel("Timeout (min)")
+        timeout_value = QtWidgets.QSpinBox()
+        timeout_value.setRange(0, 24 * 60)
+        timeout_value.setValue(30)
+        timeout_value.setSpecialValueText("None")
+        timeout_value.setToolTip("Kill a single conversion that takes longer "
+                                 "than this")
+        timeout_hlayout.addWidget(timeout_label)
+        timeout_hlayout.addWidget(timeout_value)
+
         overwrite_hlayout = QtWidgets.QHBoxLayout()
         overwrite_label = QtWidgets.QLabel("Overwrite")
         overwrite_value = QtWidgets.QCheckBox()
@@ -145,6 +433,24 @@ class App(QtWidgets.QWidget):
         overwrite_hlayout.addWidget(overwrite_label)
         overwrite_hlayout.addWidget(overwrite_value)
 
+        only_stale_hlayout = QtWidgets.QHBoxLayout()
+        only_stale_label = QtWidgets.QLabel("Update Stale")
+        only_stale_value = QtWidgets.QCheckBox()
+        only_stale_value.setChecked(True)
+        only_stale_value.setToolTip("Reconvert existing EXRs whose source or "
+                                    "options changed since their conversion")
+        only_stale_hlayout.addWidget(only_stale_label)
+        only_stale_hlayout.addWidget(only_stale_value)
+
+        content_hash_hlayout = QtWidgets.QHBoxLayout()
+        content_hash_label = QtWidgets.QLabel("Compare Source Content")
+        content_hash_value = QtWidgets.QCheckBox()
+        content_hash_value.setChecked(False)
+        content_hash_value.setToolTip("Hash sources so touched but unchanged "
+                                      "files are not reconverted (slower)")
+        content_hash_hlayout.addWidget(content_hash_label)
+        content_hash_hlayout.addWidget(content_hash_value)
+
         preserve_hlayout = QtWidgets.QHBoxLayout()
         preserve_label = QtWidgets.QLabel("Preserve Color Space ")
         preserve_value = QtWidgets.QCheckBox()
@@ -159,10 +465,16 @@ class App(QtWidgets.QWidget):
         preserve_filter_hlayout.addWidget(preserve_filter_value)
 
         options_vlayout.addLayout(postfix_hlayout)
+        options_vlayout.addLayout(backend_hlayout)
         options_vlayout.addLayout(compression_hlayout)
         options_vlayout.addLayout(linear_hlayout)
         options_vlayout.addLayout(tilesize_hlayout)
+        options_vlayout.addLayout(threads_hlayout)
+        options_vlayout.addLayout(memory_hlayout)
+        options_vlayout.addLayout(timeout_hlayout)
         options_vlayout.addLayout(overwrite_hlayout)
+        options_vlayout.addLayout(only_stale_hlayout)
+        options_vlayout.addLayout(content_hash_hlayout)
         options_vlayout.addLayout(preserve_hlayout)
         options_vlayout.addLayout(preserve_filter_hlayout)
 
@@ -183,6 +495,9 @@ class App(QtWidgets.QWidget):
         file_node_hlayout.setSpacing(2)
         file_node_list = QtWidgets.QListView()
         file_node_list.setAlternatingRowColors(True)
+        # the view doesn't have to measure every row, which would read the
+        # whole scene up front
+        file_node_list.setUniformItemSizes(True)
         file_node_list.setSelectionBehavior(
             QtWidgets.QAbstractItemView.SelectRows)
         file_node_list.setSelectionMode(
@@ -205,8 +520,23 @@ class App(QtWidgets.QWidget):
         button_vlayout.addWidget(source_button)
         button_vlayout.addWidget(set_source_button)
 
+        # progress
+        progress_hlayout = QtWidgets.QHBoxLayout()
+        progress_bar = QtWidgets.QProgressBar()
+        progress_bar.setValue(0)
+        progress_label = QtWidgets.QLabel("")
+        prioritize_button = QtWidgets.QPushButton("Convert Selected First")
+        prioritize_button.setDisabled(True)
+        cancel_button = QtWidgets.QPushButton("Cancel")
+        cancel_button.setDisabled(True)
+        progress_hlayout.addWidget(progress_bar)
+        progress_hlayout.addWidget(progress_label)
+        progress_hlayout.addWidget(prioritize_button)
+        progress_hlayout.addWidget(cancel_button)
+
         file_node_hlayout.addWidget(file_node_list)
         file_node_hlayout.addLayout(button_vlayout)
+        file_node_hlayout.addLayout(progress_hlayout)
 
         list_type_hlayout.addWidget(refresh_button)
         list_type_hlayout.addLayout(file_node_hlayout)
@@ -220,6 +550,7 @@ class App(QtWidgets.QWidget):
         # Enable access for all methods
         self.file_node_list = file_node_list
         self.postfix_value = postfix_value
+        self.backend_value = backend_value
         self.compression_value = compression_value
         self.linear_value = linear_value
         self.tilesize_value = tilesize_value
@@ -228,7 +559,16 @@ class App(QtWidgets.QWidget):
         self.source_button = source_button
         self.convert_button = convert_button
         self.refresh_button = refresh_button
+        self.progress_bar = progress_bar
+        self.progress_label = progress_label
+        self.cancel_button = cancel_button
+        self.prioritize_button = prioritize_button
+        self.threads_value = threads_value
+        self.memory_value = memory_value
+        self.timeout_value = timeout_value
         self.overwritevalue = overwrite_value
+        self.only_stale_value = only_stale_value
+        self.content_hash_value = content_hash_value
         self.preserve_value = preserve_value
         self.preserve_filter_value = preserve_filter_value
 
@@ -239,26 +579,88 @@ class App(QtWidgets.QWidget):
         self.exr_button.clicked.connect(self.show_exr)
         self.source_button.clicked.connect(self.show_source)
         self.convert_button.clicked.connect(self.convert)
+        self.cancel_button.clicked.connect(self.cancel)
+        self.prioritize_button.clicked.connect(self.prioritize)
+        self.backend_value.currentIndexChanged.connect(self.update_executable)
+
+        self.progress_timer = QtCore.QTimer(self)
+        self.progress_timer.setInterval(1000)
+        self.progress_timer.timeout.connect(self.update_progress)
+
+        # finished nodes are relinked in batches, each batch is one undo
+        # step and one viewport refresh
+        self.pending_relinks = []
+        self.relink_timer = QtCore.QTimer(self)
+        self.relink_timer.setSingleShot(True)
+        self.relink_timer.setInterval(1000)
+        self.relink_timer.timeout.connect(self.relink_finished)
+
+        # scene callbacks fire per node, the list is updated once they
+        # settle down
+        self.scene_timer = QtCore.QTimer(self)
+        self.scene_timer.setSingleShot(True)
+        self.scene_timer.setInterval(200)
+        self.scene_timer.timeout.connect(self.apply_scene_changes)
+        self.scene_watcher = mayalib.SceneWatcher(self.scene_timer.start)
+        self.scene_watcher.start()
+
+        self.status_scanner = fsstatus.StatusScanner(None)
+        self.postfix_value.editingFinished.connect(self.update_postfix)
+
+    def create_backend_options(self):
+        for name in sorted(backends.BACKENDS):
+            self.backend_value.addItem(name)
+        self.backend_value.setCurrentIndex(
+            self.backend_value.findText(backends.DEFAULT_BACKEND))
+
+    def update_executable(self, *args):
+        name = self.backend_value.currentText()
+        backend = backends.get_backend(name)
+        if name == backends.DEFAULT_BACKEND:
+            executable = mayalib.get_tiled_exr_exe_dir()
+        else:
+            executable = getattr(backend, 'executable', None) or ''
+        self.executable_filename.setText(executable)
+        self.executable_filename.setDisabled(backend.in_process)
 
     def create_compression_options(self):
-        compressions = ['none', 'rle', 'zip', 'zips', 'piz', 'pxr24', 'b44',
-                        'b44a', 'dwaa', 'dwab']
-
-        for compression in compressions:
+        for compression in backends.COMPRESSIONS:
             self.compression_value.addItem(compression)
         self.compression_value.setCurrentIndex(3)
 
     def create_linearcolor_options(self):
-        choices = ['auto', 'on', 'off']
-        for choise in choices:
+        for choise in backends.LINEAR_MODES:
             self.linear_value.addItem(choise)
         self.linear_value.setCurrentIndex(2)
 
     def populate_file_list(self):
-        self.file_nodes = mayalib.get_file_texture_model_data()
-        self.file_node_list.reset()
-        table_model = CustomListModel(self.file_nodes)
-        self.file_node_list.setModel(table_model)
+        nodes = mayalib.get_file_texture_nodes()
+        model = self.file_node_list.model()
+        if model is None:
+            model = CustomListModel(nodes, scanner=self.status_scanner,
+                                    postfix=self.postfix_value.text(),
+                                    parent=self)
+            self.status_scanner.callback = model.file_statuses_found.emit
+            self.file_node_list.setModel(model)
+        else:
+            self.status_scanner.cache.invalidate()
+            model.set_nodes(nodes)
+
+    def update_postfix(self):
+        model = self.file_node_list.model()
+        if model is not None:
+            model.set_postfix(self.postfix_value.text())
+
+    def apply_scene_changes(self):
+        model = self.file_node_list.model()
+        added, removed, renamed, changed = self.scene_watcher.take_changes()
+        if model is None:
+            return
+        model.remove_nodes(removed)
+        for old_name, new_name in renamed.items():
+            model.rename_node(old_name, new_name)
+        model.add_nodes(sorted(added))
+        model.invalidate(changed)
 
     def refresh(self):
         # self.create_compression_options()
@@ -276,37 +678,169 @@ class App(QtWidgets.QWidget):
         for id in indices:
             nodes.append(self.file_node_list.model().index(id.row()).data(role=QtCore.Qt.UserRole))
         mayalib.revert_nodes(nodes, self.postfix_value.text(), source, self.preserve_value.isChecked(), self.preserve_filter_value.text())
-        self.refresh()
+        self.file_node_list.model().invalidate([node[1] for node in nodes])
         # for index in indices:
         #     self.file_node_list.selectionModel().select(index,
         #                                                 QtCore.QItemSelectionModel.Select)
 
-    def convert(self):
+    def selected_items(self):
         nodes = []
         indices = self.file_node_list.selectedIndexes()
         for id in indices:
             nodes.append(self.file_node_list.model().index(id.row()).data(role=QtCore.Qt.UserRole))
-        self.convert_button.setDisabled(True)
-        self.source_button.setDisabled(True)
-        self.exr_button.setDisabled(True)
-        #self.set_source_button.setDisabled(True)
-        try:
-            mayalib.convert_files(self.executable_filename.text(), nodes,
-                                  preserve = self.preserve_value.isChecked(),
-                                  threads=8,
-                                  overwrite=self.overwritevalue.isChecked(),
-                                  compression=self.compression_value.currentText(),
-                                  linear=self.linear_value.currentText(),
-                                  postfix=self.postfix_value.text(),
-                                  tile_size=self.tilesize_value.value(),
-                                  preserver_filter=self.preserve_filter_value.text())
-        except Exception as e:
-            raise e
-        finally:
-            self.convert_button.setDisabled(False)
-            self.source_button.setDisabled(False)
-            self.exr_button.setDisabled(False)
-        self.refresh()
+        return nodes
+
+    def convert(self):
+        nodes = self.selected_items()
+        if not nodes or self.job is not None:
+            return
+
+        # query the scene up front, the conversion itself runs in the
+        # background and nodes are relinked here as their files finish
+        self.sources = mayalib.collect_sources([node[1] for node in nodes])
+        self.groups = udim.TileGroups(self.sources, img2tiledexrtool.is_usable)
+        # textures of what the artist works on first
+        priorities = mayalib.file_priorities(
+            self.groups, self.sources,
+            mayalib.context_priorities([node[1] for node in nodes]))
+        self.postfix = self.postfix_value.text()
+        self.preserver_filters = self.preserve_filter_value.text().strip().split(',')
+        self.preserve = self.preserve_value.isChecked()
+        model = self.file_node_list.model()
+        for file_in, source_nodes in self.sources.items():
+            model.set_status([node for node, _ in source_nodes], 'queued')
+
+        self.set_busy(True)
+        self.done_count = 0
+        self.failed_count = 0
+        self.start_time = time.time()
+        self.progress_bar.setRange(0, len(self.groups.files))
+        self.progress_bar.setValue(0)
+
+        backend = backends.get_backend(self.backend_value.currentText(),
+                                       self.executable_filename.text() or None)
+        self.job = BackgroundConversion(backend,
+                                 list(self.groups.files),
+                                 parent=self,
+                                 threads=self.threads_value.value() or None,
+                                 memory_budget=self.memory_value.value() * 1024 ** 3 or None,
+                                 timeout=self.timeout_value.value() * 60 or None,
+                                 overwrite=self.overwritevalue.isChecked(),
+                                 compression=self.compression_value.currentText(),
+                                 linear=self.linear_value.currentText(),
+                                 postfix=self.postfix_value.text(),
+                                 tile_size=self.tilesize_value.value(),
+                                 only_stale=self.only_stale_value.isChecked(),
+                                 content_hash=self.content_hash_value.isChecked(),
+                                 store=store.default_store(),
+                                 priorities=priorities)
+        self.job.file_started.connect(self.on_file_started)
+        self.job.file_finished.connect(self.on_file_finished)
+        self.job.finished.connect(self.on_job_finished)
+        self.job.start()
+        self.progress_timer.start()
+        self.update_progress()
+
+    def prioritize(self):
+        """Move the waiting files of the selected rows to the front"""
+        if self.job is None:
+            return
+        nodes = set(item[1] for item in self.selected_items())
+        sources = set(source for source, source_nodes in self.sources.items()
+                      if any(node in nodes for node, _ in source_nodes))
+        files = [file for file, file_sources in self.groups.files.items()
+                 if sources.intersection(file_sources)]
+        img2tiledexrtool.reprioritize(files)
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.cancel_button.setDisabled(True)
+            self.progress_label.setText("Cancelling...")
+
+    def set_busy(self, busy):
+        self.convert_button.setDisabled(busy)
+        self.source_button.setDisabled(busy)
+        self.exr_button.setDisabled(busy)
+        self.refresh_button.setDisabled(busy)
+        self.cancel_button.setDisabled(not busy)
+        self.prioritize_button.setDisabled(not busy)
+
+    def source_nodes(self, file_in):
+        """Nodes of every source file_in belongs to"""
+        return [item for source in self.groups.sources(file_in)
+                for item in self.sources.get(source, [])]
+
+    def on_file_started(self, file_in):
+        nodes = [node for node, _ in self.source_nodes(file_in)]
+        self.file_node_list.model().set_status(nodes, 'converting')
+
+    def on_file_finished(self, file_in, file_out, status):
+        model = self.file_node_list.model()
+        self.done_count += 1
+        if not img2tiledexrtool.is_usable(status):
+            self.failed_count += 1
+            if status != img2tiledexrtool.STATUS_CANCELLED:
+                log.warning("Failed to convert {}: {}".format(file_in,
+                                                              status))
+
+        # nodes are relinked once every tile of their source is done
+        for source, status in self.groups.finish(file_in, status):
+            source_nodes = self.sources.get(source, [])
+            nodes = [node for node, _ in source_nodes]
+            if img2tiledexrtool.is_usable(status):
+                file_out = img2tiledexrtool.output_path(source, self.postfix)
+                self.status_scanner.cache.invalidate([file_out])
+                for node, color_space in source_nodes:
+                    self.pending_relinks.append((node, source, file_out,
+                                                 color_space))
+                if not self.relink_timer.isActive():
+                    self.relink_timer.start()
+            elif status == img2tiledexrtool.STATUS_CANCELLED:
+                model.set_status(nodes, 'cancelled')
+            else:
+                model.set_status(nodes, 'failed')
+        self.progress_bar.setValue(self.done_count)
+        self.update_progress()
+
+    def relink_finished(self):
+        """Relink the nodes of the sources finished so far, in one undo step"""
+        self.relink_timer.stop()
+        relinks, self.pending_relinks = self.pending_relinks, []
+        if not relinks:
+            return
+        mayalib.relink_nodes(relinks, self.preserve, self.preserver_filters)
+        model = self.file_node_list.model()
+        for node, source, file_out, color_space in relinks:
+            model.update_item(node, 2, file_out)
+        model.set_status([relink[0] for relink in relinks], None)
+
+    def on_job_finished(self):
+        self.relink_finished()
+        self.progress_timer.stop()
+        self.update_progress()
+        self.job = None
+        self.set_busy(False)
+
+    def update_progress(self):
+        if not self.progress_bar.maximum():
+            return
+        elapsed = time.time() - self.start_time
+        text = 'Elapsed {}'.format(format_duration(elapsed))
+        remaining = self.progress_bar.maximum() - self.done_count
+        if self.done_count and remaining:
+            eta = elapsed / self.done_count * remaining
+            text += ', ETA {}'.format(format_duration(eta))
+        if self.failed_count:
+            text += ', {} failed'.format(self.failed_count)
+        self.progress_label.setText(text)
+
+    def closeEvent(self, event):
+        self.cancel()
+        self.scene_timer.stop()
+        self.scene_watcher.stop()
+        self.status_scanner.stop()
+        super(App, self).closeEvent(event)
 
 
 def launch():
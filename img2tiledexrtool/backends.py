@@ -0,0 +1,261 @@
+"""
+Converter backends that turn an image into a tiled exr
+
+Every backend declares the compressions and linear modes it supports.
+Command line backends build an argument list, the worker runs it (with its
+timeout, cancel and watchdog handling). In process backends convert in the
+worker thread itself, without starting a process per file.
+
+Example:
+    backend = get_backend('oiiotool')
+    if backend.available():
+        convert_img_2_exr(backend, files)
+"""
+import os
+import re
+import sys
+
+COMPRESSIONS = ('none', 'rle', 'zip', 'zips', 'piz', 'pxr24', 'b44', 'b44a',
+                'dwaa', 'dwab')
+LINEAR_MODES = ('auto', 'on', 'off')
+
+# OpenImageIO converts sRGB to linear when asked, it has no mode that decides
+# from the image like img2tiledexr's auto
+OIIO_LINEAR_MODES = ('on', 'off')
+
+# compressions added by OpenEXR 2.2
+DWA_COMPRESSIONS = ('dwaa', 'dwab')
+
+
+def find_executable(names):
+    """First of names found on the PATH, None if none is"""
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        for name in names:
+            candidate = os.path.join(directory, name)
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                return candidate
+    return None
+
+
+def oiio_compressions(oiio):
+    """
+    Exr compressions the OpenImageIO module can write, the dwa ones need
+    OpenImageIO built against OpenEXR 2.2 or newer
+    """
+    try:
+        libraries = oiio.get_string_attribute('library_list')
+    except Exception:
+        libraries = ''
+    match = re.search(r'OpenEXR (\d+)\.(\d+)', libraries or '')
+    if match and (int(match.group(1)), int(match.group(2))) < (2, 2):
+        return tuple(c for c in COMPRESSIONS if c not in DWA_COMPRESSIONS)
+    return COMPRESSIONS
+
+
+class ConverterBackend(object):
+    """
+    Base class for backends
+
+    Attributes:
+        name (str): name used to select the backend
+        compressions (tuple): exr compressions the backend can write, every
+            backend declares its own
+        linear_modes (tuple): supported values of the linear option
+        in_process (bool): True when convert() does the work itself instead
+            of returning a command line
+    """
+    name = None
+    compressions = ()
+    linear_modes = ()
+    in_process = False
+
+    def available(self):
+        """Whether the backend can run on this machine"""
+        return True
+
+    def supports(self, options):
+        """
+        Check conversion options
+
+        Returns:
+            None when supported, otherwise the reason why not
+        """
+        if options['compression'] not in self.compressions:
+            return "{} can't write {} compression".format(
+                self.name, options['compression'])
+        if options['linear'] not in self.linear_modes:
+            return "{} doesn't support linear {}".format(self.name,
+                                                         options['linear'])
+        return None
+
+    def command(self, file_in, file_out, options):
+        """Command line converting file_in, for command line backends"""
+        raise NotImplementedError
+
+    def convert(self, file_in, file_out, options):
+        """
+        Convert in this thread, for in process backends
+
+        Returns:
+            None on success, otherwise the failure status
+        """
+        raise NotImplementedError
+
+    def __repr__(self):
+        return '{}()'.format(type(self).__name__)
+
+
+class CommandBackend(ConverterBackend):
+    """A backend running an executable per file"""
+    executable_names = ()
+
+    def __init__(self, executable=None):
+        self.executable = executable or find_executable(self.executable_names)
+
+    def available(self):
+        return bool(self.executable) and os.path.isfile(self.executable)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.executable)
+
+
+class Img2TiledEXRBackend(CommandBackend):
+    """V-Ray's img2tiledexr"""
+    name = 'img2tiledexr'
+    compressions = COMPRESSIONS
+    linear_modes = LINEAR_MODES
+    executable_names = ('img2tiledexr.exe', 'img2tiledexr') \
+        if sys.platform == 'win32' else ('img2tiledexr',)
+
+    def __init__(self, executable=None):
+        super(Img2TiledEXRBackend, self).__init__(
+            executable or os.environ.get('IMG2TILEDEXR'))
+
+    def command(self, file_in, file_out, options):
+        return [self.executable, file_in, file_out,
+                '-compression', options['compression'],
+                '-tileSize', str(options['tile_size']),
+                '-linear', options['linear']]
+
+
+class OIIOToolBackend(CommandBackend):
+    """OpenImageIO's oiiotool"""
+    name = 'oiiotool'
+    compressions = COMPRESSIONS
+    linear_modes = OIIO_LINEAR_MODES
+    executable_names = ('oiiotool.exe', 'oiiotool') \
+        if sys.platform == 'win32' else ('oiiotool',)
+
+    def command(self, file_in, file_out, options):
+        args = [self.executable, file_in]
+        if options['linear'] == 'on':
+            args += ['--colorconvert', 'sRGB', 'linear']
+        args += ['--tile', str(options['tile_size']), str(options['tile_size']),
+                 '--compression', options['compression'],
+                 '-o', file_out]
+        return args
+
+
+class MakeTxBackend(CommandBackend):
+    """OpenImageIO's maketx, writes mipmapped tiled exrs"""
+    name = 'maketx'
+    compressions = COMPRESSIONS
+    linear_modes = OIIO_LINEAR_MODES
+    executable_names = ('maketx.exe', 'maketx') \
+        if sys.platform == 'win32' else ('maketx',)
+
+    def command(self, file_in, file_out, options):
+        args = [self.executable, file_in, '-o', file_out,
+                '--tile', str(options['tile_size']), str(options['tile_size']),
+                '--compression', options['compression']]
+        if options['linear'] == 'on':
+            args += ['--colorconvert', 'sRGB', 'linear']
+        return args
+
+
+class OIIOPythonBackend(ConverterBackend):
+    """
+    Converts in process with the OpenImageIO python bindings
+
+    No process is started per file, which matters for many small images.
+    OpenImageIO releases the GIL while reading and writing, so worker
+    threads convert in parallel. A conversion can't be killed, the timeout
+    and cancel only apply before it starts.
+    """
+    name = 'oiio'
+    linear_modes = OIIO_LINEAR_MODES
+    in_process = True
+
+    def __init__(self, executable=None):
+        self._compressions = None
+
+    @property
+    def compressions(self):
+        """What the installed OpenImageIO writes, none without it"""
+        if self._compressions is None:
+            try:
+                import OpenImageIO as oiio
+            except ImportError:
+                self._compressions = ()
+            else:
+                self._compressions = oiio_compressions(oiio)
+        return self._compressions
+
+    def available(self):
+        try:
+            import OpenImageIO  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def convert(self, file_in, file_out, options):
+        import OpenImageIO as oiio
+
+        buf = oiio.ImageBuf(file_in)
+        if buf.has_error:
+            return buf.geterror()
+        if options['linear'] == 'on':
+            buf = oiio.ImageBufAlgo.colorconvert(buf, 'sRGB', 'linear')
+            if buf.has_error:
+                return buf.geterror()
+        buf.set_write_tiles(options['tile_size'], options['tile_size'])
+        buf.specmod().attribute('compression', options['compression'])
+        if not buf.write(file_out, 'exr'):
+            return buf.geterror() or 'Failed to write {}'.format(file_out)
+        return None
+
+
+# name: backend class
+BACKENDS = dict((cls.name, cls) for cls in (Img2TiledEXRBackend,
+                                            OIIOToolBackend, MakeTxBackend,
+                                            OIIOPythonBackend))
+
+DEFAULT_BACKEND = Img2TiledEXRBackend.name
+
+
+def get_backend(backend=None, executable=None):
+    """
+    Get a backend instance
+
+    Args:
+        backend: backend name, instance or None for img2tiledexr
+        executable (str): executable for command line backends, found on the
+            PATH when not given
+
+    Returns:
+        ConverterBackend
+    """
+    if isinstance(backend, ConverterBackend):
+        return backend
+    try:
+        cls = BACKENDS[backend or DEFAULT_BACKEND]
+    except KeyError:
+        raise ValueError("Unknown backend {}, choose from {}".format(
+            backend, ', '.join(sorted(BACKENDS))))
+    return cls(executable)
+
+
+def available_backends():
+    """Names of the backends that can run on this machine"""
+    return [name for name, cls in sorted(BACKENDS.items())
+            if cls().available()]
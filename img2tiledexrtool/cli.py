@@ -0,0 +1,644 @@
+"""
+Command line interface for the converter, runs without Maya or Qt
+
+Example:
+    python -m img2tiledexrtool convert P:/library/textures/**/*.tga \
+        --executable "C:/Program Files/Chaos Group/V-Ray/Maya 2018 for x64/bin/img2tiledexr.exe" \
+        --compression zips --tile-size 64 --report report.json
+
+    python -m img2tiledexrtool convert --manifest textures.csv --only-stale
+
+    # share conversions between everyone through a content addressed store
+    python -m img2tiledexrtool convert P:/library --store //server/exrstore
+    python -m img2tiledexrtool store gc //server/exrstore --max-size 500
+
+    # convert a share's textures on local disk, copying them in and out
+    python -m img2tiledexrtool convert //server/textures --stage D:/scratch
+
+    # every texture used by a sequence, without opening Maya
+    python -m img2tiledexrtool convert --scene sh010.ma --scene sh020.ma
+
+    # spread a library over several machines through a shared directory
+    python -m img2tiledexrtool queue submit //server/queue P:/library --recursive
+    python -m img2tiledexrtool queue work //server/queue --exit-when-empty
+    python -m img2tiledexrtool queue collect //server/queue --wait --report report.json
+
+    # measure compressions and tile sizes on a sample of a show's textures
+    python -m img2tiledexrtool tune P:/show/textures --recursive --per-class 5
+
+    # convert textures again as they're saved, until ctrl+c
+    python -m img2tiledexrtool watch P:/show/textures --recursive
+    python -m img2tiledexrtool watch --scene sh010.ma
+"""
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+try:
+    import queue as queue_module
+except ImportError:
+    import Queue as queue_module
+
+from . import backends
+from . import farmqueue
+from . import img2tiledexrtool
+from . import journal as batch_journal
+from . import mascene
+from . import report as batch_report
+from . import staging as batch_staging
+from . import store as conversion_store
+from . import tuning
+from . import watch
+
+log = logging.getLogger("img2exr CLI")
+
+def read_manifest(path):
+    """
+    Read the source files from a job manifest
+
+    JSON manifests hold a list of paths, a list of objects with a "source"
+    key or an object with a "files" list of either. CSV manifests have the
+    path in the first column, or in a "source" column when there is a header.
+
+    Returns:
+        list of source paths
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, 'r') as f:
+            rows = [row for row in csv.reader(f) if row]
+        if rows and 'source' in rows[0]:
+            column = rows[0].index('source')
+            rows = rows[1:]
+        else:
+            column = 0
+        return [row[column].strip() for row in rows if len(row) > column]
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('files', [])
+    return [item['source'] if isinstance(item, dict) else item
+            for item in data]
+
+
+def _glob(pattern):
+    try:
+        return glob.glob(pattern, recursive=True)
+    except TypeError:
+        # python 2 has no recursive globbing
+        return glob.glob(pattern)
+
+
+def expand_paths(patterns, postfix='_tiled', recursive=False):
+    """
+    Expand files, directories and glob patterns into source images
+
+    Directories yield the supported images in them, skipping files that
+    look like our own converted output.
+    """
+    output_suffix = '{}.exr'.format(postfix).lower()
+    paths = []
+    for pattern in patterns:
+        matches = _glob(pattern) if glob.has_magic(pattern) else [pattern]
+        for match in sorted(matches):
+            if os.path.isdir(match):
+                for root, dirs, files in os.walk(match):
+                    if not recursive:
+                        dirs[:] = []
+                    for name in sorted(files):
+                        lower = name.lower()
+                        if lower.endswith(img2tiledexrtool.SUPPORTED_EXTENSIONS) \
+                                and not lower.endswith(output_suffix) \
+                                and not img2tiledexrtool.is_temp_output(lower):
+                            paths.append(os.path.join(root, name))
+            elif os.path.isfile(match):
+                paths.append(match)
+            else:
+                log.warning("No such file: {}".format(match))
+    return paths
+
+
+def collect_inputs(args):
+    """Source files from the manifest, scenes and paths arguments"""
+    paths = []
+    if args.manifest:
+        paths.extend(read_manifest(args.manifest))
+    for scene in args.scene or []:
+        paths.extend(mascene.conversion_sources(mascene.read_scene(scene)))
+    paths.extend(expand_paths(args.paths, postfix=args.postfix,
+                              recursive=args.recursive))
+    return paths
+
+
+def add_input_arguments(parser):
+    """Arguments that select what to convert"""
+    parser.add_argument('paths', nargs='*',
+                        help="files, directories or glob patterns")
+    parser.add_argument('--manifest', help="JSON or CSV list of files")
+    parser.add_argument('--scene', action='append',
+                        help="Maya ASCII scene to convert the file textures "
+                             "of, can be used more than once")
+    parser.add_argument('--recursive', action='store_true',
+                        help="search directories recursively")
+
+
+def add_backend_arguments(parser):
+    parser.add_argument('--backend', default=backends.DEFAULT_BACKEND,
+                        choices=sorted(backends.BACKENDS))
+    parser.add_argument('--executable', default=None,
+                        help="converter path, defaults to the PATH (or "
+                             "$IMG2TILEDEXR for img2tiledexr)")
+
+
+def add_conversion_arguments(parser):
+    """Options shared by the commands that convert"""
+    add_backend_arguments(parser)
+    parser.add_argument('--compression', default='zips',
+                        choices=backends.COMPRESSIONS)
+    parser.add_argument('--tile-size', type=int, default=64)
+    parser.add_argument('--linear', default='off',
+                        choices=backends.LINEAR_MODES)
+    parser.add_argument('--postfix', default='_tiled')
+    parser.add_argument('--threads', type=int, default=None,
+                        help="conversions at the same time, defaults to the "
+                             "number of cpus")
+    parser.add_argument('--memory-budget', type=float, default=None,
+                        help="GB the running conversions may use together")
+    parser.add_argument('--overwrite', action='store_true')
+    parser.add_argument('--only-stale', action='store_true',
+                        help="reconvert existing files whose source or "
+                             "options changed")
+    parser.add_argument('--content-hash', action='store_true')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="seconds a single conversion may take")
+    parser.add_argument('--retries', type=int, default=0)
+
+
+def conversion_kwargs(args):
+    """convert_img_2_exr keyword arguments from parsed arguments"""
+    memory_budget = None
+    if args.memory_budget is not None:
+        memory_budget = int(args.memory_budget * 1024 ** 3)
+    return dict(threads=args.threads,
+                overwrite=args.overwrite,
+                postfix=args.postfix,
+                compression=args.compression,
+                tile_size=args.tile_size,
+                linear=args.linear,
+                only_stale=args.only_stale,
+                content_hash=args.content_hash,
+                memory_budget=memory_budget,
+                timeout=args.timeout,
+                retries=args.retries)
+
+
+def get_backend(args):
+    backend = backends.get_backend(args.backend, args.executable)
+    if not backend.available():
+        raise SystemExit("{} is not available, use --executable or another "
+                         "--backend".format(backend.name))
+    return backend
+
+
+def get_staging(args):
+    """StagingArea from the --stage arguments, None when not staging"""
+    if not args.stage:
+        return None
+    bandwidth = None
+    if args.volume_bandwidth:
+        bandwidth = args.volume_bandwidth * 1024 ** 2
+    throttle = batch_staging.VolumeThrottle(transfers=args.volume_transfers,
+                                            bytes_per_second=bandwidth)
+    return batch_staging.StagingArea(args.stage, prefetch=args.prefetch,
+                                     write_back=args.write_back,
+                                     ahead=args.stage_ahead,
+                                     throttle=throttle)
+
+
+def get_store(args):
+    """ConversionStore from the --store arguments, None when not used"""
+    if not args.store:
+        return None
+    max_size = None
+    if args.store_max_size is not None:
+        max_size = int(args.store_max_size * 1024 ** 3)
+    return conversion_store.ConversionStore(args.store, max_size=max_size,
+                                            link=args.store_link)
+
+
+def write_report(path, report):
+    if path == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def run_convert(args):
+    backend = get_backend(args)
+    paths = collect_inputs(args)
+    if not paths:
+        log.error("Nothing to convert")
+        return 1
+
+    kwargs = conversion_kwargs(args)
+    start = time.time()
+    metrics = batch_report.BatchReport(slowest=args.slowest)
+    staging = get_staging(args)
+    store = get_store(args)
+    journal = None
+    if args.journal:
+        journal = batch_journal.BatchJournal(args.journal, options=kwargs)
+    # duplicates are converted once, count what the batch will yield
+    total = len(set(img2tiledexrtool.path_key(path) for path in paths))
+    results = []
+    try:
+        for count, result in enumerate(
+                img2tiledexrtool.iter_convert_img_2_exr(backend, paths,
+                                                        report=metrics,
+                                                        journal=journal,
+                                                        staging=staging,
+                                                        store=store,
+                                                        **kwargs), 1):
+            log.info("[{}/{}] {} {}".format(count, total,
+                                            'ok' if result.ok else 'FAILED',
+                                            result.file_in))
+            if not result.ok:
+                log.warning(result.status)
+            results.append(result.as_dict())
+    finally:
+        if journal is not None:
+            journal.close()
+        if store is not None:
+            store.close()
+
+    failed = len([r for r in results if not r['ok']])
+    report = {'backend': repr(backend),
+              'options': kwargs,
+              'started': start,
+              'duration': time.time() - start,
+              'total': len(results),
+              'failed': failed,
+              'metrics': metrics.summary(),
+              'results': results}
+    if args.report:
+        write_report(args.report, report)
+    return 1 if failed else 0
+
+
+def split_list(value, convert=str):
+    return [convert(item.strip()) for item in value.split(',') if item.strip()]
+
+
+def run_tune(args):
+    backend = get_backend(args)
+    paths = collect_inputs(args)
+    if not paths:
+        log.error("Nothing to measure")
+        return 1
+
+    classes = split_list(args.classes.upper())
+    compressions = split_list(args.compressions)
+    unknown = set(compressions) - set(backends.COMPRESSIONS)
+    if unknown:
+        log.error("Unknown compressions: {}".format(', '.join(sorted(unknown))))
+        return 1
+    measurements = tuning.tune(backend, paths, classes=classes,
+                               compressions=compressions,
+                               tile_sizes=split_list(args.tile_sizes, int),
+                               per_class=args.per_class, linear=args.linear,
+                               threads=args.threads, workdir=args.workdir,
+                               seed=args.seed)
+    weights = {'size': args.size_weight, 'read': args.read_weight,
+               'encode': args.encode_weight}
+    recommendations = tuning.recommend(measurements, weights,
+                                       allow_lossy=args.allow_lossy)
+    print(tuning.format_table(measurements, recommendations))
+    print('')
+    for texture_class, best in recommendations.items():
+        print('{:<13} {compression} {tile_size}'.format(texture_class, **best))
+    if args.report:
+        write_report(args.report, {
+            'backend': repr(backend),
+            'weights': weights,
+            'measurements': [m._asdict() for m in measurements],
+            'recommendations': recommendations})
+    return 0
+
+
+def run_store_gc(args):
+    max_size = None
+    if args.max_size is not None:
+        max_size = int(args.max_size * 1024 ** 3)
+    with conversion_store.ConversionStore(args.root) as store:
+        write_report('-', store.gc(max_size))
+    return 0
+
+
+def run_store_stats(args):
+    with conversion_store.ConversionStore(args.root) as store:
+        write_report('-', store.stats())
+    return 0
+
+
+def summarize(results, duration=None):
+    failed = len([r for r in results if not r['ok']])
+    report = {'total': len(results),
+              'failed': failed,
+              'results': results}
+    if duration is not None:
+        report['duration'] = duration
+    return report
+
+
+def run_queue_submit(args):
+    paths = collect_inputs(args)
+    queue = farmqueue.FarmQueue(args.queue)
+    options = conversion_kwargs(args)
+    ids = queue.submit([os.path.abspath(p) for p in paths], options)
+    log.info("Submitted {} jobs to {}".format(len(ids), args.queue))
+    return 0
+
+
+def run_queue_work(args):
+    queue = farmqueue.FarmQueue(args.queue, stale_timeout=args.stale_timeout)
+    memory_budget = None
+    if args.memory_budget is not None:
+        memory_budget = int(args.memory_budget * 1024 ** 3)
+    worker = farmqueue.FarmWorker(queue, get_backend(args),
+                                  threads=args.threads,
+                                  memory_budget=memory_budget,
+                                  worker_id=args.worker_id)
+    try:
+        worker.run(exit_when_empty=args.exit_when_empty)
+    except KeyboardInterrupt:
+        worker.stop()
+    return 0
+
+
+def run_queue_collect(args):
+    queue = farmqueue.FarmQueue(args.queue, stale_timeout=args.stale_timeout)
+    start = time.time()
+    results = queue.collect(wait=args.wait, interval=args.interval,
+                            timeout=args.timeout)
+    report = summarize(results, time.time() - start)
+    report['queue'] = queue.counts()
+    if args.report:
+        write_report(args.report, report)
+    log.info("{} results, {} failed, queue: {}".format(
+        report['total'], report['failed'], report['queue']))
+    return 1 if report['failed'] else 0
+
+
+def run_queue_status(args):
+    queue = farmqueue.FarmQueue(args.queue)
+    write_report('-', queue.counts())
+    return 0
+
+
+def run_scan(args):
+    nodes = []
+    for scene in args.scenes:
+        nodes.extend(mascene.read_scene(scene, references=not args.no_references))
+    report = {'nodes': [node._asdict() for node in nodes],
+              'sources': mascene.conversion_sources(nodes)}
+    write_report(args.report or '-', report)
+    return 0
+
+
+def run_watch(args):
+    backend = get_backend(args)
+    sources = []
+    for scene in args.scene or []:
+        sources.extend(mascene.conversion_sources(mascene.read_scene(scene)))
+    matcher = watch.SourceMatcher(sources) if args.scene else None
+    directories = list(args.paths)
+    if matcher is not None:
+        directories.extend(matcher.directories())
+    directories = directories or watch.configured_directories()
+    if not directories:
+        log.error("Nothing to watch, give directories, scenes or set "
+                  "$IMG2EXR_WATCH")
+        return 1
+
+    kwargs = conversion_kwargs(args)
+    # changed sources are stale, the others are skipped
+    kwargs['only_stale'] = True
+    store = get_store(args)
+    changes = queue_module.Queue()
+    watcher = watch.SourceWatcher(changes.put, directories,
+                                  recursive=args.recursive,
+                                  interval=args.interval,
+                                  debounce=args.debounce,
+                                  postfix=args.postfix)
+    watcher.start()
+    log.info("Watching {} directories".format(len(directories)))
+    failed = 0
+    try:
+        while True:
+            try:
+                # wakes up now and then so ctrl+c gets through
+                files = changes.get(timeout=1.0)
+            except queue_module.Empty:
+                continue
+            if matcher is not None:
+                files = [f for f in files if matcher.match(f)]
+            if not files:
+                continue
+            log.info("{} sources changed".format(len(files)))
+            for result in img2tiledexrtool.iter_convert_img_2_exr(
+                    backend, files, store=store, **kwargs):
+                log.info("{} {}".format('ok' if result.ok else 'FAILED',
+                                        result.file_in))
+                if not result.ok:
+                    log.warning(result.status)
+                    failed += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        if store is not None:
+            store.close()
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='img2tiledexrtool',
+        description="Convert images to tiled exr files")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    commands = parser.add_subparsers(dest='command')
+
+    convert = commands.add_parser('convert', help="convert images")
+    add_input_arguments(convert)
+    convert.add_argument('--report', help="write a JSON report, - for stdout")
+    convert.add_argument('--slowest', type=int, default=10,
+                         help="slowest files listed in the report")
+    convert.add_argument('--journal',
+                         help="record progress in this file, running again "
+                              "with the same journal resumes the batch")
+    convert.add_argument('--stage', metavar='SCRATCH',
+                         help="copy sources to this local directory, convert "
+                              "there and copy the exrs back")
+    convert.add_argument('--prefetch', type=int, default=2,
+                         help="threads copying sources to scratch")
+    convert.add_argument('--write-back', type=int, default=2,
+                         help="threads copying exrs back")
+    convert.add_argument('--stage-ahead', type=int, default=None,
+                         help="sources staged ahead of the conversions")
+    convert.add_argument('--volume-transfers', type=int, default=2,
+                         help="copies at the same time per drive or share")
+    convert.add_argument('--volume-bandwidth', type=float, default=None,
+                         help="MB/s per drive or share")
+    convert.add_argument('--store',
+                         help="shared store directory, files converted "
+                              "before are taken from it")
+    convert.add_argument('--store-max-size', type=float, default=None,
+                         help="GB the store may grow to before evicting")
+    convert.add_argument('--store-link', default='hardlink',
+                         choices=conversion_store.LINK_MODES,
+                         help="how stored exrs are put at their output path")
+    add_conversion_arguments(convert)
+    convert.set_defaults(func=run_convert)
+
+    scan = commands.add_parser('scan', help="list the file textures of "
+                                            "Maya ASCII scenes")
+    scan.add_argument('scenes', nargs='+')
+    scan.add_argument('--no-references', action='store_true')
+    scan.add_argument('--report', help="write JSON here instead of stdout")
+    scan.set_defaults(func=run_scan)
+
+    tune = commands.add_parser('tune', help="measure compressions and tile "
+                                           "sizes per texture class")
+    add_input_arguments(tune)
+    add_backend_arguments(tune)
+    tune.add_argument('--classes', default=','.join(tuning.DEFAULT_CLASSES),
+                      help="comma separated texture classes, matched in the "
+                           "file names")
+    tune.add_argument('--compressions', default=','.join(backends.COMPRESSIONS),
+                      help="comma separated compressions to try")
+    tune.add_argument('--tile-sizes',
+                      default=','.join(str(size) for size
+                                       in tuning.DEFAULT_TILE_SIZES),
+                      help="comma separated tile sizes to try")
+    tune.add_argument('--per-class', type=int, default=3,
+                      help="textures measured per class")
+    tune.add_argument('--seed', type=int, default=0,
+                      help="seed of the random sample")
+    tune.add_argument('--linear', default='off',
+                      choices=backends.LINEAR_MODES)
+    tune.add_argument('--postfix', default='_tiled',
+                      help="postfix of converted files to skip in "
+                           "directories")
+    tune.add_argument('--threads', type=int, default=1,
+                      help="conversions at the same time, more than one "
+                           "makes the encode times less reliable")
+    tune.add_argument('--workdir',
+                      help="scratch directory, a temporary one by default")
+    tune.add_argument('--size-weight', type=float,
+                      default=tuning.DEFAULT_WEIGHTS['size'])
+    tune.add_argument('--read-weight', type=float,
+                      default=tuning.DEFAULT_WEIGHTS['read'])
+    tune.add_argument('--encode-weight', type=float,
+                      default=tuning.DEFAULT_WEIGHTS['encode'])
+    tune.add_argument('--allow-lossy', action='store_true',
+                      help="also recommend lossy compressions")
+    tune.add_argument('--report', help="write a JSON report, - for stdout")
+    tune.set_defaults(func=run_tune)
+
+    watcher = commands.add_parser('watch', help="convert sources again when "
+                                                "they change")
+    watcher.add_argument('paths', nargs='*',
+                         help="directories to watch, $IMG2EXR_WATCH when "
+                              "neither these nor scenes are given")
+    watcher.add_argument('--scene', action='append',
+                         help="Maya ASCII scene to watch the sources of, "
+                              "can be used more than once")
+    watcher.add_argument('--recursive', action='store_true',
+                         help="watch subdirectories too")
+    watcher.add_argument('--interval', type=float, default=2.0,
+                         help="seconds between polls")
+    watcher.add_argument('--debounce', type=float, default=2.0,
+                         help="seconds a file has to stay unchanged before "
+                              "it's converted")
+    watcher.add_argument('--store',
+                         help="shared store directory, files converted "
+                              "before are taken from it")
+    watcher.add_argument('--store-max-size', type=float, default=None,
+                         help="GB the store may grow to before evicting")
+    watcher.add_argument('--store-link', default='hardlink',
+                         choices=conversion_store.LINK_MODES,
+                         help="how stored exrs are put at their output path")
+    add_conversion_arguments(watcher)
+    watcher.set_defaults(func=run_watch)
+
+    shared = commands.add_parser('store', help="maintain a conversion "
+                                               "store")
+    store_commands = shared.add_subparsers(dest='store_command')
+    gc = store_commands.add_parser('gc', help="remove missing and orphaned "
+                                              "exrs and evict")
+    gc.add_argument('root', help="store directory")
+    gc.add_argument('--max-size', type=float, default=None,
+                    help="GB to evict down to")
+    gc.set_defaults(func=run_store_gc)
+    stats = store_commands.add_parser('stats', help="count stored exrs")
+    stats.add_argument('root', help="store directory")
+    stats.set_defaults(func=run_store_stats)
+
+    farm = commands.add_parser('queue', help="convert through a shared "
+                                             "directory work queue")
+    farm_commands = farm.add_subparsers(dest='queue_command')
+
+    submit = farm_commands.add_parser('submit', help="add jobs")
+    submit.add_argument('queue', help="queue directory")
+    add_input_arguments(submit)
+    add_conversion_arguments(submit)
+    submit.set_defaults(func=run_queue_submit)
+
+    work = farm_commands.add_parser('work', help="convert jobs from a queue")
+    work.add_argument('queue', help="queue directory")
+    add_backend_arguments(work)
+    work.add_argument('--threads', type=int, default=None)
+    work.add_argument('--memory-budget', type=float, default=None)
+    work.add_argument('--worker-id', default=None)
+    work.add_argument('--stale-timeout', type=float, default=120.0,
+                      help="seconds before claims of a silent worker are "
+                           "reclaimed")
+    work.add_argument('--exit-when-empty', action='store_true')
+    work.set_defaults(func=run_queue_work)
+
+    collect = farm_commands.add_parser('collect', help="gather results")
+    collect.add_argument('queue', help="queue directory")
+    collect.add_argument('--wait', action='store_true',
+                         help="wait until all jobs are done")
+    collect.add_argument('--interval', type=float, default=5.0)
+    collect.add_argument('--timeout', type=float, default=None)
+    collect.add_argument('--stale-timeout', type=float, default=120.0)
+    collect.add_argument('--report', help="write a JSON report, - for stdout")
+    collect.set_defaults(func=run_queue_collect)
+
+    status = farm_commands.add_parser('status', help="count jobs")
+    status.add_argument('queue', help="queue directory")
+    status.set_defaults(func=run_queue_status)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        return 2
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
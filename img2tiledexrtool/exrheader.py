@@ -0,0 +1,340 @@
+"""
+Read and check exr headers without loading pixels
+
+Only the header attributes and two entries of the chunk offset table are
+read, a few kilobytes per file, so checking thousands of exrs stays cheap.
+Used to make sure a converter really wrote a complete tiled exr with the
+tile size and compression we asked for.
+
+Example:
+    header = read_header('P:/textures/grass_CLR01_tiled.exr')
+    header.tile_size, header.compression    # (64, 64), 'zips'
+    validate('P:/textures/grass_CLR01_tiled.exr', tile_size=64,
+             compression='zips')            # None when it's fine
+"""
+import collections
+import os
+import struct
+import threading
+
+MAGIC = b'\x76\x2f\x31\x01'
+
+# compression attribute values, in the order of the exr enum
+COMPRESSIONS = ('none', 'rle', 'zips', 'zip', 'piz', 'pxr24', 'b44', 'b44a',
+                'dwaa', 'dwab')
+
+# scanlines per chunk of scanline images, by compression
+LINES_PER_CHUNK = {'none': 1, 'rle': 1, 'zips': 1, 'zip': 16, 'pxr24': 16,
+                   'piz': 32, 'b44': 32, 'b44a': 32, 'dwaa': 32, 'dwab': 256}
+
+LEVEL_MODES = ('one', 'mipmap', 'ripmap')
+
+_TILED = 0x200
+_DEEP = 0x800
+_MULTIPART = 0x1000
+
+# headers bigger than this are considered broken
+MAX_HEADER = 1024 * 1024
+
+class EXRHeader(collections.namedtuple(
+        'EXRHeader', 'version tiled tile_size level_mode compression '
+                     'data_window channels multipart chunks complete')):
+    """
+    Header of the first part of an exr
+
+    Attributes:
+        version (int): format version and flags
+        tiled (bool): whether the image is stored in tiles
+        tile_size: (width, height) of the tiles, None for scanline images
+        level_mode (str): 'one', 'mipmap' or 'ripmap', None for scanlines
+        compression (str): one of COMPRESSIONS
+        data_window: (xmin, ymin, xmax, ymax)
+        channels: channel names
+        multipart (bool): more parts follow, only the first is read
+        chunks (int): entries in the chunk offset table
+        complete (bool): the offset table and last chunk are within the
+            file, False for files that were cut off or never finished, None
+            when unknown (multipart files)
+    """
+    __slots__ = ()
+
+
+class _Reader(object):
+    """Reads from a buffer of the file's start, more when needed"""
+    def __init__(self, f, block_size=16 * 1024):
+        self.f = f
+        self.block_size = block_size
+        self.data = f.read(block_size)
+        self.pos = 0
+
+    def _need(self, count):
+        while self.pos + count > len(self.data):
+            if len(self.data) >= MAX_HEADER:
+                raise ValueError("Header too large")
+            more = self.f.read(self.block_size)
+            if not more:
+                raise ValueError("Truncated header")
+            self.data += more
+
+    def read(self, count):
+        self._need(count)
+        value = self.data[self.pos:self.pos + count]
+        self.pos += count
+        return value
+
+    def string(self):
+        while True:
+            end = self.data.find(b'\x00', self.pos)
+            if end != -1:
+                value = self.data[self.pos:end]
+                self.pos = end + 1
+                return value
+            self._need(len(self.data) - self.pos + 1)
+
+    def read_at(self, offset, count):
+        """Bytes at an absolute offset, from the buffer when it has them"""
+        if offset + count <= len(self.data):
+            return self.data[offset:offset + count]
+        self.f.seek(offset)
+        return self.f.read(count)
+
+
+def channel_list(value):
+    """
+    Channels of a chlist attribute
+
+    Returns:
+        tuple of (name, pixel type), pixel types are 0 uint, 1 half, 2 float
+    """
+    channels = []
+    pos = 0
+    while pos < len(value) and value[pos:pos + 1] != b'\x00':
+        end = value.index(b'\x00', pos)
+        pixel_type = struct.unpack('<i', value[end + 1:end + 5])[0]
+        channels.append((value[pos:end].decode('utf-8', 'replace'),
+                         pixel_type))
+        pos = end + 1 + 16
+    return tuple(channels)
+
+
+def _level_count(size, rounding):
+    levels = 1
+    while size > 1:
+        size = (size + rounding) // 2
+        levels += 1
+    return levels
+
+
+def _tiles(length, tile):
+    return -(-length // tile)
+
+
+def _chunk_count(width, height, tile_size, level_mode, rounding):
+    """Tiles of all levels of a tiled image"""
+    tile_w, tile_h = tile_size
+    if level_mode == 'one':
+        return _tiles(width, tile_w) * _tiles(height, tile_h)
+
+    def level_size(size, level):
+        divisor = 2 ** level
+        if rounding:
+            return max(-(-size // divisor), 1)
+        return max(size // divisor, 1)
+
+    if level_mode == 'mipmap':
+        levels = _level_count(max(width, height), rounding)
+        return sum(_tiles(level_size(width, l), tile_w) *
+                   _tiles(level_size(height, l), tile_h)
+                   for l in range(levels))
+    x_levels = _level_count(width, rounding)
+    y_levels = _level_count(height, rounding)
+    return (sum(_tiles(level_size(width, l), tile_w) for l in range(x_levels)) *
+            sum(_tiles(level_size(height, l), tile_h)
+                for l in range(y_levels)))
+
+
+def _attributes(reader):
+    if reader.read(4) != MAGIC:
+        return None
+    version = struct.unpack('<i', reader.read(4))[0]
+    attrs = {}
+    while True:
+        name = reader.string()
+        if not name:
+            break
+        kind = reader.string()
+        size = struct.unpack('<i', reader.read(4))[0]
+        if size < 0:
+            raise ValueError("Broken attribute {}".format(name))
+        attrs[name] = (kind, reader.read(size))
+    return version, attrs
+
+
+def read_attributes(f):
+    """
+    Raw header attributes of the exr open in f, read from its start
+
+    Returns:
+        (version, dict of name: (type, value bytes)), None when it isn't an
+        exr. Raises ValueError or struct.error for broken headers.
+    """
+    f.seek(0)
+    return _attributes(_Reader(f))
+
+
+def _parse(f, file_size):
+    reader = _Reader(f)
+    attributes = _attributes(reader)
+    if attributes is None:
+        return None
+    version, attrs = attributes
+    tiled = bool(version & _TILED)
+    multipart = bool(version & _MULTIPART)
+    if b'dataWindow' not in attrs or b'compression' not in attrs:
+        return None
+    data_window = struct.unpack('<iiii', attrs[b'dataWindow'][1][:16])
+    compression_id = ord(attrs[b'compression'][1][:1])
+    compression = COMPRESSIONS[compression_id] \
+        if compression_id < len(COMPRESSIONS) else str(compression_id)
+    channels = tuple(name for name, _ in channel_list(attrs[b'channels'][1])) \
+        if b'channels' in attrs else ()
+    tile_size = level_mode = None
+    rounding = 0
+    if b'tiles' in attrs:
+        tile_w, tile_h, mode = struct.unpack('<IIB', attrs[b'tiles'][1][:9])
+        tile_size = (tile_w, tile_h)
+        level_mode = LEVEL_MODES[mode & 0x0f] \
+            if mode & 0x0f < len(LEVEL_MODES) else str(mode & 0x0f)
+        rounding = mode >> 4
+        tiled = True
+
+    width = data_window[2] - data_window[0] + 1
+    height = data_window[3] - data_window[1] + 1
+    if width <= 0 or height <= 0:
+        raise ValueError("Empty data window")
+    if b'chunkCount' in attrs:
+        chunks = struct.unpack('<i', attrs[b'chunkCount'][1][:4])[0]
+    elif tiled and tile_size and tile_size[0] and tile_size[1] \
+            and level_mode in LEVEL_MODES:
+        chunks = _chunk_count(width, height, tile_size, level_mode, rounding)
+    else:
+        chunks = _tiles(height, LINES_PER_CHUNK.get(compression, 1))
+
+    complete = None
+    if not multipart and not version & _DEEP:
+        table = reader.pos
+        table_end = table + chunks * 8
+        first = reader.read_at(table, 8)
+        last = reader.read_at(table_end - 8, 8)
+        complete = False
+        if len(first) == 8 and len(last) == 8:
+            first = struct.unpack('<Q', first)[0]
+            last = struct.unpack('<Q', last)[0]
+            # tile coordinates and level, or the scanline, then data size
+            prefix = 16 if tiled else 4
+            if table_end <= first < file_size and \
+                    table_end <= last < file_size - prefix - 4:
+                size = struct.unpack('<i', reader.read_at(last + prefix,
+                                                          4))[0]
+                complete = 0 <= size and last + prefix + 4 + size <= file_size
+
+    return EXRHeader(version & 0xff, tiled, tile_size, level_mode,
+                     compression, data_window, channels, multipart, chunks,
+                     complete)
+
+
+def read_header(path):
+    """
+    Read the header of an exr
+
+    Returns:
+        EXRHeader, None when the file isn't an exr or its header is broken
+    """
+    try:
+        with open(path, 'rb') as f:
+            return _parse(f, os.fstat(f.fileno()).st_size)
+    except (IOError, OSError, struct.error, ValueError, IndexError,
+            TypeError):
+        return None
+
+
+def check_header(header, tile_size=None, compression=None):
+    """
+    What's wrong with a header for use as a tiled texture
+
+    Returns:
+        None when it's fine, otherwise the problem
+    """
+    if header is None:
+        return "not an exr or its header is broken"
+    if not header.tiled or not header.tile_size:
+        return "not tiled"
+    if header.complete is False:
+        return "incomplete, the file was cut off"
+    if not header.channels:
+        return "no channels"
+    if tile_size is not None and tuple(header.tile_size) != (int(tile_size),
+                                                             int(tile_size)):
+        return "tile size {}x{} instead of {}".format(
+            header.tile_size[0], header.tile_size[1], tile_size)
+    if compression is not None and header.compression != compression:
+        return "{} compression instead of {}".format(header.compression,
+                                                    compression)
+    return None
+
+
+def validate(path, tile_size=None, compression=None):
+    """
+    Check that path is a complete tiled exr, with the given tile size and
+    compression when given
+
+    Returns:
+        None when it's fine, otherwise the problem
+    """
+    if not os.path.isfile(path):
+        return "missing"
+    return check_header(read_header(path), tile_size, compression)
+
+
+class HeaderCache(object):
+    """
+    Headers by path, read again only when a file's size or mtime changes
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # normalized path: (size, mtime, header)
+        self.headers = {}
+
+    def header(self, path, stat=None):
+        """
+        Args:
+            stat: (size, mtime) of path when already known, saves a stat
+
+        Returns:
+            EXRHeader, None when missing, not an exr or broken
+        """
+        if stat is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            stat = (st.st_size, st.st_mtime)
+        key = os.path.normcase(os.path.abspath(path))
+        with self.lock:
+            cached = self.headers.get(key)
+        if cached is not None and cached[:2] == tuple(stat):
+            return cached[2]
+        header = read_header(path)
+        with self.lock:
+            self.headers[key] = (stat[0], stat[1], header)
+        return header
+
+    def validate(self, path, tile_size=None, compression=None, stat=None):
+        """Like `validate`, with the header from the cache"""
+        if stat is None and not os.path.isfile(path):
+            return "missing"
+        return check_header(self.header(path, stat), tile_size, compression)
+
+
+# shared by the scene queries
+cache = HeaderCache()
@@ -0,0 +1,434 @@
+"""
+Work queue on a shared filesystem to spread conversions over machines
+
+Every job is a small JSON file in the queue directory, nothing but a
+filesystem all machines can reach is needed:
+
+    <queue>/jobs/<id>.json                 waiting to be picked up
+    <queue>/claimed/<id>@<worker>.json     being converted by a worker
+    <queue>/results/<id>.json              done, holds the status
+    <queue>/workers/<worker>.json          heartbeat of a worker
+
+A worker claims a job by renaming it from jobs/ to claimed/, only one rename
+can succeed. Workers update their heartbeat while they run. Claims of
+workers whose heartbeat stopped changing are put back into jobs/ by whoever
+notices first (the coordinator and idle workers check). Heartbeats are
+compared by their counter rather than by time, so the clocks of the machines
+don't need to agree.
+
+Example:
+    queue = FarmQueue('//server/share/convert_queue')
+    queue.submit(paths, dict(compression='zips', tile_size=64))
+    # on any number of machines:
+    FarmWorker(queue, 'img2tiledexr.exe').run(exit_when_empty=True)
+    # back on the coordinator:
+    results = queue.collect(wait=True)
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+try:
+    import queue as queue_module
+except ImportError:
+    import Queue as queue_module
+
+from . import img2tiledexrtool
+from . import report as batch_report
+
+log = logging.getLogger("img2exr Farm Queue")
+
+# job options a worker passes on to the converter
+JOB_OPTIONS = ('postfix', 'compression', 'tile_size', 'linear', 'overwrite',
+               'only_stale', 'content_hash', 'timeout', 'retries')
+
+
+def write_json(path, data):
+    """Write json so readers never see a partial file"""
+    tmp = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    img2tiledexrtool.replace_file(tmp, path)
+
+
+def read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def job_id(source, postfix='_tiled'):
+    """Jobs are identified by their output, submitting twice is harmless"""
+    key = img2tiledexrtool.path_key(
+        img2tiledexrtool.output_path(source, postfix))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+class FarmQueue(object):
+    """A job queue in a shared directory"""
+    def __init__(self, root, stale_timeout=120.0):
+        """
+        Args:
+            root (str): queue directory, reachable by all machines
+            stale_timeout (float): seconds a worker's heartbeat may stay
+                unchanged before its claims are handed to other workers
+        """
+        self.root = root
+        self.stale_timeout = stale_timeout
+        self.jobs_dir = os.path.join(root, 'jobs')
+        self.claimed_dir = os.path.join(root, 'claimed')
+        self.results_dir = os.path.join(root, 'results')
+        self.workers_dir = os.path.join(root, 'workers')
+        for directory in (self.jobs_dir, self.claimed_dir, self.results_dir,
+                          self.workers_dir):
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    # another machine created it at the same time
+                    if not os.path.isdir(directory):
+                        raise
+        # worker: (heartbeat counter, local time we first saw it)
+        self._seen = {}
+
+    def submit(self, paths, options=None):
+        """
+        Add jobs for source files
+
+        Args:
+            paths: source file paths, as seen by the workers
+            options: conversion options, see JOB_OPTIONS
+
+        Returns:
+            list of unique job ids, in the order of paths
+        """
+        options = dict((k, v) for k, v in (options or {}).items()
+                       if k in JOB_OPTIONS)
+        postfix = options.get('postfix', '_tiled')
+        ids = collections.OrderedDict()
+        for path in paths:
+            id = job_id(path, postfix)
+            if id in ids:
+                continue
+            ids[id] = path
+            result = os.path.join(self.results_dir, id + '.json')
+            if os.path.exists(result):
+                # submitted again, convert again
+                os.remove(result)
+            if self._claim_file(id) is None:
+                write_json(os.path.join(self.jobs_dir, id + '.json'),
+                           {'id': id, 'source': path, 'options': options,
+                            'submitted': time.time()})
+        return list(ids)
+
+    def _claim_file(self, id):
+        prefix = id + '@'
+        for name in os.listdir(self.claimed_dir):
+            if name.startswith(prefix) and name.endswith('.json'):
+                return os.path.join(self.claimed_dir, name)
+        return None
+
+    def claim(self, worker, count=1):
+        """
+        Claim up to count jobs for a worker
+
+        Returns:
+            list of (claim path, job dict)
+        """
+        claimed = []
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if len(claimed) >= count:
+                break
+            if not name.endswith('.json'):
+                continue
+            id = name[:-len('.json')]
+            target = os.path.join(self.claimed_dir,
+                                  '{}@{}.json'.format(id, worker))
+            try:
+                os.rename(os.path.join(self.jobs_dir, name), target)
+            except OSError:
+                # somebody else was faster
+                continue
+            job = read_json(target)
+            if job is None:
+                log.warning("Dropping unreadable job {}".format(name))
+                os.remove(target)
+                continue
+            claimed.append((target, job))
+        return claimed
+
+    def complete(self, claim, job, status, worker, metrics=None):
+        """
+        Store the result of a job and release its claim
+
+        Args:
+            metrics (dict): timings and sizes stored with the result, see
+                `img2tiledexrtool.ConversionResult`
+        """
+        result = dict(metrics or {})
+        result.update({'id': job['id'], 'source': job['source'],
+                       'output': img2tiledexrtool.output_path(
+                           job['source'],
+                           job['options'].get('postfix', '_tiled')),
+                       'status': status,
+                       'ok': img2tiledexrtool.is_usable(status),
+                       'worker': worker,
+                       'finished': time.time()})
+        write_json(os.path.join(self.results_dir, job['id'] + '.json'),
+                   result)
+        try:
+            os.remove(claim)
+        except OSError:
+            # reclaimed while we were working, the result still counts
+            pass
+
+    def heartbeat(self, worker, counter, state='running'):
+        write_json(os.path.join(self.workers_dir, worker + '.json'),
+                   {'worker': worker, 'counter': counter, 'state': state,
+                    'host': socket.gethostname(), 'pid': os.getpid()})
+
+    def dead_workers(self):
+        """Workers holding claims whose heartbeat stopped changing"""
+        now = time.time()
+        holders = set()
+        for name in os.listdir(self.claimed_dir):
+            if '@' in name and name.endswith('.json'):
+                holders.add(name[name.index('@') + 1:-len('.json')])
+        dead = []
+        for worker in holders:
+            beat = read_json(os.path.join(self.workers_dir, worker + '.json'))
+            if beat is not None and beat.get('state') == 'stopped':
+                dead.append(worker)
+                continue
+            counter = beat.get('counter') if beat else None
+            seen = self._seen.get(worker)
+            if seen is None or seen[0] != counter:
+                self._seen[worker] = (counter, now)
+            elif now - seen[1] > self.stale_timeout:
+                dead.append(worker)
+        return dead
+
+    def reclaim_stale(self):
+        """Put the claims of dead workers back in the queue"""
+        dead = set(self.dead_workers())
+        reclaimed = 0
+        for name in os.listdir(self.claimed_dir):
+            if '@' not in name or not name.endswith('.json'):
+                continue
+            id, _, worker = name[:-len('.json')].partition('@')
+            if worker not in dead:
+                continue
+            try:
+                os.rename(os.path.join(self.claimed_dir, name),
+                          os.path.join(self.jobs_dir, id + '.json'))
+            except OSError:
+                continue
+            log.warning("Reclaimed job {} from worker {}".format(id, worker))
+            reclaimed += 1
+        return reclaimed
+
+    def counts(self):
+        """Number of pending, claimed and finished jobs"""
+        def count(directory):
+            return len([n for n in os.listdir(directory)
+                        if n.endswith('.json')])
+        return {'pending': count(self.jobs_dir),
+                'claimed': count(self.claimed_dir),
+                'done': count(self.results_dir)}
+
+    def results(self, ids=None):
+        """Results collected so far, for the given job ids or all"""
+        if ids is None:
+            ids = [n[:-len('.json')] for n in os.listdir(self.results_dir)
+                   if n.endswith('.json')]
+        results = []
+        for id in ids:
+            result = read_json(os.path.join(self.results_dir, id + '.json'))
+            if result is not None:
+                results.append(result)
+        return results
+
+    def collect(self, ids=None, wait=False, interval=5.0, timeout=None):
+        """
+        Gather results, optionally waiting until every job is done
+
+        While waiting, claims of dead workers are put back in the queue.
+
+        Args:
+            ids: job ids to wait for, by default all jobs in the queue
+            wait (bool): block until the jobs are done
+            interval (float): seconds between checks
+            timeout (float): give up waiting after this many seconds
+
+        Returns:
+            list of result dicts
+        """
+        start = time.time()
+        while True:
+            if ids is None:
+                counts = self.counts()
+                done = not counts['pending'] and not counts['claimed']
+            else:
+                done = all(os.path.exists(os.path.join(self.results_dir,
+                                                       id + '.json'))
+                           for id in ids)
+            if done or not wait:
+                break
+            if timeout is not None and time.time() - start > timeout:
+                log.warning("Gave up waiting for the queue")
+                break
+            self.reclaim_stale()
+            time.sleep(interval)
+        return self.results(ids if ids is None else list(ids))
+
+
+class FarmWorker(object):
+    """Converts jobs from a FarmQueue with the local conversion engine"""
+    def __init__(self, queue, backend, threads=None, memory_budget=None,
+                 worker_id=None, interval=2.0):
+        """
+        Args:
+            queue (FarmQueue): the queue to work on
+            backend: ConverterBackend or img2tiledexr path, executables
+                differ per machine so they aren't part of the jobs
+        """
+        self.queue = queue
+        self.backend = backend
+        self.threads = threads or img2tiledexrtool.default_threads()
+        self.memory_budget = memory_budget
+        self.id = worker_id or '{}-{}-{}'.format(
+            socket.gethostname(), os.getpid(), uuid.uuid4().hex[:6])
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.done = 0
+        self._counter = 0
+        self._beat_lock = threading.Lock()
+        # submitted batches whose results weren't all read yet:
+        # [batch, {source path key: (claim, job)}]
+        self.batches = []
+        # totals over everything this worker converted
+        self.report = batch_report.BatchReport()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+    def _beat(self, state='running'):
+        # the heartbeat thread and the work loop both beat
+        with self._beat_lock:
+            self._counter += 1
+            self.queue.heartbeat(self.id, self._counter, state)
+
+    def _heartbeat_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self._beat()
+
+    def _finished(self, *result):
+        # engine thread, the work loop stores the results
+        self.wake_event.set()
+
+    def _submit(self, engine, claimed):
+        """Convert claimed jobs as one batch"""
+        conversions = []
+        claims = {}
+        for claim, job in claimed:
+            options = job['options']
+            file_out = img2tiledexrtool.output_path(
+                job['source'], options.get('postfix', '_tiled'))
+            conversions.append(img2tiledexrtool.Img2EXRJob(
+                self.backend, job['source'], file_out,
+                img2tiledexrtool.conversion_options(
+                    options.get('compression', 'zips'),
+                    options.get('tile_size', 64),
+                    options.get('linear', 'off')),
+                overwrite=options.get('overwrite', False),
+                only_stale=options.get('only_stale', False),
+                content_hash=options.get('content_hash', False),
+                timeout=options.get('timeout'),
+                retries=options.get('retries', 0)))
+            claims[img2tiledexrtool.path_key(job['source'])] = (claim, job)
+        with self.lock:
+            self.in_flight += len(conversions)
+        batch = engine.submit(conversions, report=self.report,
+                              callback=self._finished)
+        self.batches.append([batch, claims])
+
+    def _complete(self):
+        """Store the results of finished jobs and release their claims"""
+        for entry in list(self.batches):
+            batch, claims = entry
+            while True:
+                try:
+                    result = batch.out_queue.get_nowait()
+                except queue_module.Empty:
+                    break
+                claim, job = claims.pop(
+                    img2tiledexrtool.path_key(result.file_in))
+                self.queue.complete(claim, job, result.status, self.id,
+                                    result.as_dict())
+                with self.lock:
+                    self.in_flight -= 1
+                    self.done += 1
+            if not claims:
+                self.batches.remove(entry)
+
+    def run(self, exit_when_empty=False):
+        """
+        Claim and convert jobs until stopped
+
+        Args:
+            exit_when_empty (bool): return once the queue has no pending jobs
+                and our own jobs are done
+
+        Returns:
+            number of jobs this worker finished
+        """
+        engine = img2tiledexrtool.get_engine(self.threads, self.memory_budget)
+        self.report.start(engine.size)
+        self._beat()
+        heartbeat = threading.Thread(target=self._heartbeat_loop)
+        heartbeat.daemon = True
+        heartbeat.start()
+        log.info("Worker {} started".format(self.id))
+        try:
+            while not self.stop_event.is_set():
+                self._complete()
+                with self.lock:
+                    free = self.threads - self.in_flight
+                claimed = self.queue.claim(self.id, free) if free > 0 else []
+                if claimed:
+                    self._submit(engine, claimed)
+                    continue
+
+                with self.lock:
+                    idle = self.in_flight == 0
+                if idle:
+                    # help out by returning the jobs of dead workers
+                    if self.queue.reclaim_stale():
+                        continue
+                    if exit_when_empty and not self.queue.counts()['pending']:
+                        break
+                # sleep until a job finishes or it's time to look again
+                self.wake_event.wait(self.interval)
+                self.wake_event.clear()
+        finally:
+            self.stop_event.set()
+            engine.drain()
+            self._complete()
+            # no late heartbeat may overwrite the last one
+            heartbeat.join()
+            self._beat('stopped')
+            self.report.finish()
+        log.info("Worker {} finished {} jobs".format(self.id, self.done))
+        return self.done
@@ -0,0 +1,257 @@
+"""
+Filesystem status of sources and their tiled exrs
+
+Checking thousands of textures with os.path.isfile/getmtime is slow on
+network shares, every call is a round trip. `StatCache` lists a directory
+once and answers all questions about files in it from that listing, until
+the directory changes or the listing gets older than its ttl.
+`StatusScanner` does this in a background thread and reports the status of
+each request through a callback.
+
+Example:
+    scanner = StatusScanner(callback=print)
+    scanner.request('file1', ['P:/tex/skin.<UDIM>.tif'], '_tiled')
+    # file1 EXR missing
+"""
+import logging
+import os
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from . import exrheader
+from . import img2tiledexrtool
+from . import udim
+
+log = logging.getLogger("img2exr File Status")
+
+UP_TO_DATE = 'up to date'
+EXR_MISSING = 'EXR missing'
+EXR_STALE = 'EXR stale'
+EXR_INVALID = 'EXR broken'
+SOURCE_MISSING = 'source missing'
+
+
+class StatCache(object):
+    """
+    Directory listings with the size and mtime of their files
+
+    A listing is trusted for `ttl` seconds. After that the directory is
+    stat'ed again, when its mtime didn't change only the file stats are
+    dropped (files can be written in place), otherwise it's listed again.
+    """
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # normalized directory: _Listing
+        self.listings = {}
+
+    def invalidate(self, paths=None):
+        """Forget the listings of the directories of paths, or everything"""
+        with self.lock:
+            if paths is None:
+                self.listings.clear()
+                return
+            for path in paths:
+                self.listings.pop(_dir_key(os.path.dirname(path)), None)
+
+    def listing(self, directory):
+        """
+        Returns:
+            dict of normalized name: name, None when the directory is missing
+        """
+        return self._listing(directory).names
+
+    def _listing(self, directory):
+        key = _dir_key(directory)
+        now = time.time()
+        with self.lock:
+            cached = self.listings.get(key)
+        if cached is not None and now - cached.time < self.ttl:
+            return cached
+        mtime = _mtime(directory or '.')
+        if cached is not None and mtime is not None and mtime == cached.mtime:
+            cached.refresh(now)
+            return cached
+        listing = _Listing(directory, mtime, now)
+        with self.lock:
+            self.listings[key] = listing
+        return listing
+
+    def stat(self, path):
+        """(size, mtime) of a file, None when it doesn't exist"""
+        directory, name = os.path.split(path)
+        return self._listing(directory).stat(os.path.normcase(name))
+
+    def files(self, pattern):
+        """Existing files of a path or tile/frame pattern, like
+        `udim.expand_pattern`"""
+        if not udim.is_pattern(pattern):
+            return [pattern] if self.stat(pattern) is not None else []
+        directory = os.path.dirname(pattern)
+        regex = udim.pattern_regex(pattern)
+        names = self.listing(directory) or {}
+        return sorted(os.path.join(directory, name) if directory else name
+                      for name in names.values() if regex.match(name))
+
+
+class _Listing(object):
+    def __init__(self, directory, mtime, time):
+        self.directory = directory
+        self.mtime = mtime
+        self.time = time
+        self.entries = {}
+        # normalized name: (size, mtime), filled in on first use
+        self.stats = {}
+        try:
+            entries = list(_scandir(directory or '.'))
+        except OSError:
+            self.names = None
+            return
+        self.names = dict((os.path.normcase(entry.name), entry.name)
+                          for entry in entries)
+        self.entries = dict((os.path.normcase(entry.name), entry)
+                            for entry in entries)
+
+    def refresh(self, time):
+        """Drop the file stats, files can be written in place"""
+        self.time = time
+        self.stats.clear()
+        # a DirEntry keeps the stat it made first, ask the filesystem again
+        self.entries = dict((key, _Entry(self.directory or '.', entry.name))
+                            for key, entry in self.entries.items())
+
+    def stat(self, key):
+        if key not in self.stats:
+            try:
+                # free on windows, scandir already has it
+                st = self.entries[key].stat()
+            except (OSError, KeyError):
+                st = None
+            self.stats[key] = None if st is None else (st.st_size,
+                                                       st.st_mtime)
+        return self.stats[key]
+
+
+class _Entry(object):
+    """os.DirEntry stand in where os.scandir is missing"""
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+
+    def stat(self):
+        return os.stat(self.path)
+
+
+def _scandir(directory):
+    if hasattr(os, 'scandir'):
+        return os.scandir(directory)
+    return [_Entry(directory, name) for name in os.listdir(directory)]
+
+
+def _dir_key(directory):
+    return os.path.normcase(os.path.abspath(directory or '.'))
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def file_status(candidates, postfix='_tiled', cache=None):
+    """
+    Status of a texture and its tiled exr
+
+    Args:
+        candidates: source paths or patterns, the first existing one is used
+            (see `img2tiledexrtool.source_path`)
+        postfix: tiled exr postfix
+        cache (StatCache): listings to use, a new one by default
+
+    Returns:
+        one of UP_TO_DATE, EXR_MISSING, EXR_STALE, EXR_INVALID or
+        SOURCE_MISSING. Exr headers are checked, through
+        `exrheader.cache` so unchanged files are read once.
+    """
+    if cache is None:
+        cache = StatCache()
+    files = []
+    for candidate in candidates:
+        if candidate:
+            files = cache.files(candidate)
+            if files:
+                break
+    if not files:
+        return SOURCE_MISSING
+    status = UP_TO_DATE
+    for file_in in files:
+        source = cache.stat(file_in)
+        file_out = img2tiledexrtool.output_path(file_in, postfix)
+        exr = cache.stat(file_out)
+        if exr is None:
+            return EXR_MISSING
+        if exrheader.cache.validate(file_out, stat=exr) is not None:
+            return EXR_INVALID
+        if source is not None and exr[1] < source[1]:
+            status = EXR_STALE
+    return status
+
+
+class StatusScanner(threading.Thread):
+    """
+    Resolves file statuses in a background thread
+
+    Requests are handled in batches, directories are listed once for all
+    requests through the shared `StatCache`. `callback` is called from the
+    scanner thread with a dict of key: status per batch.
+    """
+    def __init__(self, callback, cache=None, batch_size=500):
+        super(StatusScanner, self).__init__()
+        self.daemon = True
+        self.callback = callback
+        self.cache = cache or StatCache()
+        self.batch_size = batch_size
+        self.requests = queue.Queue()
+        self.stopped = threading.Event()
+
+    def request(self, key, candidates, postfix='_tiled'):
+        """Queue a status check, starts the thread on first use"""
+        self.requests.put((key, list(candidates), postfix))
+        if not self.is_alive() and not self.stopped.is_set():
+            try:
+                self.start()
+            except RuntimeError:
+                # started by another request in the meantime
+                pass
+
+    def stop(self):
+        self.stopped.set()
+        self.requests.put(None)
+
+    def run(self):
+        while not self.stopped.is_set():
+            batch = [self.requests.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            batch = [request for request in batch if request is not None]
+            if not batch or self.stopped.is_set():
+                continue
+            results = {}
+            for key, candidates, postfix in batch:
+                try:
+                    results[key] = file_status(candidates, postfix, self.cache)
+                except Exception:
+                    log.exception("Status check failed for {}".format(key))
+            try:
+                self.callback(results)
+            except Exception:
+                log.exception("Status callback failed")
@@ -0,0 +1,191 @@
+"""
+Read image dimensions and bit depth from file headers
+
+Only the first few bytes of a file are read (a bit more for TIFF, JPEG and EXR
+whose headers aren't at a fixed offset), no pixel data is ever decoded. This
+is used to estimate the cost of a conversion before running it.
+
+Example:
+    info = read_image_info('P:/textures/grass_CLR01.tga')
+    if info:
+        print(info.width, info.height, info.channels, info.bit_depth)
+"""
+import collections
+import os
+import struct
+
+from . import exrheader
+
+ImageInfo = collections.namedtuple('ImageInfo',
+                                   'width height channels bit_depth')
+
+# bytes per channel we assume a converter keeps an image in while working
+WORKING_BYTES_PER_CHANNEL = 4
+
+
+def read_image_info(path):
+    """
+    Read the size of an image from its header
+
+    Args:
+        path (str): image file path
+
+    Returns:
+        ImageInfo or None when the format isn't recognized or the header is
+        broken
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(64)
+            for reader in _READERS:
+                info = reader(f, head, path)
+                if info is not None:
+                    return info
+    except (IOError, OSError, struct.error, ValueError, IndexError,
+            TypeError):
+        pass
+    return None
+
+
+def estimate_cost(path, info=None):
+    """
+    Estimate the work and memory a conversion of this image takes
+
+    Args:
+        path (str): image file path
+        info (ImageInfo): header info, read from path when not given
+
+    Returns:
+        tuple with cost (pixel * channels, comparable between images) and
+        memory in bytes. Unreadable headers fall back to the file size.
+    """
+    info = info or read_image_info(path)
+    if info is None:
+        size = os.path.getsize(path) if os.path.isfile(path) else 0
+        return size, size * WORKING_BYTES_PER_CHANNEL
+    samples = info.width * info.height * max(info.channels, 1)
+    return samples, samples * WORKING_BYTES_PER_CHANNEL
+
+
+def _png(f, head, path):
+    if not head.startswith(b'\x89PNG\r\n\x1a\n') or head[12:16] != b'IHDR':
+        return None
+    width, height, bit_depth, color_type = struct.unpack('>IIBB', head[16:26])
+    channels = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}.get(color_type, 4)
+    return ImageInfo(width, height, channels, bit_depth)
+
+
+def _jpeg(f, head, path):
+    if not head.startswith(b'\xff\xd8'):
+        return None
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0:1] != b'\xff':
+            return None
+        code = ord(marker[1:2])
+        if code == 0xff:
+            # padding, step back one byte
+            f.seek(-1, os.SEEK_CUR)
+            continue
+        if code in (0x01, 0xd8) or 0xd0 <= code <= 0xd7:
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+            precision, height, width, channels = struct.unpack('>BHHB',
+                                                               f.read(6))
+            return ImageInfo(width, height, channels, precision)
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _tga(f, head, path):
+    if not path.lower().endswith(('.tga', '.targa', '.icb', '.vda', '.vst')):
+        return None
+    if len(head) < 18:
+        return None
+    image_type = ord(head[2:3])
+    if image_type not in (1, 2, 3, 9, 10, 11):
+        return None
+    width, height, depth = struct.unpack('<HHB', head[12:17])
+    if image_type in (1, 9):
+        # color mapped, the palette holds rgb(a)
+        return ImageInfo(width, height, 3, 8)
+    if image_type in (3, 11):
+        return ImageInfo(width, height, 1, depth)
+    return ImageInfo(width, height, max(depth // 8, 1), 8)
+
+
+def _bmp(f, head, path):
+    if not head.startswith(b'BM'):
+        return None
+    width, height = struct.unpack('<ii', head[18:26])
+    bpp = struct.unpack('<H', head[28:30])[0]
+    return ImageInfo(abs(width), abs(height), 4 if bpp == 32 else 3, 8)
+
+
+def _psd(f, head, path):
+    if not head.startswith(b'8BPS'):
+        return None
+    channels, height, width, depth = struct.unpack('>HIIH', head[12:24])
+    return ImageInfo(width, height, channels, depth)
+
+
+def _hdr(f, head, path):
+    if not head.startswith((b'#?RADIANCE', b'#?RGBE')):
+        return None
+    f.seek(0)
+    for _ in range(64):
+        line = f.readline(256).strip()
+        parts = line.split()
+        if len(parts) == 4 and parts[0] in (b'-Y', b'+Y'):
+            return ImageInfo(int(parts[3]), int(parts[1]), 3, 32)
+    return None
+
+
+def _tiff(f, head, path):
+    if head[:4] == b'II*\x00':
+        endian = '<'
+    elif head[:4] == b'MM\x00*':
+        endian = '>'
+    else:
+        return None
+    offset = struct.unpack(endian + 'I', head[4:8])[0]
+    f.seek(offset)
+    count = struct.unpack(endian + 'H', f.read(2))[0]
+    tags = {}
+    for _ in range(count):
+        tag, kind, num, value = struct.unpack(endian + 'HHI4s', f.read(12))
+        if tag not in (256, 257, 258, 277):
+            continue
+        if tag == 258 and num > 2:
+            # bits per sample stored at an offset, 8 is a fine guess
+            continue
+        if kind == 3:
+            tags[tag] = struct.unpack(endian + 'H', value[:2])[0]
+        else:
+            tags[tag] = struct.unpack(endian + 'I', value)[0]
+    if 256 not in tags or 257 not in tags:
+        return None
+    bits = tags.get(258) or 8
+    return ImageInfo(tags[256], tags[257], tags.get(277, 1), bits)
+
+
+def _exr(f, head, path):
+    if head[:4] != exrheader.MAGIC:
+        return None
+    attributes = exrheader.read_attributes(f)
+    if attributes is None:
+        return None
+    attrs = attributes[1]
+    if b'dataWindow' not in attrs:
+        return None
+    xmin, ymin, xmax, ymax = struct.unpack('<iiii', attrs[b'dataWindow'][1])
+    channels = exrheader.channel_list(attrs[b'channels'][1]) \
+        if b'channels' in attrs else ()
+    bits = max([{0: 32, 1: 16, 2: 32}.get(pixel_type, 32)
+                for _, pixel_type in channels] or [16])
+    return ImageInfo(xmax - xmin + 1, ymax - ymin + 1, len(channels) or 1,
+                     bits)
+
+
+_READERS = (_png, _jpeg, _exr, _psd, _tiff, _bmp, _hdr, _tga)
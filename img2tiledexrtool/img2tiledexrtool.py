@@ -10,83 +10,1206 @@ Example:
 """
 
 import sys
+import collections
+import json
+import hashlib
+import heapq
+import itertools
 import threading
 import subprocess
+import time
+import tempfile
 import os
+import logging
+import multiprocessing
+import atexit
+import uuid
 
 if sys.version_info[0] == 2:
     import Queue as queue
 else:
     import queue
 
+from . import backends
+from . import exrheader
+from . import imageinfo
+from . import report as batch_report
+from . import udim
+
+log = logging.getLogger("img2exr Converter")
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+# converters write to <name>.<random>.converting.exr, which is renamed to
+# the real output once complete
+TEMP_MARKER = '.converting'
+
+# file types img2tiledexr can read
+SUPPORTED_EXTENSIONS = ('.tga', '.png', '.jpg', '.jpeg', '.tif', '.tiff',
+                        '.exr', '.bmp', '.hdr', '.pic', '.psd')
+
+STATUS_EXISTS = 'File not converted, file already exists and overwrite is set to False.'
+STATUS_UP_TO_DATE = 'File not converted, existing file is up to date.'
+STATUS_CANCELLED = 'File not converted, conversion was cancelled.'
+STATUS_TIMEOUT = 'File not converted, conversion timed out after {} seconds.'
+STATUS_EXIT_CODE = 'File not converted, converter exited with code {}: {}'
+STATUS_CONFLICT = 'File not converted, {} is converted to the same output file.'
+STATUS_UNSUPPORTED = 'File not converted, {}.'
+STATUS_NO_OUTPUT = 'File not converted, converter did not write an output file: {}'
+STATUS_RESUMED = 'File not converted, it was done in an earlier run of this batch.'
+STATUS_STORED = 'File not converted, it was taken from the conversion store.'
+STATUS_INVALID = 'File not converted, the converter wrote a bad exr: {}.'
+
+# job priorities, higher is converted first. Defaults of the scene context,
+# see mayalib.context_priorities
+PRIORITY_NORMAL = 0
+PRIORITY_RENDER_LAYER = 10
+PRIORITY_SELECTED = 20
+
+# characters of converter output kept in failure statuses
+OUTPUT_TAIL = 2000
+
+
+def is_usable(status):
+    """Whether a result status means the exr can be used (converted or kept)"""
+    return status is None or status in (STATUS_EXISTS, STATUS_UP_TO_DATE,
+                                        STATUS_RESUMED, STATUS_STORED)
+
+
+def wait_process(process, cancel_event=None, interval=0.1):
+    """
+    Wait for a process to finish, killing it when cancel_event gets set
+
+    The cancel event is checked every interval, a process that finishes
+    returns right away instead of at the next check.
+
+    Returns:
+        bool, False if the process was killed
+    """
+    delay = min(0.005, interval)
+    while process.poll() is None:
+        if cancel_event is not None and cancel_event.is_set():
+            process.kill()
+            process.wait()
+            return False
+        try:
+            process.wait(timeout=interval)
+        except TypeError:
+            # python 2 has no timeout, back off up to the interval
+            time.sleep(delay)
+            delay = min(delay * 2, interval)
+        except subprocess.TimeoutExpired:
+            pass
+    return True
+
+
+def hash_file(path, block_size=1024 * 1024):
+    """Return the sha1 hex digest of a file's content"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_signature(file_in, content_hash=False):
+    """Build the signature we use to detect changes to a source file
+
+    Args:
+        file_in (str): source image path
+        content_hash (bool): also store a sha1 of the file content, this lets
+            us ignore sources that were touched but not actually changed.
+
+    Returns:
+        dict with path, mtime, size and hash (None when not requested)
+    """
+    stat = os.stat(file_in)
+    return {'path': file_in,
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'hash': hash_file(file_in) if content_hash else None}
+
+
+def manifest_path(file_out):
+    return file_out + MANIFEST_SUFFIX
+
+
+def read_manifest(file_out):
+    """Read the manifest stored next to a converted exr, None if there is none"""
+    try:
+        with open(manifest_path(file_out), 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_manifest(file_out, signature, options):
+    """Store the source signature and conversion options next to an exr"""
+    path = manifest_path(file_out)
+    temp = '{}.{}.tmp'.format(path, uuid.uuid4().hex[:8])
+    with open(temp, 'w') as f:
+        json.dump({'source': signature, 'options': options}, f, indent=2,
+                  sort_keys=True)
+    replace_file(temp, path)
+
+
+def is_stale(file_in, file_out, options, content_hash=False):
+    """Check whether an existing exr needs to be converted again
+
+    An exr is stale when it doesn't exist, when it was converted with other
+    options or when its source changed since the conversion. Exrs converted
+    before we wrote manifests fall back to comparing modification times.
+
+    Args:
+        file_in (str): source image path
+        file_out (str): tiled exr path
+        options (dict): conversion options, see `conversion_options`
+        content_hash (bool): when the source mtime changed, compare content
+            hashes before deciding it's stale. A source that was only
+            touched gets its new mtime in the manifest, so it isn't hashed
+            again next time.
+
+    Returns:
+        bool
+    """
+    if not os.path.isfile(file_out):
+        return True
+
+    manifest = read_manifest(file_out)
+    if manifest is None:
+        return os.path.getmtime(file_in) > os.path.getmtime(file_out)
+
+    if manifest.get('options') != options:
+        return True
+
+    source = manifest.get('source') or {}
+    stat = os.stat(file_in)
+    if source.get('size') != stat.st_size:
+        return True
+    if source.get('mtime') == stat.st_mtime:
+        return False
+    if content_hash and source.get('hash'):
+        if source['hash'] != hash_file(file_in):
+            return True
+        source['mtime'] = stat.st_mtime
+        try:
+            write_manifest(file_out, source, manifest['options'])
+        except (IOError, OSError) as e:
+            log.warning("Could not update the manifest of {}: {}".format(
+                file_out, e))
+        return False
+    return True
+
+
+def path_key(path):
+    """Normalized path used to recognize the same file spelled differently"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def source_path(file_texture_name, tiled_exr_source=None):
+    """
+    The file a file node should be converted from
+
+    Nodes converted before remember their source in tiledEXRSource, it's
+    used as long as it still exists, otherwise the current fileTextureName.
+    Either can be a tile/frame pattern (see `udim`).
+    """
+    if tiled_exr_source and udim.exists(tiled_exr_source):
+        return tiled_exr_source
+    return file_texture_name
+
+
+def output_path(file_in, postfix='_tiled'):
+    """The tiled exr path a source is converted to"""
+    return '{}{}.exr'.format(os.path.splitext(file_in)[0], postfix)
+
+
+def temp_output_path(file_out):
+    """
+    Unique path next to file_out to convert into
+
+    It keeps the .exr extension, converters pick the format from it. Being
+    on the same volume as file_out makes the final rename atomic.
+    """
+    return '{}.{}{}.exr'.format(os.path.splitext(file_out)[0],
+                                uuid.uuid4().hex[:8], TEMP_MARKER)
+
+
+def is_temp_output(path):
+    """Whether path is an unfinished conversion, see `temp_output_path`"""
+    return path.lower().endswith(TEMP_MARKER + '.exr')
+
+
+def replace_file(src, dst):
+    """Rename src to dst, replacing dst. Atomic where the platform allows"""
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+        return
+    if sys.platform == 'win32' and os.path.exists(dst):
+        # python 2 can't rename over an existing file on windows
+        os.remove(dst)
+    os.rename(src, dst)
+
+
+def conversion_options(compression='zips', tile_size=64, linear='off'):
+    """Options as stored in the manifest"""
+    return {'compression': compression,
+            'tile_size': int(tile_size),
+            'linear': linear}
+
+
+def resolve_backend(executable, backend=None):
+    """
+    The backend to convert with
+
+    Args:
+        executable: img2tiledexr path, or a ConverterBackend
+        backend: backend name or instance, used with executable as its
+            executable when given
+    """
+    if backend is not None:
+        return backends.get_backend(backend, executable)
+    if isinstance(executable, backends.ConverterBackend):
+        return executable
+    return backends.Img2TiledEXRBackend(executable)
+
+
+def popen_kwargs():
+    """Extra Popen arguments, keeps windows from opening a console per job"""
+    if sys.platform == 'win32':
+        return {'creationflags': 0x08000000}  # CREATE_NO_WINDOW
+    return {}
+
+
+class Watchdog(threading.Thread):
+    """
+    Kills processes that run longer than their timeout
+
+    The watchdog only kills, whoever waits on the process finds out through
+    `unwatch` whether it was the watchdog that ended it.
+    """
+    def __init__(self, interval=1.0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.watched = {}
+        self.killed = set()
+        self.stop_event = threading.Event()
+        self._count = 0
+
+    def watch(self, process, timeout, label=''):
+        """Start watching a process, returns a token for `unwatch`"""
+        with self.lock:
+            self._count += 1
+            token = self._count
+            self.watched[token] = (process, time.time() + timeout, timeout,
+                                   label)
+        return token
+
+    def unwatch(self, token):
+        """Stop watching, returns True when the process was killed by us"""
+        with self.lock:
+            self.watched.pop(token, None)
+            if token in self.killed:
+                self.killed.discard(token)
+                return True
+        return False
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            now = time.time()
+            with self.lock:
+                expired = [(token, item) for token, item in self.watched.items()
+                           if item[1] < now and token not in self.killed]
+                for token, (process, _, timeout, label) in expired:
+                    log.warning("Killing conversion of {} after {} seconds"
+                                "".format(label, timeout))
+                    try:
+                        process.kill()
+                    except OSError:
+                        pass
+                    self.killed.add(token)
+
+
+def physical_memory():
+    """Total physical memory in bytes, None when we can't tell"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        pass
+    if sys.platform == 'win32':
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong),
+                        ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong),
+                        ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong),
+                        ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong),
+                        ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('sullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys
+    return None
+
+
+def default_threads():
+    """Number of conversions to run at the same time, one per cpu"""
+    try:
+        return max(multiprocessing.cpu_count(), 1)
+    except NotImplementedError:
+        return 4
+
+
+def default_memory_budget():
+    """Half of the physical memory, None when unknown (no limit)"""
+    total = physical_memory()
+    return total // 2 if total else None
+
+
+class MemoryBudget(object):
+    """
+    Limits the estimated memory of the conversions running at the same time
+
+    A job bigger than the whole budget is still allowed to run, but only
+    when nothing else is running. A limit of None or 0 means no limit.
+    """
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def set_limit(self, limit):
+        with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+    def acquire(self, amount, cancel_event=None):
+        """Block until amount fits the budget, returns the amount reserved"""
+        if not self.limit:
+            return 0
+        amount = min(amount, self.limit)
+        with self.condition:
+            while self.limit and self.used and \
+                    self.used + amount > self.limit:
+                if cancel_event is not None and cancel_event.is_set():
+                    return 0
+                self.condition.wait(0.5)
+            self.used += amount
+        return amount
+
+    def release(self, amount):
+        with self.condition:
+            self.used -= amount
+            self.condition.notify_all()
+
+
+class ConversionResult(collections.namedtuple('ConversionResult',
+                                              'file_in file_out status')):
+    """
+    The outcome of one file, unpacks like a (file_in, file_out, status) tuple
+
+    The timings and sizes are attributes, None when unknown. Files that
+    never reached a worker (conflicts, resumed, unsupported options) only
+    have their backend and options.
+
+    Attributes:
+        queue_wait (float): seconds between submitting and the conversion
+            starting, includes waiting for the memory budget
+        convert_time (float): seconds converting, all attempts together
+        attempts (int): times the converter ran
+        bytes_in (int): source file size
+        bytes_out (int): exr file size, when converted
+        pixels (int): source width * height, from its header
+        backend (str): converter backend name
+        options (dict): conversion options, see `conversion_options`
+        stage_in_time (float): seconds copying the source to local scratch,
+            when staged (see `staging`)
+        stage_out_time (float): seconds copying the exr back, when staged
+    """
+    METRICS = ('queue_wait', 'convert_time', 'attempts', 'bytes_in',
+               'bytes_out', 'pixels', 'backend', 'options', 'stage_in_time',
+               'stage_out_time')
+
+    def __new__(cls, file_in, file_out, status, **metrics):
+        self = super(ConversionResult, cls).__new__(cls, file_in, file_out,
+                                                    status)
+        for name in cls.METRICS:
+            setattr(self, name, metrics.pop(name, None))
+        if metrics:
+            raise TypeError("Unknown metrics: {}".format(', '.join(metrics)))
+        return self
+
+    @property
+    def ok(self):
+        """Whether the exr can be used, see `is_usable`"""
+        return is_usable(self.status)
+
+    def as_dict(self):
+        data = collections.OrderedDict([('source', self.file_in),
+                                        ('output', self.file_out),
+                                        ('status', self.status),
+                                        ('ok', self.ok)])
+        for name in self.METRICS:
+            data[name] = getattr(self, name)
+        return data
+
+
+class Img2EXRJob(object):
+    """A single file to convert and how"""
+    def __init__(self, backend, file_in, file_out, options, overwrite=False,
+                 only_stale=False, content_hash=False, timeout=None,
+                 retries=0, store=None, priority=PRIORITY_NORMAL):
+        # backend can be an img2tiledexr path
+        self.backend = resolve_backend(backend)
+        self.file_in = file_in
+        self.file_out = file_out
+        self.options = options
+        self.overwrite = overwrite
+        self.only_stale = only_stale
+        self.content_hash = content_hash
+        self.timeout = timeout
+        self.retries = retries
+        # store.ConversionStore to take the exr from and add it to
+        self.store = store
+        # higher is converted earlier, see JobQueue
+        self.priority = priority
+        self.info = imageinfo.read_image_info(file_in)
+        self.cost, self.memory = imageinfo.estimate_cost(file_in, self.info)
+        self.batch = None
+        # what the converter reads and where its exr goes before it's moved
+        # to file_out, local copies when staged (see staging.StagingArea)
+        self.source = file_in
+        self.local_out = None
+        self.staging = None
+        self.signature = None
+        # filled in while the job runs, see result()
+        self.submitted = None
+        self.picked = None
+        self.started = None
+        self.convert_time = None
+        self.attempts = 0
+        self.bytes_in = None
+        self.bytes_out = None
+        # where the converter writes, see temp_output_path
+        self.temp = None
+        self.stage_in_time = None
+        self.stage_out_time = None
+
+    def skip_status(self):
+        """Why the job needs no conversion, None when it does"""
+        if os.path.isfile(self.file_out) and not self.overwrite:
+            problem = exrheader.validate(self.file_out)
+            if problem is not None:
+                # cut off or broken exrs are converted again
+                log.info("Converting {} again, its exr is {}".format(
+                    self.file_in, problem))
+            elif not self.only_stale:
+                return STATUS_EXISTS
+            elif not is_stale(self.file_in, self.file_out, self.options,
+                              content_hash=self.content_hash):
+                return STATUS_UP_TO_DATE
+        # overwriting asks for a fresh conversion
+        if self.store is not None and not self.overwrite:
+            try:
+                if self.store.fetch(self.file_in, self.file_out,
+                                    self.options):
+                    return STATUS_STORED
+            except Exception:
+                log.exception("Conversion store lookup of {} failed".format(
+                    self.file_in))
+        return None
+
+    def add_to_store(self):
+        """Add the converted exr to the store, failures are only logged"""
+        if self.store is None:
+            return
+        try:
+            self.store.add(self.file_in, self.file_out, self.options)
+        except Exception:
+            log.exception("Adding {} to the conversion store failed".format(
+                self.file_out))
+
+    def result(self, status):
+        """ConversionResult with what was measured for this job"""
+        started = self.started or self.picked
+        queue_wait = None
+        if started is not None and self.submitted is not None:
+            queue_wait = started - self.submitted
+        return ConversionResult(
+            self.file_in, self.file_out, status,
+            queue_wait=queue_wait,
+            convert_time=self.convert_time,
+            attempts=self.attempts,
+            bytes_in=self.bytes_in,
+            bytes_out=self.bytes_out,
+            pixels=self.info.width * self.info.height if self.info else None,
+            backend=self.backend.name,
+            options=self.options,
+            stage_in_time=self.stage_in_time,
+            stage_out_time=self.stage_out_time)
+
+
+class ConversionBatch(object):
+    """
+    A group of jobs submitted to the engine together
+
+    Results of the batch's jobs are collected in its own queue, so batches
+    from different callers can share the engine's workers.
+    """
+    def __init__(self, jobs, cancel_event=None, callback=None, on_start=None,
+                 report=None, journal=None):
+        self.jobs = jobs
+        # results added with skipped(), they come before the jobs'
+        self.skipped_count = 0
+        self.cancel_event = cancel_event or threading.Event()
+        self.callback = callback
+        self.on_start = on_start
+        self.report = report
+        self.journal = journal
+        self.out_queue = queue.Queue()
+        for job in jobs:
+            job.batch = self
+
+    def cancel(self):
+        """Skip queued jobs and kill the running ones"""
+        self.cancel_event.set()
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def started(self, job):
+        if self.journal is not None:
+            self.journal.started(job)
+        if self.on_start is not None:
+            self.on_start(job.file_in)
+
+    def finished(self, job, status):
+        """Record a job's result, the result always reaches results()"""
+        try:
+            result = job.result(status)
+        except Exception as e:
+            log.exception("Result of {} failed".format(job.file_in))
+            result = ConversionResult(job.file_in, job.file_out,
+                                      status or str(e))
+        self.record(result)
+
+    def skipped(self, result):
+        """
+        Record the result of a file that needs no job (a conflict, resumed
+        or unsupported), before the batch's jobs are queued
+        """
+        self.skipped_count += 1
+        self.record(result)
+
+    def record(self, result):
+        """Journal, report and call the callback for a result, then hand it
+        out"""
+        if self.journal is not None:
+            try:
+                self.journal.finished(result)
+            except Exception:
+                log.exception("Journal of {} failed".format(result.file_in))
+        # all before results() sees it, the batch's report is complete and
+        # every callback made once its last result was taken
+        if self.report is not None:
+            try:
+                self.report.add(result)
+            except Exception:
+                log.exception("Report of {} failed".format(result.file_in))
+        if self.callback is not None:
+            try:
+                self.callback(*result)
+            except Exception:
+                log.exception("Conversion callback failed")
+        self.out_queue.put(result)
+
+    def results(self):
+        """
+        Yield results as jobs finish, until all jobs of the batch are done.
+        Closing the generator early cancels the remaining jobs.
+        """
+        remaining = len(self.jobs) + self.skipped_count
+        try:
+            while remaining:
+                yield self.out_queue.get()
+                remaining -= 1
+        finally:
+            if remaining:
+                self.cancel()
+
 
 class ConvertImg2EXRThread(threading.Thread):
     """
-    Thread class used by the converter
+    Worker thread of the conversion engine, runs until it takes a None job
     """
-    def __init__(self, queue, out_queue):
+    def __init__(self, engine):
         threading.Thread.__init__(self)
-        self.queue = queue
-        self.out_queue = out_queue
+        self.daemon = True
+        self.engine = engine
+        self.queue = engine.queue
+
+    def convert(self, job):
+        """Run the converter for a job, retrying failures
+
+        The converter writes a temporary file which replaces the output
+        once it's complete, so a crash or kill never leaves a truncated exr
+        at the output path.
+
+        Returns:
+            None on success, otherwise the failure status
+        """
+        backend = job.backend
+        temp = job.temp
+        try:
+            for attempt in range(job.retries + 1):
+                job.attempts = attempt + 1
+                if attempt:
+                    log.info("Retrying {} ({}/{})".format(job.file_in, attempt,
+                                                          job.retries))
+                if backend.in_process:
+                    try:
+                        status = backend.convert(job.source, temp,
+                                                 job.options)
+                    except Exception as e:
+                        status = str(e)
+                    if status is None and not os.path.isfile(temp):
+                        status = STATUS_NO_OUTPUT.format('')
+                else:
+                    args = backend.command(job.source, temp, job.options)
+                    status = self.run_process(args, job, temp)
+                if status is None:
+                    problem = exrheader.validate(temp,
+                                                 job.options['tile_size'],
+                                                 job.options['compression'])
+                    if problem is not None:
+                        status = STATUS_INVALID.format(problem)
+                if status is None or status == STATUS_CANCELLED:
+                    break
+            if status is None:
+                replace_file(temp, job.local_out or job.file_out)
+        finally:
+            if os.path.isfile(temp):
+                # don't leave a half written exr behind
+                os.remove(temp)
+        return status
+
+    def run_process(self, args, job, file_out):
+        output = tempfile.TemporaryFile()
+        try:
+            process = subprocess.Popen(args, stdout=output,
+                                       stderr=subprocess.STDOUT,
+                                       **popen_kwargs())
+            token = None
+            watchdog = self.engine.watchdog if job.timeout else None
+            if watchdog is not None:
+                token = watchdog.watch(process, job.timeout, job.file_in)
+            finished = wait_process(process, job.batch.cancel_event)
+            if token is not None and watchdog.unwatch(token):
+                return STATUS_TIMEOUT.format(job.timeout)
+            if not finished:
+                return STATUS_CANCELLED
+            output.seek(0)
+            text = output.read()[-OUTPUT_TAIL:].decode('utf-8', 'replace')
+            text = text.strip()
+            if process.returncode:
+                return STATUS_EXIT_CODE.format(process.returncode, text)
+            if not os.path.isfile(file_out):
+                return STATUS_NO_OUTPUT.format(text)
+        finally:
+            output.close()
+        return None
 
     def run(self):
         while True:
             # grabs data from queue
-            (executable, file_in, file_out, overwrite, options) = self.queue.get()
-            status = None
+            job = self.queue.get()
+            if job is None:
+                self.engine.worker_stopped(self)
+                self.queue.task_done()
+                break
             try:
-                execute = '"{}" "{}" "{}" {}'.format(executable, file_in, file_out, options)
-                if os.path.isfile(file_out) is False or overwrite is True:
-                    subprocess.call( execute )
-                    #print( "executing: {}".format( execute ))
+                status = self.process(job)
+                if job.staging is not None:
+                    # the staging area writes the exr back, then finishes it
+                    job.staging.converted(job, status)
                 else:
-                    status = 'File not converted, file already exists and overwrite is set to False.'
+                    job.batch.finished(job, status)
             except Exception as e:
-                status = str(e)
+                # keep the worker alive and never leave results() waiting
+                log.exception("Finishing {} failed".format(job.file_in))
+                job.batch.out_queue.put(ConversionResult(job.file_in,
+                                                         job.file_out,
+                                                         str(e)))
+            finally:
+                # signals to queue job is done
+                self.queue.task_done()
+
+    def process(self, job):
+        """Convert a job if needed, returns the status for its result"""
+        batch = job.batch
+        budget = self.engine.memory_budget
+        file_in, file_out, options = job.file_in, job.file_out, job.options
+        status = None
+        reserved = 0
+        job.picked = time.time()
+        try:
+            if batch.cancelled():
+                convert = False
+                status = STATUS_CANCELLED
+            elif job.staging is not None:
+                # checked before the source was copied
+                convert = True
+            else:
+                status = job.skip_status()
+                convert = status is None
+
+            if convert:
+                reserved = budget.acquire(job.memory, batch.cancel_event)
+                if batch.cancelled():
+                    convert = False
+                    status = STATUS_CANCELLED
+
+            if convert:
+                job.started = time.time()
+                job.temp = temp_output_path(job.local_out or file_out)
+                batch.started(job)
+                # hashed from the staged copy, but the copy's mtime can
+                # lose precision (python 2), the manifest needs the source's
+                job.signature = source_signature(job.source, job.content_hash)
+                job.signature['path'] = file_in
+                if job.source != file_in:
+                    job.signature['mtime'] = os.path.getmtime(file_in)
+                job.bytes_in = job.signature['size']
+                status = self.convert(job)
+                job.convert_time = time.time() - job.started
+                if status is None and job.staging is None:
+                    job.bytes_out = os.path.getsize(file_out)
+                    write_manifest(file_out, job.signature, options)
+                    job.add_to_store()
+        except Exception as e:
+            status = str(e)
+        finally:
+            if reserved:
+                budget.release(reserved)
+        return status
+
+
+class JobQueue(object):
+    """
+    The engine's queue, highest priority first and in the order jobs were
+    put within a priority
+
+    Waiting jobs can be reprioritized. None (a worker asked to stop) comes
+    after every job, like at the end of a FIFO queue.
+    """
+    _REMOVED = object()
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.heap = []
+        self.counter = itertools.count()
+        self.unfinished = 0
+        # waiting job: its heap entry
+        self.entries = {}
+
+    def _push(self, job):
+        priority = float('-inf') if job is None else job.priority
+        entry = [-priority, next(self.counter), job]
+        if job is not None:
+            self.entries[job] = entry
+        heapq.heappush(self.heap, entry)
 
-            # place data into out queue
-            self.out_queue.put((file_in, file_out, status))
+    def put(self, job):
+        with self.condition:
+            self._push(job)
+            self.unfinished += 1
+            self.condition.notify()
 
-            # signals to queue job is done
-            self.queue.task_done()
+    def get(self):
+        with self.condition:
+            while True:
+                while not self.heap:
+                    self.condition.wait()
+                job = heapq.heappop(self.heap)[2]
+                if job is self._REMOVED:
+                    continue
+                self.entries.pop(job, None)
+                return job
 
+    def task_done(self):
+        with self.condition:
+            self.unfinished -= 1
+            if not self.unfinished:
+                self.condition.notify_all()
 
-def convert_img_2_exr(executable, file_paths, threads = 8, overwrite=False, postfix='_tiled', compression='zips', tile_size=64, linear='off'):
+    def join(self):
+        with self.condition:
+            while self.unfinished:
+                self.condition.wait()
+
+    def reprioritize(self, file_paths, priority=None):
+        """
+        Change the priority of the waiting jobs converting file_paths
+
+        Args:
+            priority (int): new priority, None to put them above everything
+                that is waiting
+
+        Returns:
+            number of jobs changed
+        """
+        keys = set(path_key(path) for path in file_paths)
+        with self.condition:
+            if priority is None:
+                priority = max([job.priority for job in self.entries] +
+                               [PRIORITY_NORMAL]) + 1
+            jobs = [job for job in self.entries
+                    if path_key(job.file_in) in keys]
+            for job in jobs:
+                # the old entry is skipped when it comes up
+                self.entries.pop(job)[2] = self._REMOVED
+                job.priority = priority
+                self._push(job)
+        return len(jobs)
+
+
+class ConversionEngine(object):
+    """
+    Long lived pool of conversion workers
+
+    Batches submitted by different calls share the same workers, so the
+    number of threads stays flat no matter how often we convert.
+
+    Example:
+        engine = ConversionEngine(threads=4)
+        batch = engine.submit(jobs)
+        for file_in, file_out, status in batch.results():
+            print(file_in, status)
+        engine.shutdown()
+    """
+    def __init__(self, threads=None, memory_budget=None):
+        self.queue = JobQueue()
+        self.lock = threading.Lock()
+        self.workers = []
+        self.closed = False
+        # workers asked to stop that haven't picked up their None job yet
+        self._stopping = 0
+        self.memory_budget = MemoryBudget()
+        self.watchdog = Watchdog()
+        self.watchdog.start()
+        if memory_budget is None:
+            memory_budget = default_memory_budget()
+        self.configure(threads or default_threads(), memory_budget)
+
+    def configure(self, threads=None, memory_budget=None):
+        """
+        Set the pool size and memory budget, None keeps the current value
+
+        Shrinking the pool lets the surplus workers finish the jobs queued
+        before they exit.
+        """
+        if memory_budget is not None:
+            self.memory_budget.set_limit(memory_budget)
+        if not threads:
+            return
+        with self.lock:
+            alive = len(self.workers) - self._stopping
+            for i in range(threads - alive):
+                worker = ConvertImg2EXRThread(self)
+                worker.start()
+                self.workers.append(worker)
+            for i in range(alive - threads):
+                self.queue.put(None)
+                self._stopping += 1
+
+    @property
+    def size(self):
+        """Number of workers, not counting the ones asked to stop"""
+        with self.lock:
+            return len(self.workers) - self._stopping
+
+    def worker_stopped(self, worker):
+        with self.lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+                self._stopping = max(self._stopping - 1, 0)
+
+    def submit(self, jobs, cancel_event=None, callback=None, on_start=None,
+               report=None, journal=None, staging=None, skipped=()):
+        """
+        Queue jobs for conversion
+
+        Args:
+            skipped (ConversionResult[]): results of files that need no job,
+                they go through the batch first, see `ConversionBatch.skipped`
+            report (report.BatchReport): collects the results of the jobs
+            journal (journal.BatchJournal): records the progress of the jobs
+            staging (staging.StagingArea): copy sources to local scratch
+                first and the exrs back afterwards, jobs are queued as their
+                sources arrive
+
+        Returns:
+            ConversionBatch, iterate its results() to wait for the jobs
+        """
+        batch = ConversionBatch(jobs, cancel_event=cancel_event,
+                                callback=callback, on_start=on_start,
+                                report=report, journal=journal)
+        for result in skipped:
+            batch.skipped(result)
+        if staging is not None:
+            staging.stage(self, batch)
+        else:
+            self.enqueue(jobs)
+        return batch
+
+    def enqueue(self, jobs):
+        """Queue jobs of a batch created by submit()"""
+        now = time.time()
+        for job in jobs:
+            job.submitted = now
+            self.queue.put(job)
+
+    def reprioritize(self, file_paths, priority=None):
+        """Change the priority of waiting jobs, see `JobQueue.reprioritize`"""
+        return self.queue.reprioritize(file_paths, priority)
+
+    def drain(self):
+        """Block until every job submitted so far is done"""
+        self.queue.join()
+
+    def shutdown(self, wait=True):
+        """Stop all workers after the queued jobs are done"""
+        with self.lock:
+            self.closed = True
+            workers = list(self.workers)
+            for i in range(len(workers) - self._stopping):
+                self.queue.put(None)
+            self._stopping = len(workers)
+        self.watchdog.stop()
+        if wait:
+            for worker in workers:
+                worker.join()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(threads=None, memory_budget=None):
+    """
+    The conversion engine shared by everything in this session
+
+    It starts with the given pool size and memory budget, or the defaults.
+    Values given later resize it for every caller, None keeps what it has.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None or _engine.closed:
+            _engine = ConversionEngine(threads, memory_budget)
+            atexit.register(_engine.shutdown, False)
+        else:
+            _engine.configure(threads, memory_budget)
+        return _engine
+
+
+def reprioritize(file_paths, priority=None):
+    """
+    Change the priority of the waiting conversions of file_paths in this
+    session, None puts them above everything else that is waiting
+
+    Returns:
+        number of jobs changed
+    """
+    with _engine_lock:
+        engine = _engine
+    if engine is None or engine.closed:
+        return 0
+    return engine.reprioritize(file_paths, priority)
+
+
+def convert_img_2_exr(executable, file_paths, threads=None, overwrite=False, postfix='_tiled', compression='zips', tile_size=64, linear='off',
+                      only_stale=False, content_hash=False, cancel_event=None,
+                      callback=None, on_start=None, memory_budget=None,
+                      timeout=None, retries=0, backend=None, report=None,
+                      journal=None, staging=None, store=None,
+                      priorities=None):
     """This will convert the supplied list of files into tiled exr files.
 
+    Blocks until all files are done, see `iter_convert_img_2_exr` for the
+    arguments and to get results as soon as each file finishes.
+
+    Returns:
+        a list of tuples containing the orignal file name, the tiled exr file name, and the status string
+        a status of None means success, otherwise it will contain the exception string or a
+        reason as to why a file wasn't converted.
+    """
+    return list(iter_convert_img_2_exr(executable, file_paths,
+                                       threads=threads,
+                                       overwrite=overwrite,
+                                       postfix=postfix,
+                                       compression=compression,
+                                       tile_size=tile_size,
+                                       linear=linear,
+                                       only_stale=only_stale,
+                                       content_hash=content_hash,
+                                       cancel_event=cancel_event,
+                                       callback=callback,
+                                       on_start=on_start,
+                                       memory_budget=memory_budget,
+                                       timeout=timeout,
+                                       retries=retries,
+                                       backend=backend,
+                                       report=report,
+                                       journal=journal,
+                                       staging=staging,
+                                       store=store,
+                                       priorities=priorities))
+
+
+def iter_convert_img_2_exr(executable, file_paths, threads=None, overwrite=False, postfix='_tiled', compression='zips', tile_size=64, linear='off',
+                           only_stale=False, content_hash=False,
+                           cancel_event=None, callback=None, on_start=None,
+                           memory_budget=None, timeout=None, retries=0,
+                           backend=None, report=None, journal=None,
+                           staging=None, store=None, priorities=None):
+    """This will convert the supplied list of files into tiled exr files,
+    yielding each result as soon as its worker finishes.
+
     Args:
         executable (str): Path to vray img2tiledexr executable, for example : 'C:/Program Files/Chaos Group/V-Ray/Maya 2018 for x64/bin/img2tiledexr.exe'
+                        or a ConverterBackend instance (see `backends`)
         file_paths(str[]): List containing the files which need to be converted
                         allowed file types are TGA, PNG, JPG, TIFF, EXR, BMP, HDR, PIC, PSD
+        threads (int): Number of conversions running at the same time,
+                        defaults to the number of cpus. This sizes the
+                        worker pool shared by all calls, see `get_engine`,
+                        None keeps its current size.
         postfix (str): string to add as postfix to the file name
         overwrite (bool): Overwrite existing files?
         compression (str): EXR compression type, allowed values: 'none', 'rle', 'zip', 'zips', 'piz', 'pxr24', 'b44', 'b44a', 'dwaa', 'dwab'
         tile_size (int): Size of the tiles
         linear (str): Convert color space to linear, allowed values: 'auto', 'on', 'off'
+        only_stale (bool): When not overwriting, still convert existing files
+                        whose source or conversion options changed since they
+                        were converted (see `is_stale`)
+        content_hash (bool): Store and compare a sha1 of the source, so
+                        sources that were only touched aren't converted again
+        cancel_event (threading.Event): When set, queued files are skipped and
+                        running conversions are killed
+        callback (callable): Called with (file_in, file_out, status) as soon
+                        as a file is done, from the worker thread. Files that
+                        need no job (conflicts, resumed, unsupported) are
+                        done right away, from the calling thread.
+        on_start (callable): Called from the worker thread with file_in when
+                        its conversion actually starts
+        memory_budget (int): Bytes the running conversions may use together,
+                        estimated from the image headers. Defaults to half of
+                        the physical memory, 0 disables the limit.
+        timeout (float): Seconds a single conversion may take before it is
+                        killed, None waits forever
+        retries (int): Times a failed conversion is tried again
+        backend (str): Converter backend name (see `backends.BACKENDS`), the
+                        executable is used as that backend's executable
+        report (report.BatchReport): Collects timings and totals of the
+                        batch, by default a new one that only logs a summary
+        journal (journal.BatchJournal): Records progress on disk, files it
+                        has as done in an earlier run are not converted again
+        staging (staging.StagingArea): Copy sources to local scratch before
+                        converting and the exrs back afterwards, so network
+                        transfers overlap with the conversions
+        store (store.ConversionStore): Shared store of converted exrs,
+                        files whose content was converted with the same
+                        options before are taken from it instead of
+                        converted, new exrs are added to it
+        priorities (dict): Priority per file path, files with a higher
+                        priority are converted first, even before files of
+                        other batches waiting for the same workers. Missing
+                        files have PRIORITY_NORMAL. See `reprioritize` to
+                        change them while the batch runs.
 
-    Returns:
-        a tuple containing the orignal file name, the tiled exr file name, and the status string
+    Duplicate entries in file_paths are converted (and reported) only once,
+    files that would be converted to the same output as an earlier file
+    (a.tga and a.png) are reported as not converted.
+    Files of the same priority are converted largest first (judged by their
+    image headers), so a big texture doesn't end up alone at the end of the
+    batch.
+    Closing the generator before it is exhausted cancels the remaining files.
+
+    Yields:
+        a ConversionResult tuple containing the orignal file name, the tiled exr file name, and the status string
         a status of None means success, otherwise it will contain the exception string or a
-        reason as to why a file wasn't converted.
+        reason as to why a file wasn't converted (including the converter's
+        exit code and output when it failed). Its attributes hold the timings
+        and sizes of the conversion.
     """
-    in_queue = queue.Queue()
-    out_queue = queue.Queue()
-    options = '-compression {} -tileSize {} -linear {}'.format(compression, tile_size, linear)
-
-    # spawn a pool of threads, and pass them queue instance
-    for i in range(threads):
-        thread = ConvertImg2EXRThread(in_queue, out_queue)
-        thread.setDaemon(True)
-        thread.start()
+    options = conversion_options(compression, tile_size, linear)
+    backend = resolve_backend(executable, backend)
+    unsupported = backend.supports(options)
+    priorities = dict((path_key(path), priority)
+                      for path, priority in (priorities or {}).items())
 
+    jobs = []
+    # results known without converting, they come first
+    immediate = []
+    queued = set()
+    outputs = {}
     for file_in in file_paths:
-        file_out = '{}{}.exr'.format(os.path.splitext(file_in)[0], postfix)
-        in_queue.put((executable, file_in, file_out, overwrite, options))
+        key = path_key(file_in)
+        if key in queued:
+            continue
+        queued.add(key)
+        file_out = output_path(file_in, postfix)
+        # never run two jobs that write the same output, e.g. a.tga and a.png
+        other = outputs.setdefault(path_key(file_out), file_in)
+        if other != file_in:
+            immediate.append(ConversionResult(
+                file_in, file_out, STATUS_CONFLICT.format(other),
+                backend=backend.name, options=options))
+            continue
+        if journal is not None and journal.is_done(file_in, file_out,
+                                                   options):
+            # journaled again with its options, so it stays resumable
+            immediate.append(ConversionResult(
+                file_in, file_out, STATUS_RESUMED, backend=backend.name,
+                options=options))
+            continue
+        if unsupported:
+            immediate.append(ConversionResult(
+                file_in, file_out, STATUS_UNSUPPORTED.format(unsupported),
+                backend=backend.name, options=options))
+            continue
+        jobs.append(Img2EXRJob(backend, file_in, file_out, options,
+                               overwrite=overwrite, only_stale=only_stale,
+                               content_hash=content_hash,
+                               timeout=timeout, retries=retries,
+                               store=store,
+                               priority=priorities.get(key, PRIORITY_NORMAL)))
 
-    # wait on the queue until everything has been processed
-    in_queue.join()
+    # largest first, sorted() is stable so equal costs keep their order
+    jobs = sorted(jobs, key=lambda job: (job.priority, job.cost),
+                  reverse=True)
 
-    result = []
-    for i in range(out_queue.qsize()):
-        result.append(out_queue.get())
-    return result
+    engine = get_engine(threads, memory_budget)
+    if report is None:
+        report = batch_report.BatchReport()
+    report.start(engine.size)
+    batch = engine.submit(jobs, cancel_event=cancel_event, callback=callback,
+                          on_start=on_start, report=report, journal=journal,
+                          staging=staging, skipped=immediate)
+    results = batch.results()
+    try:
+        for result in results:
+            yield result
+    finally:
+        results.close()
+        report.finish()
@@ -0,0 +1,178 @@
+"""
+On disk journal of a conversion batch, to resume it after a crash
+
+Every conversion start and result is appended to a json lines file as it
+happens. Running the same batch with the same journal again skips the files
+that finished successfully and still exist, unless their source or the
+conversion options changed since, and removes the temporary files of
+conversions that were interrupted.
+
+Example:
+    journal = BatchJournal('P:/library/convert.journal')
+    convert_img_2_exr(executable, files, journal=journal)
+    journal.close()
+    # after a crash, the same call converts only what's left
+
+Each line is one json object with an "event" of "run" (a batch started),
+"start" (a conversion started, with its temporary output) or "done" (a
+result, see `img2tiledexrtool.ConversionResult.as_dict`, with the
+source_size and source_mtime it was converted from).
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from . import img2tiledexrtool
+
+log = logging.getLogger("img2exr Journal")
+
+
+class BatchJournal(object):
+    """
+    Append only record of which files of a batch are done
+
+    Writes are flushed right away, so a crash of the process loses nothing.
+    They're synced to disk at most every sync_interval seconds, which is what
+    an os crash or power cut can lose.
+    """
+    def __init__(self, path, options=None, sync_interval=5.0):
+        """
+        Args:
+            path (str): journal file, read first when it exists
+            options (dict): stored with the run, for reference
+            sync_interval (float): seconds between fsyncs
+        """
+        self.path = path
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        # path_key(source): last done record
+        self.done = {}
+        # path_key(source): temp file of a conversion that didn't finish
+        self.unfinished = {}
+        # path_key(source): (size, mtime) of a running conversion's source
+        self.sources = {}
+        self.read()
+        self.cleanup()
+        self.file = open(path, 'a')
+        if self.file.tell() and not self._ends_with_newline():
+            # finish the line a crash cut off, so it stays the only broken one
+            self.file.write('\n')
+        self.last_sync = time.time()
+        self._write({'event': 'run', 'time': time.time(),
+                     'options': options})
+
+    def read(self):
+        """Load the records of earlier runs"""
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path) as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line of a crashed run can be cut off
+                    log.warning("Skipping broken line {} of {}".format(
+                        number, self.path))
+                    continue
+                event = record.get('event')
+                if event not in ('start', 'done'):
+                    continue
+                key = img2tiledexrtool.path_key(record['source'])
+                if event == 'start':
+                    self.unfinished[key] = record.get('temp')
+                else:
+                    self.unfinished.pop(key, None)
+                    self.done[key] = record
+        if self.done:
+            log.info("Resuming from {}, {} files done before".format(
+                self.path, len([r for r in self.done.values() if r['ok']])))
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def cleanup(self):
+        """Remove the temporary outputs of interrupted conversions"""
+        for temp in self.unfinished.values():
+            if temp and os.path.isfile(temp):
+                log.info("Removing unfinished {}".format(temp))
+                try:
+                    os.remove(temp)
+                except OSError as e:
+                    log.warning("Could not remove {}: {}".format(temp, e))
+        self.unfinished.clear()
+
+    def is_done(self, file_in, file_out, options):
+        """
+        Whether an earlier run converted file_in with options, the source
+        didn't change since and the exr still exists
+        """
+        record = self.done.get(img2tiledexrtool.path_key(file_in))
+        if not record or not record['ok'] or not os.path.isfile(file_out):
+            return False
+        if record.get('options') != options:
+            return False
+        stat = _source_stat(file_in)
+        return stat is not None and \
+            [record.get('source_size'), record.get('source_mtime')] == \
+            list(stat)
+
+    def started(self, job):
+        key = img2tiledexrtool.path_key(job.file_in)
+        # before converting, a source changed while converting isn't done
+        with self.lock:
+            self.sources[key] = _source_stat(job.file_in)
+        self._write({'event': 'start', 'source': job.file_in,
+                     'temp': job.temp, 'time': time.time()})
+
+    def finished(self, result):
+        key = img2tiledexrtool.path_key(result.file_in)
+        with self.lock:
+            stat = self.sources.pop(key, None)
+        if stat is None:
+            # not converted (skipped, stored), the source is what it was
+            stat = _source_stat(result.file_in) or (None, None)
+        record = result.as_dict()
+        record['event'] = 'done'
+        record['time'] = time.time()
+        record['source_size'], record['source_mtime'] = stat
+        self._write(record)
+        self.done[key] = record
+
+    def _write(self, record):
+        line = json.dumps(record) + '\n'
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(line)
+            self.file.flush()
+            if time.time() - self.last_sync >= self.sync_interval:
+                os.fsync(self.file.fileno())
+                self.last_sync = time.time()
+
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _source_stat(path):
+    """(size, mtime) of a source, None when it's gone"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
@@ -0,0 +1,243 @@
+"""
+Read file texture nodes from Maya ASCII scenes without Maya
+
+The scene is streamed line by line, only statements that can matter for
+file nodes (createNode, setAttr on a file node and file references) are
+tokenized, everything else (mesh data mostly) is skipped as fast as we can
+find its end. Referenced .ma scenes are read as well, with their namespace
+prefixed to the node names. Binary (.mb) references can't be read and are
+skipped with a warning, as are values set through reference edits.
+
+Example:
+    nodes = read_scene('P:/Projects/test1/shots/sh010/work/lighting.ma')
+    data = model_data(nodes)            # like get_file_texture_model_data
+    paths = conversion_sources(nodes)   # what convert_files would convert
+"""
+import collections
+import logging
+import os
+import re
+
+from . import img2tiledexrtool
+from . import udim
+
+log = logging.getLogger("img2exr Maya ASCII")
+
+FileNode = collections.namedtuple(
+    'FileNode', 'node fileTextureName colorSpace tiledEXR tiledEXRSource '
+                'uvTilingMode useFrameExtension scene')
+
+# short and long attribute names as they appear in setAttr
+ATTRIBUTES = {
+    'ftn': 'fileTextureName', 'fileTextureName': 'fileTextureName',
+    'cs': 'colorSpace', 'colorSpace': 'colorSpace',
+    'tiledEXR': 'tiledEXR',
+    'tiledEXRSource': 'tiledEXRSource',
+    'uvt': 'uvTilingMode', 'uvTilingMode': 'uvTilingMode',
+    'ufe': 'useFrameExtension', 'useFrameExtension': 'useFrameExtension',
+}
+
+_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|([^\s;]+)')
+_ESCAPE = re.compile(r'\\(.)')
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+
+
+def _unescape(text):
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def tokenize(statement):
+    """
+    Split a MEL statement into (value, quoted) tuples
+
+    Maya splits long strings as "abc" + "def", those are joined again.
+    """
+    tokens = []
+    join = False
+    for quoted, bare in _TOKEN.findall(statement):
+        if bare == '+' and tokens and tokens[-1][1]:
+            join = True
+            continue
+        if bare:
+            tokens.append((bare, False))
+        elif join:
+            tokens[-1] = (tokens[-1][0] + _unescape(quoted), True)
+        else:
+            tokens.append((_unescape(quoted), True))
+        join = False
+    return tokens
+
+
+def iter_statements(f, wanted):
+    """
+    Yield the statements of a MEL file whose first word is in wanted
+
+    Physical lines never end inside a string in Maya ASCII files, so a line
+    ending in ; always ends the statement. Unwanted statements are skipped
+    without joining their lines.
+
+    Yields:
+        statement string, without the trailing ;
+    """
+    lines = None
+    skipping = False
+    for line in f:
+        stripped = line.strip()
+        if lines is None and not skipping:
+            if not stripped or stripped.startswith('//'):
+                continue
+            word = stripped.split(None, 1)[0]
+            if word in wanted:
+                lines = []
+            else:
+                skipping = True
+        if lines is not None:
+            lines.append(stripped)
+        if stripped.endswith(';'):
+            if lines is not None:
+                yield ' '.join(lines)[:-1]
+            lines = None
+            skipping = False
+
+
+def _value(value, quoted):
+    if quoted:
+        return value
+    if value in ('yes', 'true', 'on'):
+        return True
+    if value in ('no', 'false', 'off'):
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def _flags(tokens):
+    """Dict of -flag: value for the flags of a statement"""
+    flags = {}
+    for i, (value, quoted) in enumerate(tokens):
+        if not quoted and value.startswith('-') and i + 1 < len(tokens):
+            flags[value] = tokens[i + 1][0]
+    return flags
+
+
+def resolve_path(path, scene):
+    """Expand environment variables and make paths relative to the scene
+    absolute"""
+    path = os.path.expandvars(path)
+    if not os.path.isabs(path) and not re.match(r'^[a-zA-Z]:', path):
+        path = os.path.join(os.path.dirname(scene), path)
+    return path
+
+
+def read_scene(path, references=True, namespace='', _visited=None,
+               _parents=()):
+    """
+    Read all file nodes from a Maya ASCII scene
+
+    Args:
+        path (str): .ma scene file
+        references (bool): also read loaded .ma references
+        namespace (str): prefix for node names, used for references
+
+    Returns:
+        list of FileNode tuples, attributes that aren't set in the scene are
+        None
+    """
+    visited = _visited if _visited is not None else set()
+    key = img2tiledexrtool.path_key(path)
+    if key in _parents:
+        log.warning("Skipping reference loop back to {}".format(path))
+        return []
+    # the same scene referenced under another namespace has other nodes
+    if (key, namespace) in visited:
+        return []
+    visited.add((key, namespace))
+
+    nodes = collections.OrderedDict()
+    refs = []
+    current = None
+    with open(path, 'r') as f:
+        for statement in iter_statements(f, ('createNode', 'setAttr', 'file')):
+            word = statement.split(None, 1)[0]
+            if word == 'setAttr':
+                tokens = tokenize(statement)[1:]
+                plug = next((v for v, q in tokens if q), None)
+                if plug is None or len(tokens) < 2:
+                    continue
+                node, _, attr = plug.rpartition('.')
+                node = namespace + node if node else current
+                attr = ATTRIBUTES.get(attr)
+                if attr and node in nodes:
+                    nodes[node][attr] = _value(*tokens[-1])
+            elif word == 'createNode':
+                tokens = tokenize(statement)
+                flags = _flags(tokens)
+                if len(tokens) > 1 and tokens[1][0] == 'file':
+                    current = namespace + flags.get('-n', 'file')
+                    nodes[current] = {}
+                else:
+                    current = None
+            elif references:
+                tokens = tokenize(statement)
+                flags = _flags(tokens)
+                # -rdi lists the whole hierarchy, we only follow direct
+                # references and read their children ourselves
+                if '-r' not in flags or flags.get('-dr') == '1':
+                    continue
+                refs.append((tokens[-1][0], flags.get('-ns', '')))
+
+    result = [FileNode(node, attrs.get('fileTextureName'),
+                       attrs.get('colorSpace'), attrs.get('tiledEXR'),
+                       attrs.get('tiledEXRSource'), attrs.get('uvTilingMode'),
+                       attrs.get('useFrameExtension'), path)
+              for node, attrs in nodes.items()]
+
+    for ref, ns in refs:
+        ref = resolve_path(ref.split('{')[0], path)
+        if not ref.lower().endswith('.ma'):
+            log.warning("Can't read binary reference {}".format(ref))
+            continue
+        if not os.path.isfile(ref):
+            log.warning("Missing reference {}".format(ref))
+            continue
+        result.extend(read_scene(ref, references=True,
+                                 namespace='{}{}:'.format(namespace, ns)
+                                 if ns else namespace,
+                                 _visited=visited,
+                                 _parents=_parents + (key,)))
+    return result
+
+
+def model_data(nodes):
+    """
+    Same tuples as mayalib.get_file_texture_model_data
+
+    Returns:
+        list of tuples with state attr, maya node, file path
+    """
+    return [(node.tiledEXR or 0, node.node, node.fileTextureName)
+            for node in nodes]
+
+
+def conversion_sources(nodes):
+    """
+    Unique existing source files of file nodes, in the order found. Nodes
+    using uv tiles or frame sequences add all their tiles/frames on disk.
+
+    Returns:
+        list of source paths
+    """
+    sources = collections.OrderedDict()
+    for node in nodes:
+        pattern = udim.node_pattern(node.fileTextureName,
+                                    node.uvTilingMode or 0,
+                                    node.useFrameExtension or False)
+        file = img2tiledexrtool.source_path(pattern, node.tiledEXRSource)
+        for tile in udim.expand_pattern(file or ''):
+            sources.setdefault(img2tiledexrtool.path_key(tile), tile)
+    return list(sources.values())
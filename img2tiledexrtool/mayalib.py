@@ -8,39 +8,107 @@ conversion, if A == B we have a conversion but are viewing the non
 converted file, if A != B and A.endswith.exr we have a conversion and we are
 viewing the exr.
 """
+import collections
+import contextlib
 import logging
 import os
 import sys
+import threading
+import time
 
 import maya.cmds as cmds
 
+try:
+    import maya.api.OpenMaya as om
+except ImportError:
+    om = None
+
+try:
+    import maya.utils as maya_utils
+except ImportError:
+    maya_utils = None
+
+from . import exrheader
 from . import img2tiledexrtool
+from . import scenequery
+from . import udim
+from . import watch
 
 #reload(img2tiledexrtool)
 
 log = logging.getLogger("img2exr Maya Lib")
 
-def get_file_texture_model_data():
+def get_file_texture_model_data(validate=True):
     """
     Creates a list with tuples that contain the tiledEXR attr state,
     node name and file fileTextureName.
 
+    Args:
+        validate (bool): check the exr of nodes showing one, see
+            `get_file_texture_items`
+
     Returns:
         list of tuples with state attr, maya node, file path
 
     """
-    filenodes = get_file_texture_nodes()
-    data = []
+    return list(get_file_texture_items(get_file_texture_nodes(),
+                                       validate).values())
+
+
+def get_file_texture_items(nodes, validate=True):
+    """
+    Model data for some file nodes, see `get_file_texture_model_data`
+
+    Args:
+        nodes: list of file node names
+        validate (bool): nodes showing an exr that is missing, cut off or
+            not tiled get state 0, only their headers are read and cached
+            until the files change
+
+    Returns:
+        OrderedDict with node: (state, node, file path)
+    """
+    values = scenequery.query_file_nodes(nodes,
+                                         ('tiledEXR', 'fileTextureName'))
+    data = collections.OrderedDict()
     """ 0 = Not converted before, 1 = converted, but not active, 2 = converted and active (exr is current file)"""
-    for node in filenodes:
-        attr = 0
-        if cmds.attributeQuery('tiledEXR', node=node, exists=True):
-            attr = cmds.getAttr('{}.tiledEXR'.format(node))
-        data.append(
-            (attr, node, cmds.getAttr('{}.fileTextureName'.format(node))))
+    for node, attrs in values.items():
+        state = attrs['tiledEXR'] or 0
+        path = attrs['fileTextureName']
+        if validate and state == 2 and path and not udim.is_pattern(path):
+            problem = exrheader.cache.validate(path)
+            if problem is not None:
+                log.warning("{} shows a bad exr, {}: {}".format(node, problem,
+                                                               path))
+                state = 0
+        data[node] = (state, node, path)
     return data
 
 
+def get_file_texture_sources(nodes):
+    """
+    Where file nodes could be converted from, without touching the disk
+
+    Args:
+        nodes: list of file node names
+
+    Returns:
+        OrderedDict with node: list of source paths or patterns, the first
+        one that exists is the source (see `img2tiledexrtool.source_path`)
+    """
+    values = scenequery.query_file_nodes(nodes)
+    sources = collections.OrderedDict()
+    for node, attrs in values.items():
+        candidates = [attrs['tiledEXRSource']]
+        if attrs['tiledEXR'] != 2:
+            # the node isn't showing its exr, so it shows the source
+            candidates.append(udim.node_pattern(
+                attrs['fileTextureName'], attrs['uvTilingMode'] or 0,
+                attrs['useFrameExtension'] or False))
+        sources[node] = [c for c in candidates if c]
+    return sources
+
+
 def get_file_texture_nodes():
     """
     Find all file texture nodes in scene and return their dag path
@@ -59,6 +127,77 @@ def get_file_texture_nodes():
     return files
 
 
+def upstream_file_nodes(nodes):
+    """
+    File nodes feeding nodes, or the shaders assigned to them when they are
+    geometry
+
+    Returns:
+        set of long file node names
+    """
+    if not nodes:
+        return set()
+    shapes = cmds.listRelatives(nodes, allDescendents=True, shapes=True,
+                                fullPath=True) or []
+    shading_engines = cmds.listConnections(list(nodes) + shapes,
+                                           type='shadingEngine') or []
+    history = cmds.listHistory(list(nodes) + list(set(shading_engines))) or []
+    return set(cmds.ls(history, type='file', long=True) or [])
+
+
+def context_priorities(nodes):
+    """
+    Conversion priorities of file nodes from what the artist is working on
+
+    File nodes feeding the shaders of the selection come first, then the
+    ones used by objects in the active render layer, the rest after them.
+
+    Args:
+        nodes: list of long file node names, see `get_file_texture_nodes`
+
+    Returns:
+        dict with node: priority, see `img2tiledexrtool.PRIORITY_SELECTED`
+    """
+    selected = upstream_file_nodes(cmds.ls(selection=True, long=True) or [])
+    layered = set()
+    layer = cmds.editRenderLayerGlobals(query=True, currentRenderLayer=True)
+    if layer and layer != 'defaultRenderLayer':
+        members = cmds.editRenderLayerMembers(layer, query=True,
+                                              fullNames=True) or []
+        layered = upstream_file_nodes(members)
+
+    priorities = {}
+    for node in nodes:
+        if node in selected:
+            priorities[node] = img2tiledexrtool.PRIORITY_SELECTED
+        elif node in layered:
+            priorities[node] = img2tiledexrtool.PRIORITY_RENDER_LAYER
+        else:
+            priorities[node] = img2tiledexrtool.PRIORITY_NORMAL
+    return priorities
+
+
+def file_priorities(groups, sources, priorities):
+    """
+    Priority per file to convert, the highest of the nodes using it
+
+    Args:
+        groups (udim.TileGroups): files of the sources
+        sources: source: list of (node, color space), see `collect_sources`
+        priorities: node: priority, see `context_priorities`
+
+    Returns:
+        dict with file path: priority
+    """
+    source_priority = {}
+    for source, nodes in sources.items():
+        source_priority[source] = max(
+            [priorities.get(node, img2tiledexrtool.PRIORITY_NORMAL)
+             for node, _ in nodes] or [img2tiledexrtool.PRIORITY_NORMAL])
+    return dict((file, max(source_priority[s] for s in file_sources))
+                for file, file_sources in groups.files.items())
+
+
 def get_maya_install_dir():
     """
     Retarded way of finding from where our current maya is running from
@@ -109,9 +248,12 @@ def mark_for_conversion(filenodes=[]):
     return conversion_collection
 
 
-def convert_files(executable_path, data, preserve, postfix='_tiled', threads=8,
+def convert_files(executable_path, data, preserve, postfix='_tiled', threads=None,
                   overwrite=False, compression='zips', tile_size=64,
-                  linear='off', preserver_filter=''):
+                  linear='off', preserver_filter='', only_stale=False,
+                  content_hash=False, memory_budget=None, timeout=None,
+                  retries=0, backend=None, journal=None, store=None,
+                  priorities=None):
     """
     Convert a list of files to tiled exrs
 
@@ -120,59 +262,201 @@ def convert_files(executable_path, data, preserve, postfix='_tiled', threads=8,
         compression (str): EXR compression type, allowed values: 'none', 'rle', 'zip', 'zips', 'piz', 'pxr24', 'b44', 'b44a', 'dwaa', 'dwab'
         tile_size (int): Size of the tiles
         linear (str): Convert color space to linear, allowed values: 'auto', 'on', 'off'
-        threads: how many conversions can run at the same time
-        executable_path: file location of vray img2tiledexr executable
+        only_stale (bool): Reconvert existing files whose source or options
+            changed since their conversion
+        content_hash (bool): Compare source content hashes for staleness
+        threads: how many conversions can run at the same time, defaults to
+            the number of cpus
+        memory_budget: bytes the running conversions may use together,
+            defaults to half of the physical memory
+        timeout: seconds a single conversion may take before it's killed
+        retries: times a failed conversion is tried again
+        backend: converter backend name, see `backends.BACKENDS`
+        journal: journal.BatchJournal to resume an interrupted batch with
+        store: store.ConversionStore to take known exrs from
+        priorities: dict of node: priority, files of nodes with a higher
+            priority are converted first (see `context_priorities`)
+        executable_path: file location of vray img2tiledexr executable, or
+            the executable of the backend
         data: list of node tuples (as returned by get_file_texture_model_data)
 
     Returns:
 
     """
 
-    file_nodes = zip(*data)[1]
-    file_color_spaces = []
-    file_paths = []
     preserver_filters = preserver_filter.strip().split(',')
-    for node in file_nodes:
-        if cmds.attributeQuery('tiledEXRSource', node=node, exists=True):
-            file = cmds.getAttr('{}.tiledEXRSource'.format(node))
-            if not file or not os.path.exists(file) or not os.path.isfile(file):
-                file = cmds.getAttr('{}.fileTextureName'.format(node))
-                cmds.setAttr('{}.tiledEXRSource'.format(node), file,
-                             type="string")
+    sources = collect_sources([item[1] for item in data])
+    # uv tile and sequence sources expand into all their files
+    groups = udim.TileGroups(sources, img2tiledexrtool.is_usable)
+    if priorities is not None:
+        priorities = file_priorities(groups, sources, priorities)
+
+    # start conversion, every unique source is converted only once
+    results = img2tiledexrtool.iter_convert_img_2_exr(executable_path,
+                                                      list(groups.files),
+                                                      postfix=postfix,
+                                                      threads=threads,
+                                                      overwrite=overwrite,
+                                                      compression=compression,
+                                                      linear=linear,
+                                                      tile_size=tile_size,
+                                                      only_stale=only_stale,
+                                                      content_hash=content_hash,
+                                                      memory_budget=memory_budget,
+                                                      timeout=timeout,
+                                                      retries=retries,
+                                                      backend=backend,
+                                                      journal=journal,
+                                                      store=store,
+                                                      priorities=priorities)
+
+    # nodes are reconnected once all their files converted succesfully,
+    # together at the end so it's a single undo step. Results are tuples
+    # containing: ( file_in, file_out, status (None = succes))
+    relinks = []
+    start = time.time()
+    for count, (file_in, file_out, status) in enumerate(results, 1):
+        if not img2tiledexrtool.is_usable(status):
+            log.warning("Failed to convert {}: {}".format(file_in, status))
         else:
-            file = cmds.getAttr('{}.fileTextureName'.format(node))
-
-        if file and os.path.exists(file) and os.path.isfile(file):
-            file_paths.append(file)
-            file_color_spaces.append(cmds.getAttr('{}.colorSpace'.format(node)))
-
-    # start conversion:
-    result = img2tiledexrtool.convert_img_2_exr(executable_path, file_paths,
-                                                postfix=postfix,
-                                                threads=threads,
-                                                overwrite=overwrite,
-                                                compression=compression,
-                                                linear=linear,
-                                                tile_size=tile_size)
-
-    # done, reconnect files that converted succesfully and set attributes
-    # result should contain a list of tuples containing:
-    # ( file_in, file_out, status (None = succes))
-    file_paths = list(zip(*data)[2])
-    for item in result:
-        idx = file_paths.index(item[0])
-        if idx is not None:
-            node = file_nodes[idx]
-            if not cmds.attributeQuery('tiledEXRSource', node=node, exists=True):
-                cmds.addAttr(node, longName='tiledEXRSource', dt="string")
-            cmds.setAttr('{}.tiledEXRSource'.format(node), item[0], type="string")
-            cmds.setAttr('{}.fileTextureName'.format(node), item[1], type="string")
-            if not cmds.attributeQuery('tiledEXR', node=node, exists=True):
-                cmds.addAttr(node, longName='tiledEXR', min=0, max=2, at='byte', w=False, r=True)
-            cmds.setAttr('{}.tiledEXR'.format(node), 2)
-            if preserve:
-                if any(n in item[1] for n in preserver_filters):
-                    cmds.setAttr('{}.colorSpace'.format(node), file_color_spaces[idx], type="string")
+            log.info("[{}/{}] {:.1f}s {}".format(count, len(groups.files),
+                                                time.time() - start, file_out))
+        for source, source_status in groups.finish(file_in, status):
+            if not img2tiledexrtool.is_usable(source_status):
+                continue
+            file_out = img2tiledexrtool.output_path(source, postfix)
+            for node, color_space in sources[source]:
+                relinks.append((node, source, file_out, color_space))
+    relink_nodes(relinks, preserve, preserver_filters)
+
+
+def collect_sources(file_nodes):
+    """
+    Group file nodes by the source texture they should be converted from
+
+    Many file nodes tend to point at the same texture, grouping them lets us
+    convert each texture once and relink all nodes that use it afterwards.
+    Paths are compared normalized, the first spelling found is used. Nodes
+    using uv tiles or a frame extension get a tokenised pattern as source,
+    e.g. skin.<UDIM>.tif, see `udim`.
+
+    Args:
+        file_nodes: list of file node names
+
+    Returns:
+        OrderedDict with source path: list of (node, color space) tuples
+    """
+    sources = collections.OrderedDict()
+    spellings = {}
+    # node: stored source to write, for nodes whose stored source is gone
+    changes = collections.OrderedDict()
+    values = scenequery.query_file_nodes(file_nodes)
+    for node, attrs in values.items():
+        pattern = udim.node_pattern(attrs['fileTextureName'],
+                                    attrs['uvTilingMode'] or 0,
+                                    attrs['useFrameExtension'] or False)
+        file = img2tiledexrtool.source_path(pattern, attrs['tiledEXRSource'])
+        if attrs['tiledEXRSource'] is not None and \
+                file != attrs['tiledEXRSource']:
+            # the stored source is gone, remember the current file instead
+            changes[node] = {'tiledEXRSource': file}
+
+        if file and udim.exists(file):
+            file = spellings.setdefault(img2tiledexrtool.path_key(file), file)
+            sources.setdefault(file, []).append((node, attrs['colorSpace']))
+
+    if changes:
+        with batched_edit('img2tiledexr sources'):
+            scenequery.set_file_nodes(changes, values)
+    return sources
+
+
+def relink_node(node, file_in, file_out, color_space, preserve,
+                preserver_filters):
+    """
+    Point a file node at its converted exr and store its source
+
+    Args:
+        node: file node name
+        file_in: source texture the exr was converted from
+        file_out: converted tiled exr
+        color_space: color space of the node before conversion
+        preserve: restore the color space for files matching the filters
+        preserver_filters: list of file name parts to preserve color space for
+
+    """
+    relink_nodes([(node, file_in, file_out, color_space)], preserve,
+                 preserver_filters)
+
+
+def relink_nodes(relinks, preserve, preserver_filters):
+    """
+    Point many file nodes at their converted exrs in a single undo step
+
+    Nodes that already point at their exr are left alone.
+
+    Args:
+        relinks: list of (node, file_in, file_out, color_space) tuples, see
+            `relink_node`
+        preserve: restore the color space for files matching the filters
+        preserver_filters: list of file name parts to preserve color space for
+
+    Returns:
+        number of nodes changed
+    """
+    current = scenequery.query_file_nodes([r[0] for r in relinks],
+                                          ('tiledEXR', 'tiledEXRSource',
+                                           'fileTextureName', 'colorSpace'))
+    changes = collections.OrderedDict()
+    for node, file_in, file_out, color_space in relinks:
+        values = collections.OrderedDict([('tiledEXRSource', file_in),
+                                          ('fileTextureName', file_out),
+                                          ('tiledEXR', 2)])
+        if preserve and any(n in file_out for n in preserver_filters):
+            values['colorSpace'] = color_space
+        if any(current[node].get(attr) != value
+               for attr, value in values.items()):
+            changes[node] = values
+    if not changes:
+        return 0
+
+    with batched_edit('img2tiledexr relink'):
+        for node in changes:
+            add_tiled_exr_attributes(node, current[node])
+        scenequery.set_file_nodes(changes, current)
+    return len(changes)
+
+
+def add_tiled_exr_attributes(node, values):
+    """Add the attributes we keep on converted nodes, values as returned by
+    `scenequery.query_file_nodes` tell which exist already"""
+    if values.get('tiledEXRSource') is None:
+        cmds.addAttr(node, longName='tiledEXRSource', dt="string")
+    if values.get('tiledEXR') is None:
+        cmds.addAttr(node, longName='tiledEXR', min=0, max=2, at='byte', w=False, r=True)
+
+
+@contextlib.contextmanager
+def batched_edit(chunk_name='img2tiledexr'):
+    """
+    Group scene edits into one undo step and redraw once at the end
+
+    Every fileTextureName change makes Maya reload the texture and redraw
+    the viewports. With refresh suspended that happens once for the whole
+    batch instead of once per node.
+    """
+    suspended = cmds.refresh(query=True, suspend=True)
+    cmds.undoInfo(openChunk=True, chunkName=chunk_name)
+    if not suspended:
+        cmds.refresh(suspend=True)
+    try:
+        yield
+    finally:
+        if not suspended:
+            cmds.refresh(suspend=False)
+        cmds.undoInfo(closeChunk=True)
+        if not suspended:
+            cmds.refresh()
 
 
 def revert_nodes(file_nodes, postfix, set_to_source, preserve,
@@ -194,30 +478,33 @@ def revert_nodes(file_nodes, postfix, set_to_source, preserve,
     """
 
     preserver_filters = preserver_filter.strip().split(',')
-
-    for node in file_nodes:
-        if cmds.attributeQuery('tiledEXR', node=node[1], exists=True):
-            color_space = cmds.getAttr('{}.colorSpace'.format(node[1]))
-            if set_to_source:
-                if cmds.attributeQuery('tiledEXRSource', node=node[1], exists=True):
-                    source = cmds.getAttr('{}.tiledEXRSource'.format(node[1]))
-                    cmds.setAttr('{}.fileTextureName'.format(node[1]), source, type="string")
-                    cmds.setAttr('{}.tiledEXR'.format(node[1]), 1)
-                    if preserve:
-                        if any(n in source for n in preserver_filters):
-                            cmds.setAttr('{}.colorSpace'.format(node[1]), color_space, type="string")
-            else:
-                if cmds.attributeQuery('tiledEXRSource', node=node[1], exists=True):
-                    source = cmds.getAttr('{}.tiledEXRSource'.format(node[1]))
-
-                    file = '{}{}.exr'.format(os.path.splitext(source)[0],
-                                             postfix)
-                    print(color_space)
-                    cmds.setAttr('{}.fileTextureName'.format(node[1]), file, type="string")
-                    cmds.setAttr('{}.tiledEXR'.format(node[1]), 2)
-                    if preserve:
-                        if any(n in file for n in preserver_filters):
-                            cmds.setAttr('{}.colorSpace'.format(node[1]), color_space, type="string")
+    values = scenequery.query_file_nodes([node[1] for node in file_nodes],
+                                         ('tiledEXR', 'tiledEXRSource',
+                                          'fileTextureName', 'colorSpace'))
+
+    changes = collections.OrderedDict()
+    for node, attrs in values.items():
+        source = attrs['tiledEXRSource']
+        if attrs['tiledEXR'] is None or source is None:
+            continue
+        if set_to_source:
+            file = source
+            state = 1
+        else:
+            file = img2tiledexrtool.output_path(source, postfix)
+            state = 2
+        if attrs['fileTextureName'] == file and attrs['tiledEXR'] == state:
+            # already showing what we want
+            continue
+        changes[node] = collections.OrderedDict([('fileTextureName', file),
+                                                 ('tiledEXR', state)])
+        if preserve:
+            if any(n in file for n in preserver_filters):
+                changes[node]['colorSpace'] = attrs['colorSpace']
+
+    if changes:
+        with batched_edit('img2tiledexr switch'):
+            scenequery.set_file_nodes(changes, values)
 
 def get_tiled_exr_exe_dir():
     """
@@ -234,3 +521,336 @@ def get_tiled_exr_exe_dir():
         maya_version)
     if not os.path.exists(path): path = ""
     return path
+
+
+class SceneWatcher(object):
+    """
+    Collects file node changes through Maya callbacks
+
+    The callbacks only record what changed, `on_change` is called so the
+    owner can schedule a single update and pick the changes up with
+    `take_changes`. Outside of Maya (no OpenMaya) nothing is watched.
+
+    Example:
+        watcher = SceneWatcher(timer.start)
+        watcher.start()
+        added, removed, renamed, changed = watcher.take_changes()
+    """
+    # attributes that change what the list shows
+    ATTRIBUTES = ('fileTextureName', 'tiledEXR')
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self.callback_ids = []
+        # MObjectHandle hash: attribute changed callback id
+        self.node_callbacks = {}
+        self.added = set()
+        self.removed = set()
+        self.renamed = collections.OrderedDict()
+        self.changed = set()
+
+    @property
+    def available(self):
+        return om is not None
+
+    def start(self):
+        if om is None or self.callback_ids:
+            return
+        self.callback_ids = [
+            om.MDGMessage.addNodeAddedCallback(self._node_added, 'file'),
+            om.MDGMessage.addNodeRemovedCallback(self._node_removed, 'file'),
+            om.MNodeMessage.addNameChangedCallback(om.MObject.kNullObj,
+                                                   self._name_changed),
+        ]
+        iterator = om.MItDependencyNodes(om.MFn.kFileTexture)
+        while not iterator.isDone():
+            self._watch_node(iterator.thisNode())
+            iterator.next()
+
+    def stop(self):
+        if om is None:
+            return
+        ids = self.callback_ids + list(self.node_callbacks.values())
+        if ids:
+            om.MMessage.removeCallbacks(ids)
+        self.callback_ids = []
+        self.node_callbacks = {}
+
+    def take_changes(self):
+        """
+        Returns:
+            tuple of added nodes, removed nodes, {old name: new name} and
+            nodes with changed attributes, since the last call
+        """
+        changes = (self.added, self.removed, self.renamed, self.changed)
+        self.added = set()
+        self.removed = set()
+        self.renamed = collections.OrderedDict()
+        self.changed = set()
+        return changes
+
+    def _notify(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def _watch_node(self, mobject):
+        key = om.MObjectHandle(mobject).hashCode()
+        if key not in self.node_callbacks:
+            self.node_callbacks[key] = \
+                om.MNodeMessage.addAttributeChangedCallback(
+                    mobject, self._attribute_changed)
+
+    def _node_added(self, mobject, client_data=None):
+        self._watch_node(mobject)
+        name = om.MFnDependencyNode(mobject).name()
+        self.removed.discard(name)
+        self.added.add(name)
+        self._notify()
+
+    def _node_removed(self, mobject, client_data=None):
+        callback_id = self.node_callbacks.pop(
+            om.MObjectHandle(mobject).hashCode(), None)
+        if callback_id is not None:
+            om.MMessage.removeCallback(callback_id)
+        name = om.MFnDependencyNode(mobject).name()
+        if name in self.added:
+            self.added.discard(name)
+        else:
+            self.removed.add(name)
+        self.changed.discard(name)
+        self._notify()
+
+    def _name_changed(self, mobject, old_name, client_data=None):
+        if not mobject.hasFn(om.MFn.kFileTexture) or not old_name:
+            return
+        name = om.MFnDependencyNode(mobject).name()
+        if name == old_name:
+            return
+        if old_name in self.added:
+            self.added.discard(old_name)
+            self.added.add(name)
+        else:
+            # chained renames keep the name the list knows the node by
+            for first, last in self.renamed.items():
+                if last == old_name:
+                    old_name = first
+                    break
+            self.renamed[old_name] = name
+        self._notify()
+
+    def _attribute_changed(self, msg, plug, other_plug, client_data=None):
+        if not msg & (om.MNodeMessage.kAttributeSet |
+                      om.MNodeMessage.kAttributeAdded):
+            return
+        if plug.partialName(useLongNames=True) not in self.ATTRIBUTES:
+            return
+        self.changed.add(om.MFnDependencyNode(plug.node()).name())
+        self._notify()
+
+
+def reload_nodes(nodes):
+    """
+    Make file nodes read their texture again, like the reload button of the
+    attribute editor, without adding undo steps
+    """
+    values = scenequery.query_file_nodes(nodes, ('fileTextureName',))
+    undo = cmds.undoInfo(query=True, state=True)
+    cmds.undoInfo(stateWithoutFlush=False)
+    try:
+        for node, attrs in values.items():
+            if attrs['fileTextureName']:
+                cmds.setAttr('{}.fileTextureName'.format(node),
+                             attrs['fileTextureName'], type="string")
+    finally:
+        cmds.undoInfo(stateWithoutFlush=undo)
+
+
+def _main_thread(function, *args):
+    """Run function on Maya's main thread, right away outside of Maya"""
+    if maya_utils is None:
+        function(*args)
+    else:
+        maya_utils.executeDeferred(function, *args)
+
+
+class WatchService(object):
+    """
+    Converts the sources of converted file nodes again when they change
+
+    A `watch.SourceWatcher` polls the directories of the scene's
+    tiledEXRSource paths, or the given folder trees, in the background.
+    Changed files are converted in a background thread with only_stale, so
+    exrs that are still current are skipped. A file node showing its exr is
+    reloaded once all changed files of its source were converted and
+    replaced their exrs, never while an exr is being written. Everything
+    touching the scene runs on the main thread.
+
+    Example:
+        service = WatchService(get_tiled_exr_exe_dir(), compression='zips')
+        service.start()
+    """
+    def __init__(self, executable_path, directories=None, recursive=False,
+                 interval=2.0, debounce=2.0, postfix='_tiled', store=None,
+                 **options):
+        """
+        Args:
+            executable_path: img2tiledexr, or the executable of the backend
+            directories: folder trees to watch instead of the directories
+                of the scene's sources, $IMG2EXR_WATCH by default
+            recursive (bool): watch subdirectories, always on for the
+                configured folder trees
+            interval (float): seconds between polls
+            debounce (float): seconds a file has to stay unchanged
+            postfix (str): postfix of the converted files
+            store: store.ConversionStore to take known exrs from
+            options: more `img2tiledexrtool.convert_img_2_exr` arguments
+                (compression, tile_size, linear, backend, ...)
+        """
+        self.executable_path = executable_path
+        if directories is None:
+            directories = watch.configured_directories()
+        self.directories = list(directories)
+        self.recursive = recursive or bool(self.directories)
+        self.postfix = postfix
+        self.store = store
+        self.options = options
+        self.watcher = watch.SourceWatcher(self._changed,
+                                           recursive=self.recursive,
+                                           interval=interval,
+                                           debounce=debounce,
+                                           postfix=postfix)
+        self.cancel_event = threading.Event()
+        # source: list of converted nodes, and a matcher of the sources
+        self.sources = collections.OrderedDict()
+        self.matcher = watch.SourceMatcher([])
+        # source: Counter of files still converting
+        self.pending = {}
+        # sources with a failed file since their last reload
+        self.failed = set()
+
+    @property
+    def running(self):
+        return self.watcher.is_alive() and not self.cancel_event.is_set()
+
+    def start(self):
+        self.refresh()
+        self.watcher.start()
+        log.info("Watching the sources of {} converted nodes".format(
+            sum(len(nodes) for nodes in self.sources.values())))
+
+    def stop(self):
+        """Stop watching, running conversions are cancelled"""
+        self.cancel_event.set()
+        self.watcher.stop()
+
+    def refresh(self):
+        """Pick up the converted nodes of the scene, call after relinking"""
+        nodes = cmds.ls(type='file', l=True) or []
+        values = scenequery.query_file_nodes(nodes, ('tiledEXRSource',))
+        sources = collections.OrderedDict()
+        for node, attrs in values.items():
+            if attrs['tiledEXRSource']:
+                sources.setdefault(attrs['tiledEXRSource'], []).append(node)
+        self.sources = sources
+        self.matcher = watch.SourceMatcher(sources)
+        self.watcher.set_directories(self.directories or
+                                     self.matcher.directories())
+
+    def _changed(self, files):
+        # watcher thread
+        _main_thread(self._convert, files)
+
+    def _convert(self, files):
+        if self.cancel_event.is_set():
+            return
+        self.refresh()
+        if not self.directories:
+            # only sources of the scene are watched
+            files = [f for f in files if self.matcher.match(f)]
+        if not files:
+            return
+        for file in files:
+            source = self.matcher.match(file)
+            if source is not None:
+                self.pending.setdefault(source, collections.Counter())[
+                    img2tiledexrtool.path_key(file)] += 1
+        log.info("{} sources changed, converting".format(len(files)))
+        thread = threading.Thread(target=self._run, args=(files,))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, files):
+        # conversion thread
+        try:
+            for file_in, file_out, status in \
+                    img2tiledexrtool.iter_convert_img_2_exr(
+                        self.executable_path, files, postfix=self.postfix,
+                        only_stale=True, cancel_event=self.cancel_event,
+                        store=self.store, **self.options):
+                _main_thread(self._finished, file_in, status)
+        except Exception:
+            log.exception("Converting changed sources failed")
+            for file in files:
+                _main_thread(self._finished, file, "conversion failed")
+
+    def _finished(self, file_in, status):
+        if not img2tiledexrtool.is_usable(status):
+            log.warning("Failed to convert {}: {}".format(file_in, status))
+        source = self.matcher.match(file_in)
+        pending = self.pending.get(source)
+        if pending is None:
+            return
+        key = img2tiledexrtool.path_key(file_in)
+        pending[key] -= 1
+        if pending[key] <= 0:
+            del pending[key]
+        if not img2tiledexrtool.is_usable(status):
+            self.failed.add(source)
+        if pending:
+            return
+        del self.pending[source]
+        if source in self.failed:
+            # keep showing the last good exr
+            self.failed.discard(source)
+            return
+        if self.cancel_event.is_set():
+            return
+        nodes = self.sources.get(source, [])
+        values = scenequery.query_file_nodes(nodes, ('tiledEXR',))
+        showing = [node for node, attrs in values.items()
+                   if attrs['tiledEXR'] == 2]
+        if showing:
+            log.info("Reloading {} nodes of {}".format(len(showing), source))
+            reload_nodes(showing)
+
+
+_service = None
+
+
+def start_watch_service(executable_path, **kwargs):
+    """
+    Start watching the scene's sources in the background, arguments as
+    for `WatchService`. A running service is replaced.
+
+    Returns:
+        the WatchService
+    """
+    global _service
+    stop_watch_service()
+    _service = WatchService(executable_path, **kwargs)
+    _service.start()
+    return _service
+
+
+def stop_watch_service():
+    global _service
+    if _service is not None:
+        _service.stop()
+        _service = None
+
+
+def watch_service():
+    """The running WatchService, None when not watching"""
+    if _service is not None and _service.running:
+        return _service
+    return None
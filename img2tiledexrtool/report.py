@@ -0,0 +1,208 @@
+"""
+Totals and timings of a conversion batch
+
+`BatchReport` collects the ConversionResults of a batch as they come in and
+sums them up: throughput in megapixels and gigabytes per second, how busy
+the workers were and which files took longest. The summary is logged when
+the batch finishes and can be written as json.
+
+Metrics hooks get every result and every batch summary, to feed our own
+metrics collector:
+
+    def collect(event, data):
+        if event == 'batch':
+            statsd.gauge('img2exr.mp_per_second', data['mp_per_second'])
+
+    report.add_metrics_hook(collect)
+"""
+import collections
+import json
+import logging
+import threading
+import time
+
+log = logging.getLogger("img2exr Report")
+
+# callables taking (event, data), see add_metrics_hook
+_hooks = []
+
+
+def add_metrics_hook(hook):
+    """
+    Call hook for every conversion result and batch
+
+    Args:
+        hook (callable): called with ('result', ConversionResult) from the
+            worker threads and ('batch', summary dict) when a batch finishes
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_metrics_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def _call_hooks(hooks, event, data):
+    for hook in hooks:
+        try:
+            hook(event, data)
+        except Exception:
+            log.exception("Metrics hook failed")
+
+
+def percentile(values, fraction):
+    """Value below which fraction of the values fall, None for no values"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class BatchReport(object):
+    """
+    Collects the results of a conversion batch
+
+    Results are added from the worker threads. The wall time runs from
+    start() to finish(), utilisation is the time spent converting divided by
+    the wall time of all workers.
+
+    Example:
+        report = BatchReport()
+        convert_img_2_exr(executable, files, report=report)
+        report.summary()['mp_per_second']
+        report.write('report.json')
+    """
+    def __init__(self, slowest=10, hook=None):
+        """
+        Args:
+            slowest (int): number of slowest files kept in the summary
+            hook (callable): metrics hook for this batch only, see
+                `add_metrics_hook`
+        """
+        self.slowest_count = slowest
+        self.hook = hook
+        self.lock = threading.Lock()
+        self.results = []
+        self.threads = None
+        self.start_time = None
+        self.end_time = None
+
+    def _hooks(self):
+        return _hooks + ([self.hook] if self.hook is not None else [])
+
+    def start(self, threads=None):
+        self.threads = threads
+        self.start_time = time.time()
+        self.end_time = None
+
+    def add(self, result):
+        with self.lock:
+            self.results.append(result)
+        _call_hooks(self._hooks(), 'result', result)
+
+    def finish(self):
+        """Stop the clock, log the summary and tell the metrics hooks"""
+        if self.end_time is not None:
+            return
+        self.end_time = time.time()
+        summary = self.summary()
+        if summary['files']:
+            self.log_summary(summary)
+        _call_hooks(self._hooks(), 'batch', summary)
+
+    @property
+    def wall_time(self):
+        if self.start_time is None:
+            return None
+        return (self.end_time or time.time()) - self.start_time
+
+    def slowest(self, count=None):
+        """The results that took longest to convert, slowest first"""
+        with self.lock:
+            converted = [r for r in self.results if r.convert_time]
+        converted.sort(key=lambda r: r.convert_time, reverse=True)
+        return converted[:self.slowest_count if count is None else count]
+
+    def summary(self):
+        """
+        Returns:
+            OrderedDict with the batch totals, rates are None when nothing
+            was converted
+        """
+        with self.lock:
+            results = list(self.results)
+        converted = [r for r in results if r.status is None]
+        failed = [r for r in results if not r.ok]
+        wall = self.wall_time
+        busy = sum(r.convert_time or 0 for r in results)
+        pixels = sum(r.pixels or 0 for r in converted)
+        bytes_in = sum(r.bytes_in or 0 for r in converted)
+        bytes_out = sum(r.bytes_out or 0 for r in converted)
+        waits = [r.queue_wait for r in results if r.queue_wait is not None]
+        times = [r.convert_time for r in converted]
+
+        def rate(amount, unit):
+            if not converted or not wall:
+                return None
+            return amount / float(unit) / wall
+
+        summary = collections.OrderedDict()
+        summary['files'] = len(results)
+        summary['converted'] = len(converted)
+        summary['skipped'] = len(results) - len(converted) - len(failed)
+        summary['failed'] = len(failed)
+        summary['threads'] = self.threads
+        summary['wall_time'] = wall
+        summary['busy_time'] = busy
+        summary['utilisation'] = busy / (wall * self.threads) \
+            if wall and self.threads else None
+        summary['megapixels'] = pixels / 1e6
+        summary['mp_per_second'] = rate(pixels, 1e6)
+        summary['bytes_in'] = bytes_in
+        summary['bytes_out'] = bytes_out
+        summary['read_gb_per_second'] = rate(bytes_in, 1e9)
+        summary['write_gb_per_second'] = rate(bytes_out, 1e9)
+        summary['stage_in_time'] = sum(r.stage_in_time or 0 for r in results)
+        summary['stage_out_time'] = sum(r.stage_out_time or 0
+                                        for r in results)
+        summary['convert_time_p50'] = percentile(times, 0.5)
+        summary['convert_time_p90'] = percentile(times, 0.9)
+        summary['queue_wait_p50'] = percentile(waits, 0.5)
+        summary['queue_wait_max'] = max(waits) if waits else None
+        summary['slowest'] = [
+            collections.OrderedDict([
+                ('source', r.file_in),
+                ('convert_time', r.convert_time),
+                ('pixels', r.pixels),
+                ('bytes_in', r.bytes_in),
+                ('attempts', r.attempts)])
+            for r in self.slowest()]
+        return summary
+
+    def as_dict(self):
+        """The summary with every result, for a json report"""
+        data = self.summary()
+        with self.lock:
+            data['results'] = [r.as_dict() for r in self.results]
+        return data
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def log_summary(self, summary=None):
+        summary = summary or self.summary()
+        text = "Converted {converted} of {files} files ({skipped} skipped, " \
+               "{failed} failed) in {wall_time:.1f}s".format(**summary)
+        if summary['mp_per_second'] is not None:
+            text += ", {:.1f} MP/s, {:.3f} GB/s read".format(
+                summary['mp_per_second'], summary['read_gb_per_second'])
+        if summary['utilisation'] is not None:
+            text += ", {:.0%} of {} workers busy".format(
+                summary['utilisation'], summary['threads'])
+        log.info(text)
+        for entry in summary['slowest']:
+            log.debug("Slow: {:.1f}s {} ({} pixels)".format(
+                entry['convert_time'], entry['source'], entry['pixels']))
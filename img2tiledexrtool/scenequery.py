@@ -0,0 +1,157 @@
+"""
+Bulk read layer for file node attributes
+
+Querying a handful of attributes per node through maya.cmds costs a command
+round trip for every attribute of every node, on scenes with thousands of file
+nodes that adds up to many seconds. This module reads all requested attributes
+for a list of nodes in one go, through the OpenMaya API when it is available
+and through a minimal number of maya.cmds calls otherwise (which is also what
+runs against the `stubcmds` module outside of Maya).
+
+Writes go through `set_file_nodes`, which skips values that are already
+set. They are plain setAttr calls so they land in Maya's undo queue.
+
+Example:
+    values = query_file_nodes(cmds.ls(type='file'))
+    values['file1']['tiledEXRSource']  # None when the attribute doesn't exist
+"""
+import collections
+import logging
+
+import maya.cmds as cmds
+
+try:
+    import maya.api.OpenMaya as om
+except ImportError:
+    om = None
+
+log = logging.getLogger("img2exr Scene Query")
+
+# attributes we read and how to read them from a plug
+ATTRIBUTE_TYPES = {
+    'fileTextureName': 'string',
+    'colorSpace': 'string',
+    'tiledEXR': 'int',
+    'tiledEXRSource': 'string',
+    'uvTilingMode': 'int',
+    'useFrameExtension': 'int',
+}
+
+FILE_NODE_ATTRIBUTES = ('fileTextureName', 'colorSpace', 'tiledEXR',
+                        'tiledEXRSource', 'uvTilingMode', 'useFrameExtension')
+
+
+def query_file_nodes(nodes, attributes=FILE_NODE_ATTRIBUTES, backend=None):
+    """
+    Read attributes for many nodes at once
+
+    Args:
+        nodes: list of node names
+        attributes: attribute names to read, see ATTRIBUTE_TYPES
+        backend: 'api' or 'cmds', by default the api is used when available
+
+    Returns:
+        OrderedDict with node: dict of attribute: value, missing attributes
+        have a value of None
+    """
+    if backend is None:
+        backend = 'api' if om is not None else 'cmds'
+    if backend == 'api':
+        return _query_api(nodes, attributes)
+    return _query_cmds(nodes, attributes)
+
+
+# cleared once cmds.getAttr turns out to take a single plug only
+_multi_get = True
+
+
+def _get_values(plugs):
+    """Values of several plugs, in one getAttr call where cmds takes a list"""
+    global _multi_get
+    if _multi_get and len(plugs) > 1:
+        try:
+            values = cmds.getAttr(plugs)
+        except (RuntimeError, ValueError, TypeError):
+            values = None
+        if isinstance(values, list) and len(values) == len(plugs):
+            return values
+        log.debug("getAttr takes a single plug, querying one at a time")
+        _multi_get = False
+    return [cmds.getAttr(plug) for plug in plugs]
+
+
+def _query_cmds(nodes, attributes):
+    """
+    Query through maya.cmds, per attribute one ls call for existence and
+    one getAttr call for the values of all nodes that have it
+    """
+    result = collections.OrderedDict(
+        (node, dict.fromkeys(attributes)) for node in nodes)
+    for attr in attributes:
+        plugs = ['{}.{}'.format(node, attr) for node in nodes]
+        existing = set(cmds.ls(plugs) or []) if plugs else set()
+        found = [(node, plug) for node, plug in zip(nodes, plugs)
+                 if plug in existing]
+        values = _get_values([plug for node, plug in found])
+        for (node, plug), value in zip(found, values):
+            result[node][attr] = value
+    return result
+
+
+def _query_api(nodes, attributes):
+    """Query through the OpenMaya 2.0 api, no command round trips per plug"""
+    result = collections.OrderedDict()
+    fn = om.MFnDependencyNode()
+    for node in nodes:
+        values = dict.fromkeys(attributes)
+        result[node] = values
+        selection = om.MSelectionList()
+        try:
+            selection.add(node)
+        except RuntimeError:
+            log.warning("Could not find node: {}".format(node))
+            continue
+        fn.setObject(selection.getDependNode(0))
+        for attr in attributes:
+            if not fn.hasAttribute(attr):
+                continue
+            plug = fn.findPlug(attr, False)
+            if ATTRIBUTE_TYPES.get(attr) == 'int':
+                values[attr] = plug.asInt()
+            else:
+                values[attr] = plug.asString()
+    return result
+
+
+def set_file_nodes(changes, current=None):
+    """
+    Write attributes of many nodes
+
+    Args:
+        changes: dict of node: dict of attribute: value, attributes are
+            written in the order of the inner dict (fileTextureName before
+            colorSpace, or Maya guesses the color space again)
+        current: values as returned by `query_file_nodes`, values that
+            already match are skipped. Once a node's fileTextureName is
+            written the attributes after it are always written, since Maya
+            may have changed them (its color space rules)
+
+    Returns:
+        number of attributes written
+    """
+    current = current or {}
+    written = 0
+    for node, values in changes.items():
+        existing = current.get(node, {})
+        for attr, value in values.items():
+            if attr in existing and existing[attr] == value:
+                continue
+            if attr == 'fileTextureName':
+                existing = {}
+            plug = '{}.{}'.format(node, attr)
+            if ATTRIBUTE_TYPES.get(attr) == 'string':
+                cmds.setAttr(plug, value, type='string')
+            else:
+                cmds.setAttr(plug, value)
+            written += 1
+    return written
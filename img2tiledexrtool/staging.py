@@ -0,0 +1,307 @@
+"""
+Convert through local scratch disk instead of over the network
+
+When sources and exrs live on a share, every converter reads and writes over
+the network and a few of them saturate the link while the cpus wait. A
+`StagingArea` splits a batch into three overlapping stages:
+
+    prefetch    copies sources to local scratch, a bounded number ahead
+    convert     the engine's workers convert the local copies
+    write back  copies the finished exrs to their place on the share
+
+Each stage has its own number of threads. Transfers are throttled per
+volume (drive, share or mount point) by `VolumeThrottle`, shared by all
+batches, so two batches don't double the load on the same server.
+
+Example:
+    staging = StagingArea('D:/scratch', prefetch=2, write_back=2)
+    convert_img_2_exr(executable, files, staging=staging)
+"""
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from . import img2tiledexrtool
+
+log = logging.getLogger("img2exr Staging")
+
+
+class VolumeThrottle(object):
+    """
+    Limits the transfers to and from each volume
+
+    Args:
+        transfers (int): copies at the same time per volume
+        bytes_per_second (float): bandwidth per volume, None for no limit
+        block_size (int): bytes copied at once
+    """
+    def __init__(self, transfers=2, bytes_per_second=None,
+                 block_size=4 * 1024 * 1024):
+        self.transfers = transfers
+        self.bytes_per_second = bytes_per_second
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        # volume: Semaphore
+        self.slots = {}
+        # volume: time the bandwidth allows the next block
+        self.next_time = {}
+        # directory: volume
+        self.volumes = {}
+
+    def volume(self, path):
+        """Drive, share or mount point a path is on"""
+        path = os.path.abspath(path)
+        drive = os.path.splitdrive(path)[0]
+        if drive:
+            return os.path.normcase(drive)
+        directory = os.path.dirname(path)
+        with self.lock:
+            cached = self.volumes.get(directory)
+        if cached is not None:
+            return cached
+        volume = directory
+        while not os.path.ismount(volume):
+            parent = os.path.dirname(volume)
+            if parent == volume:
+                break
+            volume = parent
+        with self.lock:
+            self.volumes[directory] = volume
+        return volume
+
+    @contextlib.contextmanager
+    def slot(self, path):
+        """Hold one of the transfers of path's volume"""
+        volume = self.volume(path)
+        with self.lock:
+            semaphore = self.slots.get(volume)
+            if semaphore is None:
+                semaphore = self.slots[volume] = threading.Semaphore(
+                    self.transfers)
+        with semaphore:
+            yield volume
+
+    def _wait(self, volume, size):
+        if not self.bytes_per_second:
+            return
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_time.get(volume, now))
+            self.next_time[volume] = start + size / float(self.bytes_per_second)
+        if start > now:
+            time.sleep(start - now)
+
+    def copy(self, src, dst, remote, cancel_event=None):
+        """
+        Copy a file with its mtime, throttled on the volume of remote
+
+        Returns:
+            False when cancel_event was set before the copy finished
+        """
+        with self.slot(remote) as volume:
+            with open(src, 'rb') as f_in, open(dst, 'wb') as f_out:
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return False
+                    block = f_in.read(self.block_size)
+                    if not block:
+                        break
+                    self._wait(volume, len(block))
+                    f_out.write(block)
+        shutil.copystat(src, dst)
+        return True
+
+
+# shared by every staging area that doesn't bring its own
+_throttle = VolumeThrottle()
+
+
+class StagingArea(object):
+    """
+    Where and how conversions are staged, pass it as `staging` to
+    `img2tiledexrtool.convert_img_2_exr` or `ConversionEngine.submit`
+
+    Every batch gets its own directory in scratch, removed when the batch
+    is done.
+    """
+    def __init__(self, scratch=None, prefetch=2, write_back=2, ahead=None,
+                 throttle=None):
+        """
+        Args:
+            scratch (str): local directory, the system temp dir by default
+            prefetch (int): threads copying sources to scratch
+            write_back (int): threads copying exrs back
+            ahead (int): sources in scratch that aren't converted and
+                written back yet, twice the engine's workers plus prefetch
+                by default. Bounds the scratch space used.
+            throttle (VolumeThrottle): per volume limits, shared by default
+        """
+        self.scratch = scratch
+        self.prefetch = max(1, prefetch)
+        self.write_back = max(1, write_back)
+        self.ahead = ahead
+        self.throttle = throttle or _throttle
+
+    def stage(self, engine, batch):
+        """Start staging the jobs of a batch, they're queued on the engine
+        as their sources arrive"""
+        _StagedBatch(self, engine, batch).start()
+
+
+class _StagedBatch(object):
+    """The three stages of one batch"""
+    def __init__(self, area, engine, batch):
+        self.area = area
+        self.engine = engine
+        self.batch = batch
+        self.throttle = area.throttle
+        self.lock = threading.Lock()
+        self.remaining = len(batch.jobs)
+        ahead = area.ahead or engine.size * 2 + area.prefetch
+        self.slots = threading.Semaphore(max(1, ahead))
+        self.prefetch_queue = queue.Queue()
+        self.write_queue = queue.Queue()
+        self.threads = []
+        self.directory = None
+
+    def start(self):
+        if not self.remaining:
+            return
+        if self.area.scratch and not os.path.isdir(self.area.scratch):
+            os.makedirs(self.area.scratch)
+        self.directory = tempfile.mkdtemp(prefix='img2exr_stage_',
+                                          dir=self.area.scratch)
+        for index, job in enumerate(self.batch.jobs):
+            self.prefetch_queue.put((index, job))
+        for target, count in ((self.prefetch_loop, self.area.prefetch),
+                              (self.write_back_loop, self.area.write_back)):
+            for i in range(count):
+                thread = threading.Thread(target=target)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+
+    def finish(self, job, status):
+        with self.lock:
+            self.remaining -= 1
+            done = not self.remaining
+        if done:
+            # clean up before the last result, callers may exit right after
+            for i in range(self.area.prefetch):
+                self.prefetch_queue.put(None)
+            for i in range(self.area.write_back):
+                self.write_queue.put(None)
+            shutil.rmtree(self.directory, ignore_errors=True)
+        self.batch.finished(job, status)
+
+    def release(self, job):
+        """Remove the local files of a job and free its slot"""
+        for path in (job.source, job.local_out):
+            if path and path != job.file_in and os.path.isfile(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    log.warning("Could not remove {}: {}".format(path, e))
+        self.slots.release()
+
+    def acquire_slot(self):
+        """Wait for room in scratch, False when the batch is cancelled"""
+        while not self.batch.cancelled():
+            if self.slots.acquire(False):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def prefetch_loop(self):
+        while True:
+            item = self.prefetch_queue.get()
+            if item is None:
+                break
+            index, job = item
+            try:
+                status = self.prefetch(index, job)
+            except Exception as e:
+                log.exception("Staging {} failed".format(job.file_in))
+                status = str(e)
+            if status is not None:
+                self.finish(job, status)
+
+    def prefetch(self, index, job):
+        """Copy a job's source to scratch and queue it, returns the status
+        of jobs that end here"""
+        if self.batch.cancelled():
+            return img2tiledexrtool.STATUS_CANCELLED
+        status = job.skip_status()
+        if status is not None:
+            return status
+        if not self.acquire_slot():
+            return img2tiledexrtool.STATUS_CANCELLED
+
+        name = '{}_{}'.format(index, os.path.basename(job.file_in))
+        local = os.path.join(self.directory, name)
+        start = time.time()
+        copied = False
+        try:
+            copied = self.throttle.copy(job.file_in, local, job.file_in,
+                                        self.batch.cancel_event)
+        finally:
+            if not copied:
+                if os.path.isfile(local):
+                    os.remove(local)
+                self.slots.release()
+        if not copied:
+            return img2tiledexrtool.STATUS_CANCELLED
+        job.stage_in_time = time.time() - start
+        job.source = local
+        job.local_out = os.path.join(
+            self.directory, '{}_{}'.format(index,
+                                           os.path.basename(job.file_out)))
+        job.staging = self
+        self.engine.enqueue([job])
+        return None
+
+    def converted(self, job, status):
+        """Called by the engine's worker when a staged job is converted"""
+        if status is None:
+            self.write_queue.put(job)
+            return
+        self.release(job)
+        self.finish(job, status)
+
+    def write_back_loop(self):
+        while True:
+            job = self.write_queue.get()
+            if job is None:
+                break
+            status = self.write(job)
+            self.release(job)
+            self.finish(job, status)
+
+    def write(self, job):
+        """Copy a converted exr to file_out, returns its status"""
+        temp = img2tiledexrtool.temp_output_path(job.file_out)
+        start = time.time()
+        try:
+            self.throttle.copy(job.local_out, temp, job.file_out)
+            img2tiledexrtool.replace_file(temp, job.file_out)
+            job.bytes_out = os.path.getsize(job.file_out)
+            img2tiledexrtool.write_manifest(job.file_out, job.signature,
+                                            job.options)
+            job.add_to_store()
+        except Exception as e:
+            log.exception("Writing back {} failed".format(job.file_out))
+            return str(e)
+        finally:
+            job.stage_out_time = time.time() - start
+            if os.path.isfile(temp):
+                os.remove(temp)
+        return None
@@ -0,0 +1,374 @@
+"""
+Shared store of converted exrs, keyed by source content and options
+
+Every scene converting the same library texture again wastes a conversion.
+A `ConversionStore` keeps one exr per source content hash and set of
+conversion options in a directory everyone can reach, indexed by a SQLite
+database. Conversions check it first: a hit puts the stored exr at the
+output path, as a hardlink where the filesystem allows it, without
+converting. Every conversion that does run is added to the store.
+
+Example:
+    store = ConversionStore('//server/exrstore', max_size=500 * 1024 ** 3)
+    convert_img_2_exr(executable, files, store=store)
+    store.gc()
+
+Layout of the store directory:
+
+    index.sqlite        objects and cached source hashes
+    objects/ab/abcd...  the exrs, named by key
+
+The store directory has to be on a filesystem with working file locks for
+SQLite, when several machines share it.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from . import img2tiledexrtool
+
+log = logging.getLogger("img2exr Store")
+
+LINK_MODES = ('hardlink', 'symlink', 'copy')
+
+# temporary files and exrs without a row older than this are removed by gc,
+# seconds. add() writes the exr before its row, a younger one is being added
+TEMP_AGE = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    source_hash TEXT NOT NULL,
+    options TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS objects_last_used ON objects (last_used);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    hash TEXT NOT NULL
+);
+"""
+
+
+def store_key(source_hash, options):
+    """Key of an exr, from the source's sha1 and the conversion options"""
+    text = source_hash + json.dumps(options, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class ConversionStore(object):
+    """
+    Content addressed exrs with a SQLite index
+
+    Objects are evicted least recently used first when the store grows past
+    max_size. Exrs placed with hardlinks or copies stay where they are,
+    symlinked ones break when their object is evicted.
+    """
+    def __init__(self, root, max_size=None, link='hardlink', timeout=30.0):
+        """
+        Args:
+            root (str): store directory, created when missing
+            max_size (int): bytes of exrs kept, None for no limit
+            link (str): how a stored exr is put at an output path, one of
+                LINK_MODES. hardlink and symlink fall back to copying
+                where the filesystem doesn't support them.
+            timeout (float): seconds to wait for other processes' locks
+        """
+        if link not in LINK_MODES:
+            raise ValueError("link must be one of {}".format(
+                ', '.join(LINK_MODES)))
+        self.root = root
+        self.max_size = max_size
+        self.link = link
+        self.objects = os.path.join(root, 'objects')
+        if not os.path.isdir(self.objects):
+            os.makedirs(self.objects)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(root, 'index.sqlite'),
+                                  timeout=timeout, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def source_hash(self, path):
+        """
+        sha1 of a source's content, cached by path, size and mtime so
+        unchanged sources are hashed once
+        """
+        stat = os.stat(path)
+        key = img2tiledexrtool.path_key(path)
+        with self.lock:
+            row = self.db.execute(
+                'SELECT size, mtime, hash FROM sources WHERE path = ?',
+                (key,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+        digest = img2tiledexrtool.hash_file(path)
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)',
+                (key, stat.st_size, stat.st_mtime, digest))
+        return digest
+
+    def object_name(self, key):
+        """Path of an object relative to the store, the same on every os"""
+        return 'objects/{}/{}.exr'.format(key[:2], key)
+
+    def object_path(self, key):
+        """Where the object of a key is, derived from the key alone so
+        machines with other path separators share the store"""
+        return os.path.join(self.objects, key[:2], key + '.exr')
+
+    def lookup(self, source_hash, options):
+        """Path of the stored exr, None when it isn't in the store"""
+        key = store_key(source_hash, options)
+        with self.lock:
+            row = self.db.execute('SELECT key FROM objects WHERE key = ?',
+                                  (key,)).fetchone()
+        if row is None:
+            return None
+        path = self.object_path(key)
+        if not os.path.isfile(path):
+            # removed behind our back, gc cleans up the row
+            return None
+        with self.lock, self.db:
+            self.db.execute('UPDATE objects SET last_used = ? WHERE key = ?',
+                            (time.time(), key))
+        return path
+
+    def fetch(self, file_in, file_out, options):
+        """
+        Put the stored exr of file_in at file_out
+
+        The manifest is written as well, so the exr counts as up to date.
+
+        Returns:
+            True on a hit, False when file_in isn't in the store
+        """
+        signature = img2tiledexrtool.source_signature(file_in)
+        signature['hash'] = self.source_hash(file_in)
+        path = self.lookup(signature['hash'], options)
+        if path is None:
+            return False
+        temp = img2tiledexrtool.temp_output_path(file_out)
+        try:
+            self._place(path, temp)
+            img2tiledexrtool.replace_file(temp, file_out)
+        finally:
+            if os.path.lexists(temp):
+                os.remove(temp)
+        img2tiledexrtool.write_manifest(file_out, signature, options)
+        log.debug("{} from the store".format(file_out))
+        return True
+
+    def _place(self, path, dst):
+        if self.link == 'hardlink' and hasattr(os, 'link'):
+            try:
+                os.link(path, dst)
+                return
+            except OSError:
+                pass
+        elif self.link == 'symlink' and hasattr(os, 'symlink'):
+            try:
+                os.symlink(os.path.abspath(path), dst)
+                return
+            except (OSError, NotImplementedError):
+                pass
+        shutil.copyfile(path, dst)
+
+    def add(self, file_in, file_out, options):
+        """
+        Store the exr converted from file_in
+
+        Returns:
+            path of the stored object
+        """
+        source_hash = self.source_hash(file_in)
+        key = store_key(source_hash, options)
+        path = self.object_path(key)
+        if not os.path.isfile(path):
+            directory = os.path.dirname(path)
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    # made by another process in the meantime
+                    if not os.path.isdir(directory):
+                        raise
+            temp = img2tiledexrtool.temp_output_path(path)
+            try:
+                try:
+                    os.link(file_out, temp)
+                except (AttributeError, OSError):
+                    shutil.copyfile(file_out, temp)
+                img2tiledexrtool.replace_file(temp, path)
+            finally:
+                if os.path.isfile(temp):
+                    os.remove(temp)
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, '
+                'COALESCE((SELECT created FROM objects WHERE key = ?), ?), ?)',
+                (key, self.object_name(key), os.path.getsize(path),
+                 source_hash, json.dumps(options, sort_keys=True), key, now,
+                 now))
+        if self.max_size is not None:
+            self.evict(self.max_size)
+        return path
+
+    def size(self):
+        """Bytes of exrs in the index"""
+        with self.lock:
+            return self.db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            count, size = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects'
+            ).fetchone()
+            sources = self.db.execute(
+                'SELECT COUNT(*) FROM sources').fetchone()[0]
+        return {'objects': count, 'size': size, 'sources': sources,
+                'max_size': self.max_size}
+
+    def evict(self, max_size):
+        """
+        Remove least recently used exrs until the store fits max_size
+
+        Returns:
+            number of exrs removed
+        """
+        with self.lock:
+            total = self.db.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+            if total <= max_size:
+                return 0
+            rows = self.db.execute(
+                'SELECT key, size FROM objects ORDER BY last_used'
+            ).fetchall()
+        removed = []
+        for key, size in rows:
+            if total <= max_size:
+                break
+            self._remove_object(self.object_path(key))
+            removed.append((key,))
+            total -= size
+        with self.lock, self.db:
+            self.db.executemany('DELETE FROM objects WHERE key = ?', removed)
+        if removed:
+            log.info("Evicted {} exrs from {}".format(len(removed), self.root))
+        return len(removed)
+
+    def _remove_object(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            if os.path.isfile(path):
+                log.warning("Could not remove {}: {}".format(path, e))
+
+    def gc(self, max_size=None):
+        """
+        Bring the index and the objects in line and evict
+
+        Removes rows whose exr is gone, exrs without a row and temporary
+        files left by crashed processes (both once older than TEMP_AGE) and
+        hashes of sources that no longer exist, then evicts down to max_size
+        (or the store's max_size).
+
+        Returns:
+            dict with the number of things removed
+        """
+        with self.lock:
+            rows = self.db.execute('SELECT key FROM objects').fetchall()
+            sources = self.db.execute('SELECT path FROM sources').fetchall()
+        known = set()
+        missing = []
+        for key, in rows:
+            full = self.object_path(key)
+            if os.path.isfile(full):
+                known.add(os.path.normcase(os.path.normpath(full)))
+            else:
+                missing.append((key,))
+
+        orphans = 0
+        temps = 0
+        now = time.time()
+        for directory, dirs, files in os.walk(self.objects):
+            for name in files:
+                full = os.path.join(directory, name)
+                temp = img2tiledexrtool.is_temp_output(name)
+                if not temp and \
+                        os.path.normcase(os.path.normpath(full)) in known:
+                    continue
+                try:
+                    # exrs are added right after their conversion
+                    if now - os.path.getmtime(full) <= TEMP_AGE:
+                        continue
+                except OSError:
+                    continue
+                self._remove_object(full)
+                if temp:
+                    temps += 1
+                else:
+                    orphans += 1
+
+        gone = [(path,) for path, in sources if not os.path.isfile(path)]
+        with self.lock, self.db:
+            self.db.executemany('DELETE FROM objects WHERE key = ?', missing)
+            self.db.executemany('DELETE FROM sources WHERE path = ?', gone)
+        max_size = self.max_size if max_size is None else max_size
+        evicted = self.evict(max_size) if max_size is not None else 0
+        with self.lock:
+            self.db.execute('VACUUM')
+        result = {'missing': len(missing), 'orphans': orphans,
+                  'temps': temps, 'sources': len(gone), 'evicted': evicted}
+        log.info("Store gc of {}: {}".format(self.root, result))
+        return result
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_store():
+    """
+    The studio's store, configured by $IMG2EXR_STORE and optionally
+    $IMG2EXR_STORE_MAX_SIZE in GB. None when no store is configured.
+    """
+    global _default
+    root = os.environ.get('IMG2EXR_STORE')
+    if not root:
+        return None
+    with _default_lock:
+        if _default is None or _default.root != root:
+            max_size = os.environ.get('IMG2EXR_STORE_MAX_SIZE')
+            if max_size:
+                max_size = int(float(max_size) * 1024 ** 3)
+            try:
+                _default = ConversionStore(root, max_size=max_size or None)
+            except (OSError, sqlite3.Error) as e:
+                log.warning("Conversion store {} unavailable: {}".format(
+                    root, e))
+                return None
+        return _default
@@ -0,0 +1,181 @@
+"""
+Minimal stand-in for maya.cmds to run mayalib outside of Maya
+
+Only the commands and flags mayalib uses are implemented, against an in
+memory scene of nodes with plain attribute dicts. Every command call is
+counted in `calls`, which is what makes this useful for benchmarking the
+number of round trips a function makes.
+
+Example:
+    from img2tiledexrtool import stubcmds
+    stubcmds.install()
+    stubcmds.build_scene(1000, '/tmp/textures')
+    from img2tiledexrtool import mayalib
+    mayalib.get_file_texture_model_data()
+"""
+import collections
+import fnmatch
+import sys
+import types
+
+# node name: {'type': node type, 'attrs': {attr name: value}}
+scene = collections.OrderedDict()
+selection = []
+calls = collections.Counter()
+
+MAYA_VERSION = '2018'
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+def _counted(func):
+    def wrapper(*args, **kwargs):
+        calls[func.__name__] += 1
+        return func(*args, **kwargs)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def reset():
+    """Empty the scene, the selection and the call counter"""
+    scene.clear()
+    del selection[:]
+    calls.clear()
+
+
+def create_file_node(name, path, color_space='sRGB', **attrs):
+    """Add a file node to the stub scene"""
+    values = {'fileTextureName': path, 'colorSpace': color_space,
+              'uvTilingMode': 0, 'useFrameExtension': False}
+    values.update(attrs)
+    scene[name] = {'type': 'file', 'attrs': values}
+    return name
+
+
+def build_scene(count, texture_dir, shared=1, extension='tga'):
+    """
+    Fill the stub scene with synthetic file nodes
+
+    Args:
+        count (int): number of file nodes
+        texture_dir (str): directory the texture paths point into
+        shared (int): number of nodes sharing each texture path
+        extension (str): texture file extension
+
+    Returns:
+        list of texture paths used (unique)
+    """
+    reset()
+    paths = []
+    for i in range(count):
+        path = '{}/texture_{:06d}.{}'.format(texture_dir.rstrip('/'),
+                                             i // max(shared, 1), extension)
+        if not paths or paths[-1] != path:
+            paths.append(path)
+        create_file_node('file{}'.format(i + 1), path)
+    return paths
+
+
+def _split(plug):
+    node, _, attr = plug.partition('.')
+    return node, attr
+
+
+@_counted
+def ls(*args, **kwargs):
+    sl = kwargs.get('sl', kwargs.get('selection', False))
+    node_type = kwargs.get('type')
+    names = []
+    for arg in args:
+        names.extend([arg] if isinstance(arg, string_types) else arg)
+
+    if sl:
+        candidates = list(selection)
+    elif names:
+        candidates = []
+        for name in names:
+            node, attr = _split(name)
+            if any(c in node for c in '*?['):
+                matches = fnmatch.filter(scene.keys(), node)
+            else:
+                matches = [node] if node in scene else []
+            for match in matches:
+                if not attr:
+                    candidates.append(match)
+                elif attr in scene[match]['attrs']:
+                    candidates.append('{}.{}'.format(match, attr))
+    else:
+        candidates = list(scene.keys())
+
+    if node_type:
+        candidates = [c for c in candidates
+                      if scene.get(_split(c)[0], {}).get('type') == node_type]
+    return candidates
+
+
+def _get(plug):
+    node, attr = _split(plug)
+    try:
+        return scene[node]['attrs'][attr]
+    except KeyError:
+        raise ValueError("No object matches name: {}".format(plug))
+
+
+@_counted
+def getAttr(plug, **kwargs):
+    """A list of plugs gives a list of values"""
+    if isinstance(plug, string_types):
+        return _get(plug)
+    return [_get(p) for p in plug]
+
+
+@_counted
+def setAttr(plug, *values, **kwargs):
+    node, attr = _split(plug)
+    if node not in scene or attr not in scene[node]['attrs']:
+        raise RuntimeError("No object matches name: {}".format(plug))
+    scene[node]['attrs'][attr] = values[0] if len(values) == 1 else values
+
+
+@_counted
+def addAttr(node, **kwargs):
+    name = kwargs.get('longName', kwargs.get('ln'))
+    if name in scene[node]['attrs']:
+        raise RuntimeError("Attribute already exists: {}".format(name))
+    is_string = kwargs.get('dt', kwargs.get('dataType')) == 'string'
+    scene[node]['attrs'][name] = None if is_string else 0
+
+
+@_counted
+def attributeQuery(attr, node=None, exists=False, **kwargs):
+    return node in scene and attr in scene[node]['attrs']
+
+
+@_counted
+def about(**kwargs):
+    return MAYA_VERSION
+
+
+@_counted
+def undoInfo(*args, **kwargs):
+    return None
+
+
+@_counted
+def refresh(*args, **kwargs):
+    return None
+
+
+def install():
+    """Register this module as maya.cmds, unless a real Maya is loaded"""
+    if 'maya.cmds' in sys.modules:
+        return sys.modules['maya.cmds']
+    maya = sys.modules.get('maya') or types.ModuleType('maya')
+    maya.cmds = sys.modules[__name__]
+    sys.modules['maya'] = maya
+    sys.modules['maya.cmds'] = maya.cmds
+    return maya.cmds
@@ -0,0 +1,280 @@
+"""
+Measure compression and tile size choices on real textures
+
+Converts a sample of textures of every texture class with each compression
+and tile size, into a scratch directory, and measures how long encoding
+takes, how big the exrs get and how long reading them back takes. The
+results are summed per class and combination, and the best combination is
+recommended per class.
+
+Texture classes are found in the file names the same way the preserve
+filter works (NORMAL, ROUGHNESS, ...), textures matching none are "OTHER".
+
+Example:
+    results = tune(backend, files, classes=DEFAULT_CLASSES,
+                   tile_sizes=(32, 64, 128))
+    print(format_table(results))
+    recommend(results)['NORMAL']  # {'compression': 'zips', 'tile_size': 64}
+"""
+import collections
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from . import backends
+from . import img2tiledexrtool
+from . import report as batch_report
+from . import udim
+
+log = logging.getLogger("img2exr Tuning")
+
+# as in the UI's default preserve filter
+DEFAULT_CLASSES = ('NORMAL', 'NORMALS', 'GLOSS', 'BUMP', 'AO', 'OPACITY',
+                   'DEPTH', 'ROUGHNESS', 'DISPLACEMENT')
+OTHER_CLASS = 'OTHER'
+
+DEFAULT_TILE_SIZES = (32, 64, 128, 256)
+
+# compressions that change pixel values (pxr24 only for 32 bit float)
+LOSSY_COMPRESSIONS = ('pxr24', 'b44', 'b44a', 'dwaa', 'dwab')
+
+# how much each measurement counts in the recommendation, relative to the
+# best combination of a class. Encoding happens once, reading every render.
+DEFAULT_WEIGHTS = {'size': 1.0, 'read': 1.0, 'encode': 0.25}
+
+Measurement = collections.namedtuple(
+    'Measurement', 'texture_class compression tile_size files source_bytes '
+                   'encode_time output_bytes read_time failed')
+
+
+def classify(path, classes=DEFAULT_CLASSES):
+    """
+    Texture class of a file, the longest class name found in its file name
+
+    Returns:
+        str, OTHER_CLASS when no class matches
+    """
+    name = os.path.basename(path).upper()
+    matches = [c for c in classes if c and c.upper() in name]
+    if not matches:
+        return OTHER_CLASS
+    return max(matches, key=len)
+
+
+def sample_textures(paths, classes=DEFAULT_CLASSES, per_class=3, seed=0):
+    """
+    Pick up to per_class textures of every class
+
+    Tile and frame patterns are expanded and count as separate textures.
+    The pick is random but repeatable for the same seed.
+
+    Returns:
+        OrderedDict of class: list of paths
+    """
+    by_class = collections.OrderedDict()
+    for path in paths:
+        files = udim.expand_pattern(path) if udim.is_pattern(path) else [path]
+        for file in files:
+            if os.path.isfile(file):
+                by_class.setdefault(classify(file, classes), []).append(file)
+    rng = random.Random(seed)
+    for texture_class, files in by_class.items():
+        files = sorted(set(files))
+        if len(files) > per_class:
+            files = sorted(rng.sample(files, per_class))
+        by_class[texture_class] = files
+    return by_class
+
+
+def read_time(path):
+    """
+    Seconds to read an exr back, decoding its tiles when OpenImageIO is
+    available, otherwise just reading the bytes
+    """
+    start = time.time()
+    try:
+        import OpenImageIO as oiio
+    except ImportError:
+        oiio = None
+    if oiio is not None:
+        image = oiio.ImageInput.open(path)
+        if image is not None:
+            try:
+                image.read_image()
+            finally:
+                image.close()
+            return time.time() - start
+    with open(path, 'rb') as f:
+        while f.read(1024 * 1024):
+            pass
+    return time.time() - start
+
+
+def tune(backend, paths, classes=DEFAULT_CLASSES,
+         compressions=backends.COMPRESSIONS, tile_sizes=DEFAULT_TILE_SIZES,
+         per_class=3, linear='off', threads=1, workdir=None, seed=0):
+    """
+    Convert a sample of textures with every combination and measure them
+
+    Args:
+        backend: ConverterBackend or img2tiledexr path
+        paths: source textures, patterns are expanded
+        classes: texture class names, see `classify`
+        compressions: exr compressions to try
+        tile_sizes: tile sizes to try
+        per_class (int): textures measured per class
+        linear (str): linear option used for every conversion
+        threads (int): conversions at the same time, more is faster but
+            makes the encode times less reliable
+        workdir (str): scratch directory for the exrs, created when
+            missing. A temporary one that is removed afterwards by default
+        seed (int): seed of the random sample
+
+    Returns:
+        list of Measurement, one per class and combination
+    """
+    backend = img2tiledexrtool.resolve_backend(backend)
+    samples = sample_textures(paths, classes, per_class, seed)
+    scratch = workdir or tempfile.mkdtemp(prefix='img2exr_tune_')
+    if not os.path.isdir(scratch):
+        os.makedirs(scratch)
+    # its own workers, resizing the shared pool would slow down or speed up
+    # other batches and skew the encode times
+    engine = img2tiledexrtool.ConversionEngine(threads)
+    measurements = []
+    try:
+        for compression in compressions:
+            for tile_size in tile_sizes:
+                options = img2tiledexrtool.conversion_options(
+                    compression, tile_size, linear)
+                reason = backend.supports(options)
+                if reason:
+                    log.warning("Skipping {} {}: {}".format(
+                        compression, tile_size, reason))
+                    continue
+                log.info("Measuring {} tiles of {}".format(compression,
+                                                           tile_size))
+                measurements.extend(_measure(engine, backend, samples,
+                                             options, scratch))
+    finally:
+        engine.shutdown(wait=False)
+        if workdir is None:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return measurements
+
+
+def _measure(engine, backend, samples, options, scratch):
+    """Convert every sample with one combination"""
+    jobs = []
+    classes = {}
+    for texture_class, files in samples.items():
+        for i, file_in in enumerate(files):
+            name = '{}_{}_{}_{}.exr'.format(
+                texture_class, i, options['compression'], options['tile_size'])
+            job = img2tiledexrtool.Img2EXRJob(backend, file_in,
+                                              os.path.join(scratch, name),
+                                              options, overwrite=True)
+            jobs.append(job)
+            classes[job.file_out] = texture_class
+
+    totals = collections.OrderedDict(
+        (c, collections.Counter()) for c in samples)
+    batch = engine.submit(jobs, report=batch_report.BatchReport())
+    for result in batch.results():
+        counter = totals[classes[result.file_out]]
+        counter['files'] += 1
+        if result.status is not None:
+            log.warning("{} failed: {}".format(result.file_in, result.status))
+            counter['failed'] += 1
+            continue
+        counter['source_bytes'] += result.bytes_in or 0
+        counter['encode_time'] += result.convert_time or 0
+        counter['output_bytes'] += result.bytes_out or 0
+        counter['read_time'] += read_time(result.file_out)
+        os.remove(result.file_out)
+        manifest = img2tiledexrtool.manifest_path(result.file_out)
+        if os.path.isfile(manifest):
+            os.remove(manifest)
+
+    return [Measurement(texture_class, options['compression'],
+                        options['tile_size'], counter['files'],
+                        counter['source_bytes'], counter['encode_time'],
+                        counter['output_bytes'], counter['read_time'],
+                        counter['failed'])
+            for texture_class, counter in totals.items()]
+
+
+def recommend(measurements, weights=None, allow_lossy=False):
+    """
+    Best combination per texture class
+
+    Every measurement is divided by the best value of its class, the
+    weighted sum of those ratios is the score, lowest wins. Combinations
+    where a file failed are never recommended.
+
+    Args:
+        weights (dict): 'size', 'read' and 'encode' weights, see
+            DEFAULT_WEIGHTS
+        allow_lossy (bool): also recommend LOSSY_COMPRESSIONS
+
+    Returns:
+        OrderedDict of class: dict with compression, tile_size and score
+    """
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    by_class = collections.OrderedDict()
+    for m in measurements:
+        if m.failed or not m.files:
+            continue
+        if not allow_lossy and m.compression in LOSSY_COMPRESSIONS:
+            continue
+        by_class.setdefault(m.texture_class, []).append(m)
+
+    def ratio(value, best):
+        return float(value) / best if best else 1.0
+
+    best = collections.OrderedDict()
+    for texture_class, candidates in by_class.items():
+        min_size = min(m.output_bytes for m in candidates)
+        min_read = min(m.read_time for m in candidates)
+        min_encode = min(m.encode_time for m in candidates)
+        scored = []
+        for m in candidates:
+            score = (weights['size'] * ratio(m.output_bytes, min_size) +
+                     weights['read'] * ratio(m.read_time, min_read) +
+                     weights['encode'] * ratio(m.encode_time, min_encode))
+            scored.append((score, m))
+        score, m = min(scored, key=lambda item: item[0])
+        best[texture_class] = {'compression': m.compression,
+                               'tile_size': m.tile_size,
+                               'score': score}
+    return best
+
+
+def format_table(measurements, recommendations=None):
+    """Measurements as a text table, recommended rows marked with *"""
+    recommendations = recommendations or {}
+    order = []
+    for m in measurements:
+        if m.texture_class not in order:
+            order.append(m.texture_class)
+    measurements = sorted(measurements,
+                          key=lambda m: order.index(m.texture_class))
+    lines = ['{:<13} {:<11} {:>5} {:>5} {:>10} {:>8} {:>10} {:>9}'.format(
+        'class', 'compression', 'tile', 'files', 'encode s', 'size MB',
+        'size ratio', 'read s')]
+    for m in measurements:
+        best = recommendations.get(m.texture_class, {})
+        mark = '*' if (best.get('compression'), best.get('tile_size')) == \
+            (m.compression, m.tile_size) else ' '
+        ratio = float(m.output_bytes) / m.source_bytes \
+            if m.source_bytes else 0.0
+        lines.append(
+            '{:<13} {:<11} {:>5} {:>5} {:>10.3f} {:>8.2f} {:>10.2f} '
+            '{:>9.3f}{}'.format(
+                m.texture_class, m.compression, m.tile_size, m.files,
+                m.encode_time, m.output_bytes / 1e6, ratio, m.read_time,
+                mark))
+    return '\n'.join(lines)
@@ -0,0 +1,178 @@
+"""
+UDIM, uv tile and image sequence support
+
+File nodes using uv tiles or a frame extension point at a single tile or
+frame in their fileTextureName. These functions turn such a path into a
+tokenised pattern (`tex.<UDIM>.tif`), find all files of a pattern on disk
+and keep track of when every file of a pattern has been converted.
+
+Example:
+    pattern = node_pattern('P:/tex/skin.1001.tif', uv_tiling_mode=3)
+    # 'P:/tex/skin.<UDIM>.tif'
+    expand_pattern(pattern)
+    # ['P:/tex/skin.1001.tif', 'P:/tex/skin.1002.tif', ...]
+"""
+import collections
+import os
+import re
+
+# token: regular expression it stands for
+TOKENS = collections.OrderedDict([
+    ('<UDIM>', r'1\d{3}'),
+    ('<UVTILE>', r'u\d+_v\d+'),
+    ('<U>', r'-?\d+'),
+    ('<V>', r'-?\d+'),
+    ('<f>', r'-?\d+'),
+])
+
+_TOKEN_RE = re.compile('|'.join(re.escape(t) for t in TOKENS) + r'|#+')
+
+# file node uvTilingMode values
+UV_TILING_OFF = 0
+UV_TILING_ZBRUSH = 1   # _u0_v0, 0 based
+UV_TILING_MUDBOX = 2   # _u1_v1, 1 based
+UV_TILING_MARI = 3     # 1001
+
+
+def is_pattern(path):
+    """Whether a path holds tile or frame tokens"""
+    return bool(path) and _TOKEN_RE.search(os.path.basename(path)) is not None
+
+
+def _replace_last(regex, replacement, text):
+    matches = list(re.finditer(regex, text))
+    if not matches:
+        return text
+    match = matches[-1]
+    return text[:match.start(1)] + replacement + text[match.end(1):]
+
+
+def node_pattern(path, uv_tiling_mode=0, use_frame_extension=False):
+    """
+    The tokenised pattern for a file node's fileTextureName
+
+    Args:
+        path (str): fileTextureName, a single tile/frame or already a pattern
+        uv_tiling_mode (int): the node's uvTilingMode
+        use_frame_extension (bool): the node's useFrameExtension
+
+    Returns:
+        str, the path unchanged when the node uses neither tiles nor frames
+        or the tile number can't be found in the name
+    """
+    if not path or is_pattern(path):
+        return path
+    name = os.path.basename(path)
+    base, ext = os.path.splitext(name)
+    if uv_tiling_mode == UV_TILING_MARI:
+        base = _replace_last(r'(?<!\d)(1\d{3})(?!\d)', '<UDIM>', base)
+    elif uv_tiling_mode == UV_TILING_ZBRUSH:
+        base = _replace_last(r'(u-?\d+_v-?\d+)', 'u<U>_v<V>', base)
+    elif uv_tiling_mode == UV_TILING_MUDBOX:
+        base = _replace_last(r'(u\d+_v\d+)', '<UVTILE>', base)
+    if use_frame_extension:
+        base = _replace_last(r'(?<![\d<])(\d+)(?![\d>])', '<f>', base)
+    return path[:len(path) - len(name)] + base + ext
+
+
+def pattern_regex(pattern):
+    """Compiled regular expression matching file names of a pattern"""
+    name = os.path.basename(pattern)
+    parts = []
+    last = 0
+    for match in _TOKEN_RE.finditer(name):
+        parts.append(re.escape(name[last:match.start()]))
+        token = match.group(0)
+        if token.startswith('#'):
+            parts.append(r'\d{%d,}' % len(token))
+        else:
+            parts.append(TOKENS[token])
+        last = match.end()
+    parts.append(re.escape(name[last:]))
+    flags = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
+    return re.compile('^{}$'.format(''.join(parts)), flags)
+
+
+def expand_pattern(pattern):
+    """
+    Existing files matching a pattern, with one directory listing
+
+    Returns:
+        sorted list of paths, [pattern] when it holds no tokens and exists
+    """
+    if not is_pattern(pattern):
+        return [pattern] if os.path.isfile(pattern) else []
+    directory = os.path.dirname(pattern)
+    regex = pattern_regex(pattern)
+    try:
+        names = os.listdir(directory or '.')
+    except OSError:
+        return []
+    return sorted(os.path.join(directory, name) if directory else name
+                  for name in names if regex.match(name))
+
+
+def exists(path):
+    """Whether a file or any file of a pattern exists"""
+    if is_pattern(path):
+        return bool(expand_pattern(path))
+    return bool(path) and os.path.isfile(path)
+
+
+class TileGroups(object):
+    """
+    Expands sources into the files to convert and tells when every file of
+    a source is done
+
+    A file can belong to several sources, skin.<UDIM>.tif and skin.1001.tif
+    of a node without uv tiles, it's converted once for all of them. Files
+    are compared by `img2tiledexrtool.path_key` like the converter does, the
+    first spelling found is the one in files.
+
+    Example:
+        groups = TileGroups(['P:/tex/skin.<UDIM>.tif', 'P:/tex/eye.tif'])
+        for file_in, file_out, status in convert(list(groups.files)):
+            for source, status in groups.finish(file_in, status):
+                ...
+    """
+    def __init__(self, sources, is_usable=None):
+        # imported here, img2tiledexrtool imports this module
+        from . import img2tiledexrtool
+        self.path_key = img2tiledexrtool.path_key
+        self.is_usable = is_usable or (lambda status: status is None)
+        self.files = collections.OrderedDict()  # file: list of sources
+        self.spellings = {}  # path_key(file): file in files
+        self.pending = {}   # source: files not done yet
+        self.status = {}    # source: first failure status
+        for source in sources:
+            if source in self.pending:
+                continue
+            files = expand_pattern(source)
+            self.pending[source] = len(files)
+            self.status[source] = None
+            for file in files:
+                file = self.spellings.setdefault(self.path_key(file), file)
+                self.files.setdefault(file, []).append(source)
+
+    def sources(self, file_in):
+        """Sources file_in belongs to, however it's spelled"""
+        file = self.spellings.get(self.path_key(file_in))
+        return self.files.get(file, [])
+
+    def finish(self, file_in, status):
+        """
+        Record the result of a file
+
+        Returns:
+            list of (source, status) of the sources this was the last file
+            of, the status is that of the first file that failed
+        """
+        done = []
+        for source in self.sources(file_in):
+            if not self.is_usable(status) and \
+                    self.is_usable(self.status[source]):
+                self.status[source] = status
+            self.pending[source] -= 1
+            if not self.pending[source]:
+                done.append((source, self.status[source]))
+        return done
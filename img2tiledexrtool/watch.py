@@ -0,0 +1,289 @@
+"""
+Watch texture directories and report sources that changed
+
+Artists overwrite sources from their painting apps all day. `SourceWatcher`
+polls the directories it watches, compares the size and mtime of every
+source texture with the previous poll and reports the files that changed
+once they stopped changing for a while (apps write big files in several
+steps). Where the inotify_simple module is available (linux) inotify wakes
+the poller as soon as something is written, polling continues as well
+because inotify doesn't see changes made by other machines on a share.
+
+The directories are the ones the sources of a scene are in, or folder trees
+configured in $IMG2EXR_WATCH.
+
+Example:
+    watcher = SourceWatcher(print, ['P:/show/textures'], recursive=True)
+    watcher.start()
+    # ['P:/show/textures/skin.1001.tif'] a few seconds after it was saved
+    watcher.stop()
+"""
+import logging
+import os
+import threading
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+from . import img2tiledexrtool
+from . import udim
+
+log = logging.getLogger("img2exr Watch")
+
+
+def configured_directories():
+    """Folder trees to watch from $IMG2EXR_WATCH, separated like PATH"""
+    value = os.environ.get('IMG2EXR_WATCH', '')
+    return [d for d in value.split(os.pathsep) if d]
+
+
+class SourceMatcher(object):
+    """
+    Finds the source a changed file belongs to
+
+    Sources are paths or uv tile and frame patterns (see `udim`), a file
+    matches a pattern when it's in the pattern's directory and its name
+    matches.
+
+    Example:
+        matcher = SourceMatcher(['P:/tex/skin.<UDIM>.tif', 'P:/tex/eye.tif'])
+        matcher.match('P:/tex/skin.1002.tif')   # 'P:/tex/skin.<UDIM>.tif'
+    """
+    def __init__(self, sources):
+        # path key: source
+        self.files = {}
+        # directory key: list of (regex, source)
+        self.patterns = {}
+        for source in sources:
+            if udim.is_pattern(source):
+                directory = img2tiledexrtool.path_key(
+                    os.path.dirname(source))
+                self.patterns.setdefault(directory, []).append(
+                    (udim.pattern_regex(source), source))
+            else:
+                self.files[img2tiledexrtool.path_key(source)] = source
+
+    def directories(self):
+        """Directories the sources are in"""
+        directories = set(os.path.dirname(key) for key in self.files)
+        directories.update(self.patterns)
+        return sorted(directories)
+
+    def match(self, path):
+        """Source of path, None when it belongs to none"""
+        key = img2tiledexrtool.path_key(path)
+        source = self.files.get(key)
+        if source is not None:
+            return source
+        name = os.path.basename(path)
+        for regex, source in self.patterns.get(os.path.dirname(key), ()):
+            if regex.match(name):
+                return source
+        return None
+
+
+def is_source(name, postfix='_tiled'):
+    """Whether a file name looks like a texture to convert, not our output"""
+    lower = name.lower()
+    return lower.endswith(img2tiledexrtool.SUPPORTED_EXTENSIONS) \
+        and not lower.endswith('{}.exr'.format(postfix).lower()) \
+        and not img2tiledexrtool.is_temp_output(lower)
+
+
+def _entries(directory):
+    if hasattr(os, 'scandir'):
+        for entry in os.scandir(directory):
+            yield entry.name, entry.path, entry.is_dir(), entry.stat
+    else:
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            yield name, path, os.path.isdir(path), \
+                lambda path=path: os.stat(path)
+
+
+def snapshot(directory, recursive=False, postfix='_tiled'):
+    """
+    Size and mtime of the sources in a directory
+
+    Returns:
+        dict of path: (size, mtime), empty when the directory is missing
+    """
+    files = {}
+    directories = [directory]
+    while directories:
+        current = directories.pop()
+        try:
+            entries = list(_entries(current))
+        except OSError:
+            continue
+        for name, path, is_dir, stat in entries:
+            if is_dir:
+                if recursive:
+                    directories.append(path)
+                continue
+            if not is_source(name, postfix):
+                continue
+            try:
+                st = stat()
+            except OSError:
+                # removed while listing
+                continue
+            files[path] = (st.st_size, st.st_mtime)
+    return files
+
+
+class SourceWatcher(threading.Thread):
+    """
+    Polls directories in a background thread for changed sources
+
+    `callback` is called from the watcher thread with a sorted list of the
+    sources that were added or changed, once their size and mtime stayed
+    the same for `debounce` seconds. The first poll of a directory only
+    records its state.
+    """
+    def __init__(self, callback, directories=(), recursive=False,
+                 interval=2.0, debounce=2.0, postfix='_tiled',
+                 use_inotify=True):
+        """
+        Args:
+            callback (callable): called with a list of changed source paths
+            directories: directories to watch
+            recursive (bool): watch their subdirectories too
+            interval (float): seconds between polls
+            debounce (float): seconds a file has to stay unchanged
+            postfix (str): postfix of our exrs, they're never reported
+            use_inotify (bool): wake up on inotify events where available
+        """
+        super(SourceWatcher, self).__init__()
+        self.daemon = True
+        self.callback = callback
+        self.recursive = recursive
+        self.interval = interval
+        self.debounce = debounce
+        self.postfix = postfix
+        self.lock = threading.Lock()
+        self.directories = set()
+        self.stopped = threading.Event()
+        # directory: {path: (size, mtime)} of the last poll
+        self.snapshots = {}
+        # path: ((size, mtime), time it was first seen like that)
+        self.pending = {}
+        self.inotify = None
+        if use_inotify and inotify_simple is not None:
+            try:
+                self.inotify = inotify_simple.INotify()
+            except OSError as e:
+                log.debug("No inotify, polling only: {}".format(e))
+        # inotify watch descriptor by directory
+        self.watches = {}
+        self.set_directories(directories)
+
+    def set_directories(self, directories):
+        """Watch these directories from the next poll on"""
+        directories = set(os.path.normpath(d) for d in directories if d)
+        with self.lock:
+            self.directories = directories
+
+    def stop(self):
+        self.stopped.set()
+
+    def _update_watches(self, directories):
+        if self.inotify is None:
+            return
+        flags = inotify_simple.flags
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+        wanted = set(directories)
+        if self.recursive:
+            for directory in directories:
+                for root, dirs, files in os.walk(directory):
+                    wanted.update(os.path.join(root, d) for d in dirs)
+        for directory in set(self.watches) - wanted:
+            try:
+                self.inotify.rm_watch(self.watches.pop(directory))
+            except OSError:
+                pass
+        for directory in wanted - set(self.watches):
+            try:
+                self.watches[directory] = self.inotify.add_watch(directory,
+                                                                 mask)
+            except OSError:
+                pass
+
+    def _wait(self, timeout):
+        if self.inotify is None or not self.watches:
+            self.stopped.wait(timeout)
+            return
+        # wakes up on the first event, or after the timeout
+        if self.inotify.read(timeout=int(timeout * 1000)):
+            # let a burst of writes finish before polling
+            self.stopped.wait(0.1)
+            self.inotify.read(timeout=0)
+
+    def poll(self):
+        """
+        Compare the directories with their last poll
+
+        Returns:
+            list of sources that changed and settled since
+        """
+        with self.lock:
+            directories = set(self.directories)
+        for directory in set(self.snapshots) - directories:
+            del self.snapshots[directory]
+        now = time.time()
+        for directory in directories:
+            files = snapshot(directory, self.recursive, self.postfix)
+            previous = self.snapshots.get(directory)
+            self.snapshots[directory] = files
+            if previous is None:
+                continue
+            for path, stat in files.items():
+                if previous.get(path) == stat:
+                    continue
+                pending = self.pending.get(path)
+                if pending is None or pending[0] != stat:
+                    self.pending[path] = (stat, now)
+
+        settled = []
+        for path, (stat, since) in list(self.pending.items()):
+            directory_files = None
+            for directory, files in self.snapshots.items():
+                if path in files:
+                    directory_files = files
+                    break
+            if directory_files is None:
+                # deleted before it settled
+                del self.pending[path]
+            elif directory_files[path] == stat and \
+                    now - since >= self.debounce:
+                settled.append(path)
+                del self.pending[path]
+        return sorted(settled)
+
+    def run(self):
+        watched = None
+        while not self.stopped.is_set():
+            with self.lock:
+                directories = set(self.directories)
+            if directories != watched:
+                self._update_watches(directories)
+                watched = directories
+            try:
+                changed = self.poll()
+            except Exception:
+                log.exception("Polling failed")
+                changed = []
+            if changed:
+                try:
+                    self.callback(changed)
+                except Exception:
+                    log.exception("Watch callback failed")
+            timeout = self.interval
+            if self.pending:
+                timeout = min(timeout, self.debounce)
+            self._wait(timeout)
+        if self.inotify is not None:
+            self.inotify.close()
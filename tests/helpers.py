@@ -0,0 +1,83 @@
+"""Shared by the tests: temporary directories and an in process converter"""
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+from img2tiledexrtool import backends
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'benchmarks')
+sys.path.insert(0, BENCHMARKS)
+
+# the stand-in img2tiledexr, configured by FAKE_IMG2EXR_* variables
+FAKE_CONVERTER = os.path.join(BENCHMARKS, 'fake_img2tiledexr.py')
+
+from fake_img2tiledexr import write_exr  # noqa: E402
+
+
+class FakeBackend(backends.ConverterBackend):
+    """Writes a valid single tile exr, fails for the names in fail"""
+    name = 'fake'
+    compressions = backends.COMPRESSIONS
+    linear_modes = backends.LINEAR_MODES
+    in_process = True
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.converted = []
+
+    def convert(self, file_in, file_out, options):
+        self.converted.append(file_in)
+        if os.path.basename(file_in) in self.fail:
+            return "failed on purpose"
+        write_exr(file_out, 1024, options['tile_size'], options['compression'])
+        return None
+
+
+class FakeCommandBackend(backends.Img2TiledEXRBackend):
+    """Runs the fake img2tiledexr with this python, a process per file"""
+    def __init__(self, executable=FAKE_CONVERTER):
+        super(FakeCommandBackend, self).__init__(executable)
+
+    def command(self, file_in, file_out, options):
+        return [sys.executable] + super(FakeCommandBackend, self).command(
+            file_in, file_out, options)
+
+
+def tga(width, height, depth=24):
+    """Header of an uncompressed true color tga"""
+    return (b'\0\0\x02' + b'\0' * 9 +
+            struct.pack('<HHB', width, height, depth) + b'\0')
+
+
+def png(width, height):
+    """Header of a 16 bit rgba png"""
+    return (b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' +
+            struct.pack('>IIBBBBB', width, height, 16, 6, 0, 0, 0))
+
+
+def write_file(path, data=b'source'):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Gives every test an empty directory in self.root"""
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='img2exr_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def write(self, name, data=b'source'):
+        return write_file(self.path(name), data)
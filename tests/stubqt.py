@@ -0,0 +1,124 @@
+"""
+Minimal stand-in for avalon.vendor.Qt to import the app outside of Maya
+
+Only what the list model needs is implemented: signals, the row insert and
+removal notifications and model indexes. Every notification of a model is
+recorded in its `events` list as a tuple, e.g. ('remove', first, last).
+"""
+import sys
+import types
+
+
+class BoundSignal(object):
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def emit(self, *args):
+        for slot in self.slots:
+            slot(*args)
+
+
+class Signal(object):
+    """Gives every instance its own BoundSignal"""
+    def __init__(self, *types):
+        self.name = '_signal_{}'.format(id(self))
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        signal = instance.__dict__.get(self.name)
+        if signal is None:
+            signal = instance.__dict__[self.name] = BoundSignal()
+        return signal
+
+
+class QObject(object):
+    def __init__(self, parent=None):
+        self._parent = parent
+
+
+class QModelIndex(object):
+    def __init__(self, row=-1):
+        self._row = row
+
+    def row(self):
+        return self._row
+
+    def isValid(self):
+        return self._row >= 0
+
+
+class QAbstractListModel(QObject):
+    dataChanged = Signal(QModelIndex, QModelIndex)
+
+    def __init__(self, parent=None):
+        super(QAbstractListModel, self).__init__(parent)
+        self.events = []
+        self.dataChanged.connect(
+            lambda first, last: self.events.append(('changed', first.row(),
+                                                    last.row())))
+
+    def index(self, row, column=0, parent=None):
+        return QModelIndex(row)
+
+    def beginInsertRows(self, parent, first, last):
+        self.events.append(('insert', first, last))
+
+    def endInsertRows(self):
+        pass
+
+    def beginRemoveRows(self, parent, first, last):
+        self.events.append(('remove', first, last))
+
+    def endRemoveRows(self):
+        pass
+
+
+class Qt(object):
+    DisplayRole = 0
+    DecorationRole = 1
+    ToolTipRole = 3
+    UserRole = 256
+
+
+class QIcon(object):
+    def __init__(self, path=None):
+        self.path = path
+
+
+QtCore = types.ModuleType('QtCore')
+QtCore.Signal = Signal
+QtCore.QObject = QObject
+QtCore.QModelIndex = QModelIndex
+QtCore.QAbstractListModel = QAbstractListModel
+QtCore.Qt = Qt
+QtCore.QVariant = lambda *args: None
+
+QtGui = types.ModuleType('QtGui')
+QtGui.QIcon = QIcon
+
+QtWidgets = types.ModuleType('QtWidgets')
+QtWidgets.QWidget = QObject
+
+
+def install():
+    """Register this module as avalon.vendor.Qt, unless a real Qt is there"""
+    try:
+        from avalon.vendor import Qt as real_qt  # noqa: F401
+        return real_qt
+    except ImportError:
+        pass
+    qt = types.ModuleType('avalon.vendor.Qt')
+    qt.QtCore, qt.QtGui, qt.QtWidgets = QtCore, QtGui, QtWidgets
+    avalon = sys.modules.get('avalon') or types.ModuleType('avalon')
+    vendor = sys.modules.get('avalon.vendor') or \
+        types.ModuleType('avalon.vendor')
+    avalon.vendor = vendor
+    vendor.Qt = qt
+    sys.modules['avalon'] = avalon
+    sys.modules['avalon.vendor'] = vendor
+    sys.modules['avalon.vendor.Qt'] = qt
+    return qt
@@ -0,0 +1,95 @@
+import unittest
+
+from img2tiledexrtool import stubcmds
+
+from . import stubqt
+
+stubcmds.install()
+qt = stubqt.install()
+
+from img2tiledexrtool import app  # noqa: E402
+
+
+class ListModelTest(unittest.TestCase):
+    def setUp(self):
+        if qt.QtCore is not stubqt.QtCore:
+            self.skipTest("the events are recorded by the Qt stand-in")
+        self.loaded = []
+        self.model = app.CustomListModel(
+            ['file{}'.format(i) for i in range(6)], loader=self.load)
+
+    def load(self, nodes):
+        self.loaded.append(list(nodes))
+        return dict((node, (1, node, '/tex/{}.tga'.format(node)))
+                    for node in nodes)
+
+    def assertRowIndex(self):
+        self.assertEqual(self.model.row_index,
+                         dict((node, row) for row, node in
+                              enumerate(self.model.nodes)))
+
+    def test_removes_consecutive_rows_together(self):
+        self.model.set_status(['file1', 'file4'], 'queued')
+        self.model.remove_nodes(['file1', 'file2', 'file4', 'missing'])
+        self.assertEqual(self.model.nodes, ['file0', 'file3', 'file5'])
+        self.assertRowIndex()
+        # bottom up, the earlier rows are still where they were
+        self.assertEqual(self.model.events[-2:], [('remove', 4, 4),
+                                                  ('remove', 1, 2)])
+        self.assertEqual(self.model.statuses, {})
+
+    def test_rename_keeps_the_row(self):
+        self.model.set_status(['file2'], 'converting')
+        del self.model.events[:]
+        self.model.rename_node('file2', 'skin')
+        self.model.rename_node('missing', 'other')
+        self.assertEqual(self.model.nodes[2], 'skin')
+        self.assertRowIndex()
+        self.assertEqual(self.model.statuses, {'skin': 'converting'})
+        self.assertEqual(self.model.events, [('changed', 2, 2)])
+        self.assertEqual(self.model.item(2), (1, 'skin', '/tex/skin.tga'))
+
+    def test_set_nodes_only_touches_what_changed(self):
+        self.model.set_nodes(['file0', 'file1', 'file3', 'file4', 'file5',
+                              'file6'])
+        self.assertEqual(self.model.events, [
+            ('remove', 2, 2), ('insert', 5, 5), ('changed', 0, 5)])
+        self.assertRowIndex()
+        del self.model.events[:]
+        self.model.set_status(['file0', 'file1', 'file5'], 'queued')
+        self.assertEqual(self.model.events, [('changed', 0, 1),
+                                             ('changed', 4, 4)])
+
+    def test_add_skips_known_nodes(self):
+        self.model.add_nodes(['file1', 'file7', 'file7', 'file8'])
+        self.assertEqual(self.model.nodes[6:], ['file7', 'file8'])
+        self.assertEqual(self.model.events, [('insert', 6, 7)])
+        self.assertRowIndex()
+
+    def test_items_load_a_block_at_a_time(self):
+        self.model.BLOCK_SIZE = 4
+        self.assertEqual(self.model.item(5), (1, 'file5', '/tex/file5.tga'))
+        self.model.item(4)
+        self.model.item(1)
+        self.assertEqual(self.loaded, [['file4', 'file5'],
+                                       ['file0', 'file1', 'file2', 'file3']])
+        self.model.invalidate(['file2'])
+        self.model.item(0)
+        self.assertEqual(len(self.loaded), 2)
+        self.model.item(2)
+        self.assertEqual(self.loaded[-1], ['file2'])
+
+    def test_gone_nodes_show_as_not_converted(self):
+        model = app.CustomListModel(['gone'], loader=lambda nodes: {})
+        self.assertEqual(model.item(0), (0, 'gone', None))
+
+
+class RowRangesTest(unittest.TestCase):
+    def test_ranges(self):
+        self.assertEqual(app.row_ranges([]), [])
+        self.assertEqual(app.row_ranges([0, 1, 2, 5, 7, 8]),
+                         [(0, 2), (5, 5), (7, 8)])
+
+
+if __name__ == '__main__':
+    unittest.main()
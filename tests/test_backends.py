@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import unittest
+
+from img2tiledexrtool import backends
+from img2tiledexrtool import exrheader
+from img2tiledexrtool import img2tiledexrtool
+
+from .helpers import FakeBackend, FakeCommandBackend, TempDirTestCase
+
+
+class NoOutputBackend(FakeCommandBackend):
+    def command(self, file_in, file_out, options):
+        return [sys.executable, '-c', 'print("nothing to do")']
+
+
+class CommandTest(TempDirTestCase):
+    def setUp(self):
+        super(CommandTest, self).setUp()
+        self.environ = dict(os.environ)
+        self.source = self.write('a.tga', b'x' * 2048)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        super(CommandTest, self).tearDown()
+
+    def convert(self, backend=None, **kwargs):
+        return img2tiledexrtool.convert_img_2_exr(
+            backend or FakeCommandBackend(), [self.source], overwrite=True,
+            **kwargs)[0]
+
+    def test_converts_with_a_process(self):
+        result = self.convert(tile_size=32)
+        self.assertIsNone(result.status)
+        self.assertEqual(result.attempts, 1)
+        self.assertIsNone(exrheader.validate(result.file_out, 32, 'zips'))
+
+    def test_exit_code_and_output_in_status(self):
+        os.environ['FAKE_IMG2EXR_FAIL'] = '1'
+        result = self.convert(retries=1)
+        self.assertEqual(result.status,
+                         img2tiledexrtool.STATUS_EXIT_CODE.format(
+                             1, 'Failed to convert {}'.format(self.source)))
+        self.assertEqual(result.attempts, 2)
+        self.assertFalse(os.path.exists(result.file_out))
+
+    def test_missing_output(self):
+        result = self.convert(NoOutputBackend())
+        self.assertEqual(result.status,
+                         img2tiledexrtool.STATUS_NO_OUTPUT.format(
+                             'nothing to do'))
+
+    def test_timeout_kills_the_converter(self):
+        os.environ['FAKE_IMG2EXR_LATENCY'] = '30'
+        start = time.time()
+        result = self.convert(timeout=0.5)
+        self.assertEqual(result.status,
+                         img2tiledexrtool.STATUS_TIMEOUT.format(0.5))
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(os.listdir(self.root), ['a.tga'])
+
+
+class ZipOnlyBackend(FakeBackend):
+    compressions = ('zip',)
+
+
+class BackendTest(TempDirTestCase):
+    options = {'compression': 'piz', 'tile_size': 32, 'linear': 'off'}
+
+    def test_get_backend(self):
+        backend = backends.get_backend(None, '/bin/img2tiledexr')
+        self.assertIsInstance(backend, backends.Img2TiledEXRBackend)
+        self.assertEqual(backend.executable, '/bin/img2tiledexr')
+        self.assertIsInstance(backends.get_backend('maketx', '/bin/maketx'),
+                              backends.MakeTxBackend)
+        fake = FakeBackend()
+        self.assertIs(backends.get_backend(fake), fake)
+        self.assertIs(img2tiledexrtool.resolve_backend(fake), fake)
+        self.assertRaises(ValueError, backends.get_backend, 'gimp')
+
+    def test_command_lines(self):
+        self.assertEqual(
+            backends.Img2TiledEXRBackend('img2tiledexr').command(
+                'a.tga', 'a.exr', self.options),
+            ['img2tiledexr', 'a.tga', 'a.exr', '-compression', 'piz',
+             '-tileSize', '32', '-linear', 'off'])
+        self.assertEqual(
+            backends.OIIOToolBackend('oiiotool').command(
+                'a.tga', 'a.exr', dict(self.options, linear='on')),
+            ['oiiotool', 'a.tga', '--colorconvert', 'sRGB', 'linear',
+             '--tile', '32', '32', '--compression', 'piz', '-o', 'a.exr'])
+        self.assertEqual(
+            backends.MakeTxBackend('maketx').command('a.tga', 'a.exr',
+                                                     self.options),
+            ['maketx', 'a.tga', '-o', 'a.exr', '--tile', '32', '32',
+             '--compression', 'piz'])
+
+    def test_backends_declare_what_they_support(self):
+        auto = dict(self.options, linear='auto')
+        self.assertIsNone(backends.Img2TiledEXRBackend('x').supports(auto))
+        for name in ('oiiotool', 'maketx'):
+            self.assertEqual(backends.get_backend(name, 'x').supports(auto),
+                             "{} doesn't support linear auto".format(name))
+        self.assertEqual(backends.ConverterBackend().compressions, ())
+
+    def test_oiio_compressions_follow_its_openexr(self):
+        class OIIO(object):
+            def __init__(self, libraries):
+                self.libraries = libraries
+
+            def get_string_attribute(self, name):
+                return self.libraries
+
+        old = backends.oiio_compressions(OIIO('jpeg:jpeg-turbo 2.0.4;'
+                                              'openexr:OpenEXR 2.1.0'))
+        self.assertNotIn('dwaa', old)
+        self.assertIn('zips', old)
+        self.assertEqual(backends.oiio_compressions(
+            OIIO('openexr:OpenEXR 3.1.5')), backends.COMPRESSIONS)
+        # older OpenImageIO doesn't list its libraries
+        self.assertEqual(backends.oiio_compressions(OIIO('')),
+                         backends.COMPRESSIONS)
+
+    def test_oiio_backend_rejects_everything_without_the_module(self):
+        backend = backends.OIIOPythonBackend()
+        if backend.available():
+            self.skipTest("OpenImageIO is installed")
+        self.assertEqual(backend.supports(self.options),
+                         "oiio can't write piz compression")
+
+    def test_unsupported_options_are_not_converted(self):
+        backend = ZipOnlyBackend()
+        self.assertIsNone(backend.supports(dict(self.options,
+                                                compression='zip')))
+        results = img2tiledexrtool.convert_img_2_exr(
+            backend, [self.write('a.tga')], compression='piz')
+        self.assertEqual(results[0].status,
+                         img2tiledexrtool.STATUS_UNSUPPORTED.format(
+                             "fake can't write piz compression"))
+        self.assertEqual(backend.converted, [])
+
+    def test_find_executable(self):
+        path = self.write('maketx')
+        os.chmod(path, 0o755)
+        environ = dict(os.environ)
+        try:
+            os.environ['PATH'] = os.pathsep.join(['/nonexistent', self.root])
+            self.assertEqual(backends.find_executable(['oiiotool', 'maketx']),
+                             path)
+            self.assertTrue(backends.MakeTxBackend().available())
+            self.assertFalse(backends.OIIOToolBackend().available())
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from .helpers import BENCHMARKS, TempDirTestCase
+
+BENCH = os.path.join(BENCHMARKS, 'bench.py')
+
+
+class BenchTest(TempDirTestCase):
+    def bench(self, *args):
+        return subprocess.check_output(
+            [sys.executable, BENCH, '--latency', '0'] + list(args),
+            stderr=subprocess.STDOUT).decode('utf-8', 'replace')
+
+    def test_runs_every_benchmark(self):
+        output = self.path('run.json')
+        self.bench('--sizes', '10', '--output', output)
+        with open(output) as f:
+            report = json.load(f)
+        results = dict((r['benchmark'], r) for r in report['results'])
+        self.assertEqual(sorted(results), ['convert_files',
+                                           'convert_img_2_exr',
+                                           'model_data', 'revert_nodes'])
+        self.assertEqual(results['convert_img_2_exr']['nodes'], 10)
+        self.assertIn('p50', results['convert_img_2_exr']['latency'])
+
+        text = self.bench('--sizes', '10', '--only', 'model_data',
+                          '--compare', output)
+        self.assertIn('model_data', text.splitlines()[-1])
+
+    def test_model_data_queries_in_bulk(self):
+        output = self.path('run.json')
+        self.bench('--sizes', '10,200', '--only', 'model_data', '--output',
+                   output)
+        with open(output) as f:
+            calls = [r['cmds_calls'] for r in json.load(f)['results']]
+        self.assertEqual(calls[0], calls[1])
+
+    def test_unknown_benchmark(self):
+        self.assertRaises(subprocess.CalledProcessError, self.bench,
+                          '--only', 'everything')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import unittest
+
+from img2tiledexrtool import cli
+
+from .helpers import FAKE_CONVERTER, TempDirTestCase
+
+
+class ManifestTest(TempDirTestCase):
+    def test_json_lists(self):
+        path = self.write('files.json', json.dumps(
+            {'files': ['/tex/a.tga', {'source': '/tex/b.tga'}]}).encode())
+        self.assertEqual(cli.read_manifest(path), ['/tex/a.tga', '/tex/b.tga'])
+
+    def test_csv_with_header(self):
+        path = self.write('files.csv', b'asset,source\nrock,/tex/a.tga\n'
+                                       b'tree, /tex/b.tga\n\n')
+        self.assertEqual(cli.read_manifest(path), ['/tex/a.tga', '/tex/b.tga'])
+
+    def test_csv_without_header(self):
+        path = self.write('files.csv', b'/tex/a.tga\n/tex/b.tga,extra\n')
+        self.assertEqual(cli.read_manifest(path), ['/tex/a.tga', '/tex/b.tga'])
+
+
+class ExpandPathsTest(TempDirTestCase):
+    def setUp(self):
+        super(ExpandPathsTest, self).setUp()
+        for name in ('a.tga', 'a_tiled.exr', 'notes.txt', 'sub/b.png',
+                     'a.1234abcd.converting.exr'):
+            self.write(name)
+
+    def test_directory_skips_outputs(self):
+        self.assertEqual(cli.expand_paths([self.root]), [self.path('a.tga')])
+
+    def test_recursive(self):
+        self.assertEqual(cli.expand_paths([self.root], recursive=True),
+                         [self.path('a.tga'), self.path('sub', 'b.png')])
+
+    def test_glob_and_files(self):
+        self.assertEqual(cli.expand_paths([self.path('sub', '*.png'),
+                                           self.path('notes.txt'),
+                                           self.path('missing.tga')]),
+                         [self.path('sub', 'b.png'), self.path('notes.txt')])
+
+
+class ConvertTest(TempDirTestCase):
+    def test_convert_writes_a_report(self):
+        self.write('a.tga', b'x' * 2048)
+        self.write('b.tga', b'x' * 2048)
+        report = self.path('report.json')
+        code = cli.main(['convert', self.root, '--executable', FAKE_CONVERTER,
+                         '--tile-size', '32', '--report', report])
+        self.assertEqual(code, 0)
+        with open(report) as f:
+            data = json.load(f)
+        self.assertEqual((data['total'], data['failed']), (2, 0))
+        self.assertEqual(data['options']['tile_size'], 32)
+        self.assertTrue(os.path.isfile(self.path('b_tiled.exr')))
+
+        code = cli.main(['convert', self.root, '--executable', FAKE_CONVERTER,
+                         '--tile-size', '32', '--only-stale'])
+        self.assertEqual(code, 0)
+
+    def test_progress_counts_duplicates_once(self):
+        source = self.write('a.tga', b'x' * 2048)
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        level = cli.log.level
+        cli.log.addHandler(handler)
+        cli.log.setLevel(logging.INFO)
+        try:
+            code = cli.main(['convert', self.root, source, '--executable',
+                             FAKE_CONVERTER])
+        finally:
+            cli.log.removeHandler(handler)
+            cli.log.setLevel(level)
+        self.assertEqual(code, 0)
+        self.assertEqual([m for m in messages if m.startswith('[')],
+                         ['[1/1] ok {}'.format(source)])
+
+    def test_nothing_to_convert(self):
+        self.assertEqual(cli.main(['convert', self.root, '--executable',
+                                   FAKE_CONVERTER]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import os
+import threading
+import unittest
+
+from img2tiledexrtool import img2tiledexrtool
+from img2tiledexrtool import journal as batch_journal
+
+from .helpers import FakeBackend, TempDirTestCase, write_file
+
+
+class GatedBackend(FakeBackend):
+    """Holds the conversion of the names in wait until gate is set"""
+    def __init__(self, wait=(), fail=()):
+        super(GatedBackend, self).__init__(fail)
+        self.wait = set(wait)
+        self.gate = threading.Event()
+
+    def convert(self, file_in, file_out, options):
+        if os.path.basename(file_in) in self.wait:
+            self.gate.wait(10)
+        return super(GatedBackend, self).convert(file_in, file_out, options)
+
+
+def statuses(results):
+    return dict((os.path.basename(r.file_in), r.status) for r in results)
+
+
+class StalenessTest(TempDirTestCase):
+    def setUp(self):
+        super(StalenessTest, self).setUp()
+        self.source = self.write('a.tga', b'pixels')
+        self.exr = self.path('a_tiled.exr')
+        self.options = img2tiledexrtool.conversion_options()
+
+    def convert(self, backend=None, **kwargs):
+        return statuses(img2tiledexrtool.convert_img_2_exr(
+            backend or FakeBackend(), [self.source], **kwargs))
+
+    def touch(self, path, mtime):
+        os.utime(path, (mtime, mtime))
+
+    def test_missing_exr_is_stale(self):
+        self.assertTrue(img2tiledexrtool.is_stale(self.source, self.exr,
+                                                  self.options))
+
+    def test_converted_exr_is_up_to_date(self):
+        self.convert()
+        self.assertFalse(img2tiledexrtool.is_stale(self.source, self.exr,
+                                                   self.options))
+        manifest = img2tiledexrtool.read_manifest(self.exr)
+        self.assertEqual(manifest['options'], self.options)
+        self.assertEqual(manifest['source']['size'], 6)
+
+    def test_other_options_are_stale(self):
+        self.convert()
+        options = img2tiledexrtool.conversion_options(compression='piz')
+        self.assertTrue(img2tiledexrtool.is_stale(self.source, self.exr,
+                                                  options))
+
+    def test_changed_source_is_stale(self):
+        self.convert()
+        write_file(self.source, b'other pixels')
+        self.assertTrue(img2tiledexrtool.is_stale(self.source, self.exr,
+                                                  self.options))
+
+    def test_touched_source_is_stale_unless_hashed(self):
+        self.convert(content_hash=True)
+        self.touch(self.source, 1500000000)
+        self.assertTrue(img2tiledexrtool.is_stale(self.source, self.exr,
+                                                  self.options))
+        self.assertFalse(img2tiledexrtool.is_stale(
+            self.source, self.exr, self.options, content_hash=True))
+        # the manifest has the new mtime, the source isn't hashed again
+        manifest = img2tiledexrtool.read_manifest(self.exr)
+        self.assertEqual(manifest['source']['mtime'], 1500000000)
+        self.assertFalse(img2tiledexrtool.is_stale(self.source, self.exr,
+                                                   self.options))
+
+    def test_exr_without_manifest_compares_mtimes(self):
+        self.convert()
+        os.remove(img2tiledexrtool.manifest_path(self.exr))
+        self.touch(self.source, 1500000000)
+        self.touch(self.exr, 1500000010)
+        self.assertFalse(img2tiledexrtool.is_stale(self.source, self.exr,
+                                                   self.options))
+        self.touch(self.source, 1500000020)
+        self.assertTrue(img2tiledexrtool.is_stale(self.source, self.exr,
+                                                  self.options))
+
+    def test_only_stale_skips_up_to_date_files(self):
+        self.convert()
+        backend = FakeBackend()
+        self.assertEqual(self.convert(backend),
+                         {'a.tga': img2tiledexrtool.STATUS_EXISTS})
+        self.assertEqual(self.convert(backend, only_stale=True),
+                         {'a.tga': img2tiledexrtool.STATUS_UP_TO_DATE})
+        self.assertEqual(backend.converted, [])
+        write_file(self.source, b'other pixels')
+        self.assertEqual(self.convert(backend, only_stale=True),
+                         {'a.tga': None})
+        self.assertEqual(self.convert(backend, overwrite=True),
+                         {'a.tga': None})
+        self.assertEqual(len(backend.converted), 2)
+
+
+class SharedSourceTest(TempDirTestCase):
+    def test_duplicates_are_converted_once(self):
+        source = self.write('a.tga')
+        backend = FakeBackend()
+        results = img2tiledexrtool.convert_img_2_exr(
+            backend, [source, source, os.path.join(self.root, '.', 'a.tga')])
+        self.assertEqual([r.status for r in results], [None])
+        self.assertEqual(backend.converted, [source])
+
+    def test_sources_with_the_same_output_conflict(self):
+        tga = self.write('a.tga')
+        png = self.write('a.png')
+        backend = FakeBackend()
+        results = statuses(img2tiledexrtool.convert_img_2_exr(
+            backend, [tga, png]))
+        self.assertEqual(results, {
+            'a.tga': None,
+            'a.png': img2tiledexrtool.STATUS_CONFLICT.format(tga)})
+        self.assertEqual(backend.converted, [tga])
+
+
+class SkippedFilesTest(TempDirTestCase):
+    """Files that need no job still go through the batch's callback"""
+    def convert(self, backend, files, **kwargs):
+        called = []
+        results = img2tiledexrtool.convert_img_2_exr(
+            backend, files, callback=lambda *result: called.append(result),
+            **kwargs)
+        self.assertEqual(sorted(called), sorted(tuple(r) for r in results))
+        return statuses(results)
+
+    def test_conflict(self):
+        tga = self.write('a.tga')
+        results = self.convert(FakeBackend(), [tga, self.write('a.png')])
+        self.assertEqual(results['a.png'],
+                         img2tiledexrtool.STATUS_CONFLICT.format(tga))
+
+    def test_resumed(self):
+        files = [self.write('a.tga')]
+        journal_path = self.path('convert.journal')
+        for status in (None, img2tiledexrtool.STATUS_RESUMED,
+                       img2tiledexrtool.STATUS_RESUMED):
+            with batch_journal.BatchJournal(journal_path) as journal:
+                self.assertEqual(self.convert(FakeBackend(), files,
+                                              journal=journal),
+                                 {'a.tga': status})
+
+    def test_unsupported(self):
+        backend = FakeBackend()
+        backend.compressions = ('zip',)
+        results = self.convert(backend, [self.write('a.tga')],
+                               compression='piz')
+        self.assertEqual(results['a.tga'],
+                         img2tiledexrtool.STATUS_UNSUPPORTED.format(
+                             "fake can't write piz compression"))
+
+    def test_skipped_results_come_first(self):
+        tga = self.write('a.tga')
+        results = img2tiledexrtool.convert_img_2_exr(
+            FakeBackend(), [tga, self.write('a.png')])
+        self.assertEqual([r.file_in for r in results],
+                         [self.path('a.png'), tga])
+
+
+class StreamingTest(TempDirTestCase):
+    def test_results_arrive_as_files_finish(self):
+        slow = self.write('slow.tga', b'x' * 100)
+        fast = self.write('fast.tga')
+        backend = GatedBackend(wait=['slow.tga'])
+        results = img2tiledexrtool.iter_convert_img_2_exr(
+            backend, [slow, fast], threads=2)
+        try:
+            self.assertEqual(next(results).file_in, fast)
+            backend.gate.set()
+            self.assertEqual(next(results).file_in, slow)
+        finally:
+            backend.gate.set()
+            results.close()
+
+    def test_cancel_skips_waiting_files(self):
+        files = [self.write('{}.tga'.format(name)) for name in 'abc']
+        cancel_event = threading.Event()
+        results = img2tiledexrtool.convert_img_2_exr(
+            FakeBackend(), files, threads=1, cancel_event=cancel_event,
+            callback=lambda *result: cancel_event.set())
+        self.assertEqual([r.status for r in results],
+                         [None] + [img2tiledexrtool.STATUS_CANCELLED] * 2)
+
+    def test_closing_the_iterator_cancels(self):
+        files = [self.write('{}.tga'.format(name)) for name in 'abc']
+        backend = GatedBackend(wait=['b.tga'])
+        results = img2tiledexrtool.iter_convert_img_2_exr(backend, files,
+                                                          threads=1)
+        self.assertEqual(next(results).file_in, files[0])
+        results.close()
+        # b may be converting already, c never starts
+        backend.gate.set()
+        img2tiledexrtool.get_engine().drain()
+        self.assertNotIn(files[2], backend.converted)
+
+
+if __name__ == '__main__':
+    unittest.main()
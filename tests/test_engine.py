@@ -0,0 +1,57 @@
+import os
+import unittest
+
+from img2tiledexrtool import img2tiledexrtool
+
+from .helpers import FakeBackend, TempDirTestCase
+
+
+class FailingJournal(object):
+    def is_done(self, file_in, file_out, options):
+        return False
+
+    def started(self, job):
+        pass
+
+    def finished(self, result):
+        raise IOError("disk full")
+
+
+class EngineTest(TempDirTestCase):
+    def test_converts_in_process(self):
+        files = [self.write('a.tga'), self.write('b.png')]
+        results = img2tiledexrtool.convert_img_2_exr(FakeBackend(), files)
+        self.assertEqual([r.status for r in results], [None, None])
+        for result in results:
+            self.assertTrue(os.path.isfile(result.file_out))
+            self.assertTrue(os.path.isfile(
+                img2tiledexrtool.manifest_path(result.file_out)))
+
+    def test_failures_are_results(self):
+        files = [self.write('a.tga'), self.write('bad.tga')]
+        results = dict((os.path.basename(r.file_in), r.status) for r in
+                       img2tiledexrtool.convert_img_2_exr(
+                           FakeBackend(fail=['bad.tga']), files))
+        self.assertIsNone(results['a.tga'])
+        self.assertIn("failed on purpose", results['bad.tga'])
+        self.assertFalse(os.path.exists(self.path('bad_tiled.exr')))
+
+    def test_results_arrive_when_journal_fails(self):
+        files = [self.write('a.tga'), self.write('b.tga')]
+        results = img2tiledexrtool.convert_img_2_exr(
+            FakeBackend(), files, journal=FailingJournal())
+        self.assertEqual(len(results), 2)
+
+    def test_shared_engine_keeps_its_size(self):
+        engine = img2tiledexrtool.get_engine(2)
+        try:
+            self.assertIs(img2tiledexrtool.get_engine(), engine)
+            self.assertEqual(engine.size, 2)
+            img2tiledexrtool.get_engine(3)
+            self.assertEqual(engine.size, 3)
+        finally:
+            img2tiledexrtool.get_engine(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
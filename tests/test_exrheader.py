@@ -0,0 +1,65 @@
+import os
+import unittest
+
+from img2tiledexrtool import exrheader
+from img2tiledexrtool import imageinfo
+
+from .helpers import TempDirTestCase, write_exr
+
+
+class HeaderTest(TempDirTestCase):
+    def exr(self, name='a.exr', size=1024, tile_size=64, compression='zips'):
+        path = self.path(name)
+        write_exr(path, size, tile_size, compression)
+        return path
+
+    def test_reads_tiled_header(self):
+        header = exrheader.read_header(self.exr(tile_size=32))
+        self.assertTrue(header.tiled)
+        self.assertEqual(header.tile_size, (32, 32))
+        self.assertEqual(header.level_mode, 'one')
+        self.assertEqual(header.compression, 'zips')
+        self.assertEqual(header.data_window, (0, 0, 31, 31))
+        self.assertEqual(header.channels, ('Y',))
+        self.assertEqual(header.chunks, 1)
+        self.assertTrue(header.complete)
+        self.assertIsNone(exrheader.validate(self.path('a.exr'), 32, 'zips'))
+
+    def test_cut_off_file_is_incomplete(self):
+        path = self.exr()
+        with open(path, 'rb+') as f:
+            f.truncate(700)
+        self.assertEqual(exrheader.validate(path),
+                         "incomplete, the file was cut off")
+
+    def test_wrong_options(self):
+        path = self.exr(tile_size=32, compression='piz')
+        self.assertEqual(exrheader.validate(path, tile_size=64),
+                         "tile size 32x32 instead of 64")
+        self.assertEqual(exrheader.validate(path, compression='zips'),
+                         "piz compression instead of zips")
+
+    def test_not_an_exr(self):
+        path = self.write('a.exr', b'not an exr at all')
+        self.assertIsNone(exrheader.read_header(path))
+        self.assertEqual(exrheader.validate(path),
+                         "not an exr or its header is broken")
+        self.assertEqual(exrheader.validate(self.path('missing.exr')),
+                         "missing")
+
+    def test_cache_reads_changed_files_again(self):
+        path = self.exr(tile_size=32)
+        cache = exrheader.HeaderCache()
+        self.assertEqual(cache.header(path).tile_size, (32, 32))
+        write_exr(path, 2048, 64)
+        self.assertEqual(cache.header(path).tile_size, (64, 64))
+        os.remove(path)
+        self.assertIsNone(cache.header(path))
+
+    def test_image_info_of_exr(self):
+        info = imageinfo.read_image_info(self.exr(tile_size=32))
+        self.assertEqual(info, imageinfo.ImageInfo(32, 32, 1, 16))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import unittest
+
+from img2tiledexrtool import farmqueue
+
+from .helpers import FakeBackend, TempDirTestCase
+
+
+class FarmQueueTest(TempDirTestCase):
+    def setUp(self):
+        super(FarmQueueTest, self).setUp()
+        self.queue = farmqueue.FarmQueue(self.path('queue'), stale_timeout=0)
+        self.sources = [self.write('a.tga'), self.write('b.tga')]
+
+    def test_submit_once_per_output(self):
+        ids = self.queue.submit(self.sources + [self.sources[0]])
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(self.queue.counts()['pending'], 2)
+
+    def test_claims_are_exclusive(self):
+        self.queue.submit(self.sources)
+        first = self.queue.claim('w1', 1)
+        second = self.queue.claim('w2', 5)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first[0][1]['id'], second[0][1]['id'])
+        self.assertEqual(self.queue.claim('w3', 5), [])
+
+    def test_complete_releases_claim(self):
+        self.queue.submit(self.sources[:1])
+        (claim, job), = self.queue.claim('w1')
+        self.queue.complete(claim, job, None, 'w1')
+        self.assertEqual(self.queue.counts(),
+                         {'pending': 0, 'claimed': 0, 'done': 1})
+        self.assertTrue(self.queue.results()[0]['ok'])
+
+    def test_reclaims_jobs_of_silent_workers(self):
+        self.queue.submit(self.sources)
+        self.queue.heartbeat('w1', 1)
+        self.queue.claim('w1', 2)
+        # first look records the counter, the second sees it unchanged
+        self.assertEqual(self.queue.reclaim_stale(), 0)
+        self.assertEqual(self.queue.reclaim_stale(), 2)
+        self.assertEqual(self.queue.counts()['pending'], 2)
+
+    def test_keeps_jobs_of_live_workers(self):
+        self.queue.submit(self.sources)
+        self.queue.heartbeat('w1', 1)
+        self.queue.claim('w1', 2)
+        self.queue.reclaim_stale()
+        self.queue.heartbeat('w1', 2)
+        self.assertEqual(self.queue.reclaim_stale(), 0)
+
+    def test_worker_converts_everything(self):
+        self.queue.submit(self.sources)
+        worker = farmqueue.FarmWorker(self.queue, FakeBackend(), threads=1,
+                                      worker_id='w1', interval=0.05)
+        self.assertEqual(worker.run(exit_when_empty=True), 2)
+        self.assertEqual(worker.batches, [])
+        results = self.queue.results()
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(r['ok'] for r in results))
+        self.assertTrue(os.path.isfile(self.path('a_tiled.exr')))
+        beat = farmqueue.read_json(os.path.join(self.queue.workers_dir,
+                                                'w1.json'))
+        self.assertEqual(beat['state'], 'stopped')
+
+
+if __name__ == '__main__':
+    unittest.main()
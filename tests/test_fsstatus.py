@@ -0,0 +1,87 @@
+import os
+import threading
+import unittest
+
+from img2tiledexrtool import fsstatus
+
+from .helpers import TempDirTestCase, write_exr
+
+
+class StatCacheTest(TempDirTestCase):
+    def test_stat_and_listing(self):
+        self.write('a.tga', b'12')
+        cache = fsstatus.StatCache()
+        self.assertEqual(cache.stat(self.path('a.tga'))[0], 2)
+        self.assertIsNone(cache.stat(self.path('b.tga')))
+        self.assertEqual(cache.listing(self.root),
+                         {os.path.normcase('a.tga'): 'a.tga'})
+
+    def test_file_written_in_place(self):
+        path = self.write('a.tga', b'12')
+        # whole seconds, python 2 loses precision setting float mtimes
+        mtime = 1500000000
+        os.utime(self.root, (mtime, mtime))
+        cache = fsstatus.StatCache(ttl=0)
+        self.assertEqual(cache.stat(path)[0], 2)
+        with open(path, 'ab') as f:
+            f.write(b'x' * 900)
+        os.utime(path, (mtime + 10, mtime + 10))
+        # same directory mtime, only the file changed
+        os.utime(self.root, (mtime, mtime))
+        self.assertEqual(cache.stat(path), (902, mtime + 10))
+
+    def test_new_file_after_invalidate(self):
+        cache = fsstatus.StatCache()
+        self.assertIsNone(cache.stat(self.path('a.tga')))
+        self.write('a.tga')
+        self.assertIsNone(cache.stat(self.path('a.tga')))
+        cache.invalidate([self.path('a.tga')])
+        self.assertIsNotNone(cache.stat(self.path('a.tga')))
+
+    def test_files_of_pattern(self):
+        self.write('skin.1001.tif')
+        self.write('skin.1002.tif')
+        cache = fsstatus.StatCache()
+        self.assertEqual(cache.files(self.path('skin.<UDIM>.tif')),
+                         [self.path('skin.1001.tif'),
+                          self.path('skin.1002.tif')])
+
+
+class FileStatusTest(TempDirTestCase):
+    def test_statuses(self):
+        source = self.write('a.tga')
+        self.assertEqual(fsstatus.file_status([self.path('b.tga')]),
+                         fsstatus.SOURCE_MISSING)
+        self.assertEqual(fsstatus.file_status([source]),
+                         fsstatus.EXR_MISSING)
+        exr = self.path('a_tiled.exr')
+        self.write('a_tiled.exr', b'not an exr')
+        self.assertEqual(fsstatus.file_status([source]),
+                         fsstatus.EXR_INVALID)
+        write_exr(exr, 1024)
+        mtime = os.stat(source).st_mtime
+        os.utime(exr, (mtime + 10, mtime + 10))
+        self.assertEqual(fsstatus.file_status([source]), fsstatus.UP_TO_DATE)
+        os.utime(source, (mtime + 20, mtime + 20))
+        self.assertEqual(fsstatus.file_status([source]), fsstatus.EXR_STALE)
+
+    def test_scanner(self):
+        source = self.write('a.tga')
+        results = {}
+        done = threading.Event()
+
+        def callback(statuses):
+            results.update(statuses)
+            done.set()
+
+        scanner = fsstatus.StatusScanner(callback)
+        try:
+            scanner.request('file1', [source])
+            self.assertTrue(done.wait(5))
+        finally:
+            scanner.stop()
+        self.assertEqual(results, {'file1': fsstatus.EXR_MISSING})
+
+
+if __name__ == '__main__':
+    unittest.main()
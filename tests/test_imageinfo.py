@@ -0,0 +1,87 @@
+import struct
+import threading
+import unittest
+
+from img2tiledexrtool import imageinfo
+from img2tiledexrtool import img2tiledexrtool
+
+from .helpers import FakeBackend, TempDirTestCase, png, tga
+
+
+class ImageInfoTest(TempDirTestCase):
+    def info(self, name, data):
+        return imageinfo.read_image_info(self.write(name, data))
+
+    def test_tga(self):
+        self.assertEqual(self.info('a.tga', tga(300, 200, 32)),
+                         imageinfo.ImageInfo(300, 200, 4, 8))
+
+    def test_png(self):
+        self.assertEqual(self.info('a.png', png(64, 32)),
+                         imageinfo.ImageInfo(64, 32, 4, 16))
+
+    def test_bmp(self):
+        data = b'BM' + b'\0' * 16 + struct.pack('<iiHH', 10, -20, 1, 24)
+        self.assertEqual(self.info('a.bmp', data),
+                         imageinfo.ImageInfo(10, 20, 3, 8))
+
+    def test_psd(self):
+        data = b'8BPS' + b'\0' * 8 + struct.pack('>HIIH', 3, 40, 50, 16)
+        self.assertEqual(self.info('a.psd', data),
+                         imageinfo.ImageInfo(50, 40, 3, 16))
+
+    def test_tiff(self):
+        entries = [(256, 3, 1, struct.pack('<H2x', 12)),
+                   (257, 4, 1, struct.pack('<I', 34)),
+                   (277, 3, 1, struct.pack('<H2x', 3))]
+        data = b'II*\x00' + struct.pack('<IH', 8, len(entries)) + b''.join(
+            struct.pack('<HHI4s', *entry) for entry in entries)
+        self.assertEqual(self.info('a.tif', data),
+                         imageinfo.ImageInfo(12, 34, 3, 8))
+
+    def test_unknown_format_costs_its_size(self):
+        path = self.write('a.tga', b'x' * 10)
+        self.assertIsNone(imageinfo.read_image_info(path))
+        self.assertEqual(imageinfo.estimate_cost(path),
+                         (10, 10 * imageinfo.WORKING_BYTES_PER_CHANNEL))
+
+
+class LargestFirstTest(TempDirTestCase):
+    def test_largest_first_within_a_priority(self):
+        files = [self.write('small.tga', tga(16, 16)),
+                 self.write('big.tga', tga(512, 512)),
+                 self.write('medium.tga', tga(64, 64)),
+                 self.write('selected.tga', tga(8, 8))]
+        backend = FakeBackend()
+        img2tiledexrtool.convert_img_2_exr(
+            backend, files, threads=1,
+            priorities={files[3]: img2tiledexrtool.PRIORITY_SELECTED})
+        self.assertEqual(backend.converted,
+                         [files[3], files[1], files[2], files[0]])
+
+
+class MemoryBudgetTest(unittest.TestCase):
+    def test_waits_until_it_fits(self):
+        budget = img2tiledexrtool.MemoryBudget(100)
+        self.assertEqual(budget.acquire(60), 60)
+        acquired = []
+        waiting = threading.Thread(target=lambda: acquired.append(
+            budget.acquire(60)))
+        waiting.start()
+        waiting.join(0.2)
+        self.assertEqual(acquired, [])
+        budget.release(60)
+        waiting.join(5)
+        self.assertEqual(acquired, [60])
+
+    def test_too_big_runs_alone(self):
+        budget = img2tiledexrtool.MemoryBudget(100)
+        self.assertEqual(budget.acquire(500), 100)
+        cancel_event = threading.Event()
+        cancel_event.set()
+        self.assertEqual(budget.acquire(10, cancel_event), 0)
+        self.assertEqual(img2tiledexrtool.MemoryBudget().acquire(500), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import os
+import unittest
+
+from img2tiledexrtool import img2tiledexrtool
+from img2tiledexrtool import journal as batch_journal
+
+from .helpers import FakeBackend, TempDirTestCase
+
+
+class JournalTest(TempDirTestCase):
+    def setUp(self):
+        super(JournalTest, self).setUp()
+        self.journal_path = self.path('convert.journal')
+        self.files = [self.write('a.tga'), self.write('b.tga')]
+
+    def convert(self, backend=None, **kwargs):
+        backend = backend or FakeBackend()
+        with batch_journal.BatchJournal(self.journal_path) as journal:
+            results = img2tiledexrtool.convert_img_2_exr(
+                backend, self.files, journal=journal, overwrite=True,
+                **kwargs)
+        return dict((os.path.basename(r.file_in), r.status) for r in results)
+
+    def test_resumes_done_files(self):
+        self.assertEqual(self.convert(), {'a.tga': None, 'b.tga': None})
+        backend = FakeBackend()
+        results = self.convert(backend)
+        self.assertEqual(set(results.values()),
+                         set([img2tiledexrtool.STATUS_RESUMED]))
+        self.assertEqual(backend.converted, [])
+
+    def test_failed_files_are_converted_again(self):
+        self.convert(FakeBackend(fail=['b.tga']))
+        backend = FakeBackend()
+        results = self.convert(backend)
+        self.assertEqual(results['a.tga'], img2tiledexrtool.STATUS_RESUMED)
+        self.assertEqual(backend.converted, [self.files[1]])
+
+    def test_changed_source_is_converted_again(self):
+        self.convert()
+        with open(self.files[0], 'ab') as f:
+            f.write(b'more')
+        backend = FakeBackend()
+        self.convert(backend)
+        self.assertEqual(backend.converted, [self.files[0]])
+
+    def test_changed_options_convert_again(self):
+        self.convert()
+        backend = FakeBackend()
+        results = self.convert(backend, tile_size=32)
+        self.assertEqual(results, {'a.tga': None, 'b.tga': None})
+        self.assertEqual(len(backend.converted), 2)
+
+    def test_removed_exr_is_converted_again(self):
+        self.convert()
+        os.remove(self.path('a_tiled.exr'))
+        backend = FakeBackend()
+        self.convert(backend)
+        self.assertEqual(backend.converted, [self.files[0]])
+
+    def test_interrupted_run(self):
+        temp = self.write('a.1234.converting.exr')
+        with open(self.journal_path, 'w') as f:
+            f.write(json.dumps({'event': 'start', 'source': self.files[0],
+                                'temp': temp}) + '\n')
+            # cut off by a crash
+            f.write('{"event": "do')
+        with batch_journal.BatchJournal(self.journal_path):
+            pass
+        self.assertFalse(os.path.exists(temp))
+        with open(self.journal_path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(json.loads(lines[-1])['event'], 'run')
+
+
+class ReplaceTest(TempDirTestCase):
+    def test_replace_file(self):
+        src = self.write('new.exr', b'new')
+        dst = self.write('out.exr', b'old')
+        img2tiledexrtool.replace_file(src, dst)
+        self.assertFalse(os.path.exists(src))
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), b'new')
+
+    def test_failed_conversion_keeps_the_old_exr(self):
+        source = self.write('a.tga')
+        exr = self.write('a_tiled.exr', b'old')
+        results = img2tiledexrtool.convert_img_2_exr(
+            FakeBackend(fail=['a.tga']), [source], overwrite=True)
+        self.assertIsNotNone(results[0].status)
+        with open(exr, 'rb') as f:
+            self.assertEqual(f.read(), b'old')
+        self.assertEqual(sorted(os.listdir(self.root)),
+                         ['a.tga', 'a_tiled.exr'])
+
+    def test_temp_outputs(self):
+        temp = img2tiledexrtool.temp_output_path('/tex/a_tiled.exr')
+        self.assertTrue(temp.endswith('.exr'))
+        self.assertTrue(img2tiledexrtool.is_temp_output(temp))
+        self.assertFalse(img2tiledexrtool.is_temp_output('/tex/a_tiled.exr'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import unittest
+
+from img2tiledexrtool import mascene
+
+from .helpers import TempDirTestCase
+
+ASSET = '''//Maya ASCII 2018 scene
+requires maya "2018";
+createNode transform -n "pCube1";
+createNode mesh -n "pCubeShape1" -p "pCube1";
+\tsetAttr -k off ".v";
+\tsetAttr -s 8 ".vt[0:7]"  -0.5 -0.5 0.5 0.5 -0.5 0.5 -0.5 0.5 0.5 0.5 0.5
+\t\t0.5 -0.5 0.5 -0.5 0.5 0.5 -0.5 -0.5 -0.5 -0.5 0.5 -0.5 -0.5;
+createNode file -n "skin";
+\tsetAttr ".ftn" -type "string" "{textures}/skin.<UDIM>.tif";
+\tsetAttr ".cs" -type "string" "sRGB";
+\tsetAttr ".uvt" 3;
+createNode file -n "eye";
+\tsetAttr ".ftn" -type "string" "/textures/eye_tiled.exr";
+\taddAttr -ci true -sn "tiledEXR" -ln "tiledEXR" -at "byte";
+\taddAttr -ci true -sn "tiledEXRSource" -ln "tiledEXRSource" -dt "string";
+\tsetAttr ".tiledEXR" 2;
+\tsetAttr ".tiledEXRSource" -type "string" "/textures/eye.tga";
+'''
+
+SHOT = '''//Maya ASCII 2018 scene
+file -rdi 1 -ns "hero" -rfn "heroRN" "{asset}";
+file -rdi 1 -ns "crowd" -rfn "crowdRN" "{asset}";
+file -r -ns "hero" -dr 1 -rfn "heroRN" "{asset}";
+file -r -ns "crowd" -dr 1 -rfn "crowdRN" "{asset}";
+file -r -ns "hero" -rfn "heroRN" "{asset}";
+file -r -ns "crowd" -rfn "crowdRN" "{asset}";
+requires maya "2018";
+createNode file -n "ground";
+\tsetAttr ".fileTextureName" -type "string" "/textures/ground.tga";
+'''
+
+
+class ReadSceneTest(TempDirTestCase):
+    def write_scene(self, name, text):
+        text = text.replace('{textures}', self.path('textures'))
+        return self.write(name, text.encode('utf-8'))
+
+    def test_file_nodes(self):
+        asset = self.write_scene('asset.ma', ASSET)
+        nodes = dict((n.node, n) for n in mascene.read_scene(asset))
+        self.assertEqual(sorted(nodes), ['eye', 'skin'])
+        self.assertEqual(nodes['skin'].fileTextureName,
+                         self.path('textures', 'skin.<UDIM>.tif'))
+        self.assertEqual(nodes['skin'].uvTilingMode, 3)
+        self.assertEqual(nodes['eye'].tiledEXR, 2)
+        self.assertEqual(nodes['eye'].tiledEXRSource, '/textures/eye.tga')
+        self.assertEqual(mascene.model_data([nodes['eye']]),
+                         [(2, 'eye', '/textures/eye_tiled.exr')])
+
+    def test_reference_under_two_namespaces(self):
+        asset = self.write_scene('asset.ma', ASSET)
+        shot = self.write_scene('shot.ma', SHOT.format(asset=asset))
+        names = sorted(n.node for n in mascene.read_scene(shot))
+        self.assertEqual(names, ['crowd:eye', 'crowd:skin', 'ground',
+                                 'hero:eye', 'hero:skin'])
+
+    def test_without_references(self):
+        asset = self.write_scene('asset.ma', ASSET)
+        shot = self.write_scene('shot.ma', SHOT.format(asset=asset))
+        names = [n.node for n in mascene.read_scene(shot, references=False)]
+        self.assertEqual(names, ['ground'])
+
+    def test_reference_loop(self):
+        loop = self.path('loop.ma')
+        self.write_scene('loop.ma', '''file -r -ns "again" "{}";
+createNode file -n "tex";
+'''.format(loop))
+        names = [n.node for n in mascene.read_scene(loop)]
+        self.assertEqual(names, ['tex'])
+
+    def test_conversion_sources_expand_tiles(self):
+        for tile in ('1001', '1002'):
+            self.write(os.path.join('textures', 'skin.{}.tif'.format(tile)))
+        asset = self.write_scene('asset.ma', ASSET)
+        sources = mascene.conversion_sources(mascene.read_scene(asset))
+        self.assertEqual([os.path.basename(s) for s in sources],
+                         ['skin.1001.tif', 'skin.1002.tif'])
+
+
+if __name__ == '__main__':
+    unittest.main()
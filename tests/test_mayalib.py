@@ -0,0 +1,288 @@
+import itertools
+import os
+import unittest
+
+from img2tiledexrtool import stubcmds
+
+stubcmds.install()
+
+from img2tiledexrtool import mayalib  # noqa: E402
+
+from .helpers import TempDirTestCase  # noqa: E402
+
+
+class CollectSourcesTest(TempDirTestCase):
+    def setUp(self):
+        super(CollectSourcesTest, self).setUp()
+        stubcmds.reset()
+        self.a = self.write('a.tga')
+        self.b = self.write('b.tga')
+
+    def test_nodes_sharing_a_texture_are_grouped(self):
+        stubcmds.create_file_node('file1', self.a)
+        stubcmds.create_file_node('file2', self.b, color_space='Raw')
+        stubcmds.create_file_node('file3', self.a, color_space='Raw')
+        sources = mayalib.collect_sources(['file1', 'file2', 'file3'])
+        self.assertEqual(list(sources), [self.a, self.b])
+        self.assertEqual(sources[self.a], [('file1', 'sRGB'),
+                                           ('file3', 'Raw')])
+
+    def test_other_spellings_are_the_same_source(self):
+        stubcmds.create_file_node('file1', self.a)
+        stubcmds.create_file_node('file2', os.path.join(self.root, '.',
+                                                        'a.tga'))
+        sources = mayalib.collect_sources(['file1', 'file2'])
+        self.assertEqual(sources, {self.a: [('file1', 'sRGB'),
+                                            ('file2', 'sRGB')]})
+
+    def test_missing_textures_are_left_out(self):
+        stubcmds.create_file_node('file1', self.path('missing.tga'))
+        self.assertEqual(mayalib.collect_sources(['file1']), {})
+
+    def test_converted_nodes_use_their_stored_source(self):
+        stubcmds.create_file_node('file1', self.path('a_tiled.exr'),
+                                  tiledEXR=2, tiledEXRSource=self.a)
+        self.assertEqual(list(mayalib.collect_sources(['file1'])), [self.a])
+
+    def test_gone_stored_sources_are_replaced_in_one_undo_step(self):
+        for i in range(3):
+            stubcmds.create_file_node('file{}'.format(i), self.b, tiledEXR=1,
+                                      tiledEXRSource=self.path('gone.tga'))
+        stubcmds.calls.clear()
+        sources = mayalib.collect_sources(['file0', 'file1', 'file2'])
+        self.assertEqual(list(sources), [self.b])
+        for i in range(3):
+            self.assertEqual(stubcmds.scene['file{}'.format(i)]['attrs']
+                             ['tiledEXRSource'], self.b)
+        self.assertEqual(stubcmds.calls['setAttr'], 3)
+        self.assertEqual(stubcmds.calls['undoInfo'], 2)
+
+
+class RelinkTest(unittest.TestCase):
+    def setUp(self):
+        stubcmds.reset()
+        for i in range(3):
+            stubcmds.create_file_node('file{}'.format(i),
+                                      '/tex/{}.tga'.format(i))
+
+    def relinks(self, color_space='Raw'):
+        return [('file{}'.format(i), '/tex/{}.tga'.format(i),
+                 '/tex/{}_tiled.exr'.format(i), color_space)
+                for i in range(3)]
+
+    def attrs(self, node):
+        return stubcmds.scene[node]['attrs']
+
+    def test_relinks_in_one_undo_step(self):
+        stubcmds.calls.clear()
+        self.assertEqual(mayalib.relink_nodes(self.relinks(), False, []), 3)
+        attrs = self.attrs('file1')
+        self.assertEqual(attrs['fileTextureName'], '/tex/1_tiled.exr')
+        self.assertEqual(attrs['tiledEXRSource'], '/tex/1.tga')
+        self.assertEqual(attrs['tiledEXR'], 2)
+        self.assertEqual(attrs['colorSpace'], 'sRGB')
+        # one undo chunk, refresh queried, suspended, resumed and redrawn
+        self.assertEqual(stubcmds.calls['undoInfo'], 2)
+        self.assertEqual(stubcmds.calls['refresh'], 4)
+
+    def test_relinked_nodes_are_left_alone(self):
+        mayalib.relink_nodes(self.relinks(), False, [])
+        stubcmds.calls.clear()
+        self.assertEqual(mayalib.relink_nodes(self.relinks(), False, []), 0)
+        self.assertEqual(stubcmds.calls['undoInfo'], 0)
+        self.assertEqual(stubcmds.calls['setAttr'], 0)
+
+    def test_preserves_color_space_of_filtered_files(self):
+        relinks = self.relinks()
+        relinks[2] = ('file2', '/tex/2_nrm.tga', '/tex/2_nrm_tiled.exr',
+                      'Raw')
+        mayalib.relink_nodes(relinks, True, ['_nrm'])
+        self.assertEqual(self.attrs('file1')['colorSpace'], 'sRGB')
+        self.assertEqual(self.attrs('file2')['colorSpace'], 'Raw')
+
+
+class FakeNode(object):
+    """MObject of a node, renamed by setting name"""
+    def __init__(self, name, file_texture=True):
+        self.name = name
+        self.file_texture = file_texture
+
+    def hasFn(self, kind):
+        return self.file_texture and kind == FakeOpenMaya.MFn.kFileTexture
+
+
+class FakePlug(object):
+    def __init__(self, node, attr):
+        self._node = node
+        self.attr = attr
+
+    def node(self):
+        return self._node
+
+    def partialName(self, useLongNames=False):
+        return self.attr
+
+
+class FakeOpenMaya(object):
+    """Just enough of maya.api.OpenMaya for SceneWatcher"""
+    class MFn(object):
+        kFileTexture = 'kFileTexture'
+
+    class MObject(object):
+        kNullObj = None
+
+    class MNodeMessage(object):
+        kAttributeSet = 1
+        kAttributeAdded = 2
+        kConnectionMade = 4
+
+    class MObjectHandle(object):
+        def __init__(self, mobject):
+            self.mobject = mobject
+
+        def hashCode(self):
+            return id(self.mobject)
+
+    class MFnDependencyNode(object):
+        def __init__(self, mobject):
+            self.mobject = mobject
+
+        def name(self):
+            return self.mobject.name
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.ids = itertools.count(1)
+        # callback id: (kind, node or None, function)
+        self.callbacks = {}
+        fake = self
+
+        class MDGMessage(object):
+            @staticmethod
+            def addNodeAddedCallback(function, node_type):
+                return fake.add('added', None, function)
+
+            @staticmethod
+            def addNodeRemovedCallback(function, node_type):
+                return fake.add('removed', None, function)
+
+        class MNodeMessage(self.MNodeMessage):
+            @staticmethod
+            def addNameChangedCallback(node, function):
+                return fake.add('renamed', None, function)
+
+            @staticmethod
+            def addAttributeChangedCallback(node, function):
+                return fake.add('attribute', node, function)
+
+        class MMessage(object):
+            @staticmethod
+            def removeCallback(callback_id):
+                del fake.callbacks[callback_id]
+
+            @staticmethod
+            def removeCallbacks(callback_ids):
+                for callback_id in callback_ids:
+                    del fake.callbacks[callback_id]
+
+        class MItDependencyNodes(object):
+            def __init__(self, kind):
+                self.remaining = [n for n in fake.nodes if n.hasFn(kind)]
+
+            def isDone(self):
+                return not self.remaining
+
+            def thisNode(self):
+                return self.remaining[0]
+
+            def next(self):
+                self.remaining.pop(0)
+
+        self.MDGMessage = MDGMessage
+        self.MNodeMessage = MNodeMessage
+        self.MMessage = MMessage
+        self.MItDependencyNodes = MItDependencyNodes
+
+    def add(self, kind, node, function):
+        callback_id = next(self.ids)
+        self.callbacks[callback_id] = (kind, node, function)
+        return callback_id
+
+    def fire(self, kind, node=None, *args):
+        for callback_kind, callback_node, function in \
+                list(self.callbacks.values()):
+            if callback_kind != kind:
+                continue
+            if callback_kind == 'attribute':
+                if callback_node is node:
+                    function(*args)
+            else:
+                function(node, *args)
+
+
+class SceneWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.file1 = FakeNode('file1')
+        self.file2 = FakeNode('file2')
+        self.om = FakeOpenMaya([self.file1, self.file2, FakeNode('mesh1',
+                                                                 False)])
+        self.old_om, mayalib.om = mayalib.om, self.om
+        self.notified = []
+        self.watcher = mayalib.SceneWatcher(lambda: self.notified.append(1))
+        self.watcher.start()
+
+    def tearDown(self):
+        self.watcher.stop()
+        mayalib.om = self.old_om
+
+    def set_attr(self, node, attr, msg=1):
+        self.om.fire('attribute', node, msg, FakePlug(node, attr), None)
+
+    def add(self, name):
+        node = FakeNode(name)
+        self.om.fire('added', node)
+        return node
+
+    def rename(self, node, name):
+        old_name, node.name = node.name, name
+        self.om.fire('renamed', node, old_name)
+
+    def test_watches_the_file_nodes_of_the_scene(self):
+        kinds = sorted(kind for kind, _, _ in self.om.callbacks.values())
+        self.assertEqual(kinds, ['added', 'attribute', 'attribute',
+                                 'removed', 'renamed'])
+        self.watcher.stop()
+        self.assertEqual(self.om.callbacks, {})
+
+    def test_changes_are_coalesced(self):
+        for i in range(3):
+            self.set_attr(self.file1, 'fileTextureName')
+        self.set_attr(self.file1, 'colorSpace')
+        self.set_attr(self.file2, 'tiledEXR', msg=4)
+        file3 = self.add('file3')
+        self.set_attr(file3, 'tiledEXR')
+        self.om.fire('removed', self.file2)
+        self.rename(self.file1, 'skin')
+        self.rename(self.file1, 'skin_color')
+        self.assertEqual(self.watcher.take_changes(),
+                         (set(['file3']), set(['file2']),
+                          {'file1': 'skin_color'},
+                          set(['file1', 'file3'])))
+        # every recorded change asked for one update, the owner coalesces
+        self.assertEqual(len(self.notified), 8)
+        self.assertEqual(self.watcher.take_changes(),
+                         (set(), set(), {}, set()))
+
+    def test_added_then_removed_is_nothing(self):
+        file3 = self.add('file3')
+        self.rename(file3, 'file4')
+        self.set_attr(file3, 'fileTextureName')
+        self.om.fire('removed', file3)
+        self.assertEqual(self.watcher.take_changes(),
+                         (set(), set(), {}, set()))
+        kinds = sorted(kind for kind, _, _ in self.om.callbacks.values())
+        self.assertEqual(kinds.count('attribute'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from img2tiledexrtool import img2tiledexrtool
+
+
+class Job(object):
+    def __init__(self, file_in, priority=img2tiledexrtool.PRIORITY_NORMAL):
+        self.file_in = file_in
+        self.priority = priority
+
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = img2tiledexrtool.JobQueue()
+
+    def put(self, *jobs):
+        for job in jobs:
+            self.queue.put(job)
+
+    def drain(self, count):
+        return [self.queue.get().file_in for _ in range(count)]
+
+    def test_highest_priority_first_then_in_order(self):
+        self.put(Job('a'), Job('b', img2tiledexrtool.PRIORITY_RENDER_LAYER),
+                 Job('c'), Job('d', img2tiledexrtool.PRIORITY_SELECTED),
+                 Job('e', img2tiledexrtool.PRIORITY_RENDER_LAYER))
+        self.assertEqual(self.drain(5), ['d', 'b', 'e', 'a', 'c'])
+
+    def test_stop_comes_after_every_job(self):
+        self.queue.put(None)
+        self.put(Job('a'), Job('b', -100))
+        self.assertEqual(self.drain(2), ['a', 'b'])
+        self.assertIsNone(self.queue.get())
+
+    def test_reprioritize_moves_waiting_jobs_to_the_front(self):
+        self.put(Job('/tex/a.tga'), Job('/tex/b.tga'), Job('/tex/c.tga',
+                 img2tiledexrtool.PRIORITY_SELECTED))
+        self.assertEqual(self.queue.reprioritize(['/tex/b.tga']), 1)
+        self.assertEqual(self.drain(3),
+                         ['/tex/b.tga', '/tex/c.tga', '/tex/a.tga'])
+
+    def test_reprioritize_skips_taken_jobs(self):
+        self.put(Job('/tex/a.tga'), Job('/tex/b.tga'))
+        self.assertEqual(self.drain(1), ['/tex/a.tga'])
+        self.assertEqual(self.queue.reprioritize(['/tex/a.tga'], 5), 0)
+        self.assertEqual(self.queue.reprioritize(['/tex/b.tga'], 5), 1)
+        self.assertEqual(self.drain(1), ['/tex/b.tga'])
+
+    def test_join_waits_for_task_done(self):
+        self.put(Job('a'))
+        self.queue.get()
+        self.assertEqual(self.queue.unfinished, 1)
+        self.queue.task_done()
+        self.queue.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
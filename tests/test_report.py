@@ -0,0 +1,92 @@
+import json
+import unittest
+
+from img2tiledexrtool import img2tiledexrtool
+from img2tiledexrtool import report as batch_report
+
+from .helpers import FakeBackend, TempDirTestCase
+
+
+def result(name, status=None, **metrics):
+    return img2tiledexrtool.ConversionResult(
+        '/tex/{}.tga'.format(name), '/tex/{}_tiled.exr'.format(name), status,
+        **metrics)
+
+
+class ReportTest(unittest.TestCase):
+    def setUp(self):
+        self.report = batch_report.BatchReport(slowest=2)
+        self.report.start(threads=2)
+        for name, seconds in (('a', 1.0), ('b', 3.0), ('c', 2.0)):
+            self.report.add(result(name, convert_time=seconds,
+                                   pixels=2000000, bytes_in=10 ** 9,
+                                   bytes_out=2 * 10 ** 9, queue_wait=0.5))
+        self.report.add(result('d', img2tiledexrtool.STATUS_UP_TO_DATE))
+        self.report.add(result('e', "exploded", convert_time=4.0))
+        # 4 seconds of wall time
+        self.report.start_time -= 4
+        self.report.end_time = self.report.start_time + 4
+
+    def test_summary(self):
+        summary = self.report.summary()
+        self.assertEqual((summary['files'], summary['converted'],
+                          summary['skipped'], summary['failed']),
+                         (5, 3, 1, 1))
+        self.assertEqual(summary['busy_time'], 10.0)
+        self.assertEqual(summary['utilisation'], 10.0 / 8)
+        self.assertEqual(summary['megapixels'], 6.0)
+        self.assertEqual(summary['mp_per_second'], 1.5)
+        self.assertEqual(summary['read_gb_per_second'], 0.75)
+        self.assertEqual(summary['write_gb_per_second'], 1.5)
+        self.assertEqual(summary['convert_time_p50'], 2.0)
+        self.assertEqual(summary['queue_wait_max'], 0.5)
+        self.assertEqual([s['source'] for s in summary['slowest']],
+                         ['/tex/e.tga', '/tex/b.tga'])
+
+    def test_nothing_converted_has_no_rates(self):
+        report = batch_report.BatchReport()
+        report.start(1)
+        report.add(result('a', img2tiledexrtool.STATUS_EXISTS))
+        report.finish()
+        self.assertIsNone(report.summary()['mp_per_second'])
+
+    def test_hooks_get_results_and_the_batch(self):
+        events = []
+        hook = lambda event, data: events.append(event)  # noqa: E731
+        batch_report.add_metrics_hook(hook)
+        try:
+            report = batch_report.BatchReport(
+                hook=lambda event, data: events.append('own ' + event))
+            report.start(1)
+            report.add(result('a'))
+            report.finish()
+            report.finish()
+        finally:
+            batch_report.remove_metrics_hook(hook)
+        self.assertEqual(events, ['result', 'own result', 'batch',
+                                  'own batch'])
+
+
+class ConvertReportTest(TempDirTestCase):
+    def test_conversion_metrics(self):
+        source = self.write('a.tga', b'x' * 300)
+        report = batch_report.BatchReport()
+        img2tiledexrtool.convert_img_2_exr(FakeBackend(), [source],
+                                           report=report)
+        path = self.path('report.json')
+        report.write(path)
+        with open(path) as f:
+            data = json.load(f)
+        self.assertEqual(data['converted'], 1)
+        entry = data['results'][0]
+        self.assertEqual(entry['source'], source)
+        self.assertTrue(entry['ok'])
+        self.assertEqual(entry['attempts'], 1)
+        self.assertEqual(entry['bytes_in'], 300)
+        self.assertEqual(entry['bytes_out'], 1024)
+        self.assertEqual(entry['backend'], 'fake')
+        self.assertIsNotNone(entry['convert_time'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from img2tiledexrtool import stubcmds
+
+stubcmds.install()
+
+from img2tiledexrtool import scenequery  # noqa: E402
+
+
+class QueryFileNodesTest(unittest.TestCase):
+    def setUp(self):
+        stubcmds.build_scene(500, '/textures')
+        stubcmds.create_file_node('converted', '/textures/a_tiled.exr',
+                                  tiledEXR=2, tiledEXRSource='/textures/a.tga')
+
+    def test_values(self):
+        values = scenequery.query_file_nodes(['file1', 'converted'],
+                                             backend='cmds')
+        self.assertEqual(values['file1']['fileTextureName'],
+                         '/textures/texture_000000.tga')
+        self.assertIsNone(values['file1']['tiledEXRSource'])
+        self.assertEqual(values['converted']['tiledEXR'], 2)
+        self.assertEqual(values['converted']['tiledEXRSource'],
+                         '/textures/a.tga')
+
+    def test_calls_per_attribute(self):
+        nodes = stubcmds.ls(type='file')
+        stubcmds.calls.clear()
+        scenequery.query_file_nodes(nodes, backend='cmds')
+        attributes = len(scenequery.FILE_NODE_ATTRIBUTES)
+        # an ls and at most one getAttr per attribute, not per node
+        self.assertLessEqual(sum(stubcmds.calls.values()), attributes * 2)
+
+    def test_set_file_nodes_skips_current_values(self):
+        current = scenequery.query_file_nodes(['converted'], backend='cmds')
+        written = scenequery.set_file_nodes(
+            {'converted': {'tiledEXRSource': '/textures/a.tga',
+                           'tiledEXR': 1}}, current)
+        self.assertEqual(written, 1)
+        self.assertEqual(stubcmds.getAttr('converted.tiledEXR'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
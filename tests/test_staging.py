@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+import unittest
+
+from img2tiledexrtool import img2tiledexrtool
+from img2tiledexrtool import staging as batch_staging
+
+from .helpers import FakeBackend, TempDirTestCase
+
+
+class FailStagedBackend(FakeBackend):
+    """Fails the local copies of the names in fail"""
+    def convert(self, file_in, file_out, options):
+        self.converted.append(file_in)
+        if os.path.basename(file_in).split('_', 1)[1] in self.fail:
+            return "failed on purpose"
+        return super(FailStagedBackend, self).convert(file_in, file_out,
+                                                      options)
+
+
+class StagingTest(TempDirTestCase):
+    def setUp(self):
+        super(StagingTest, self).setUp()
+        self.scratch = self.path('scratch')
+        self.staging = batch_staging.StagingArea(self.scratch, prefetch=2,
+                                                 write_back=1)
+        self.files = [self.write('share/{}.tga'.format(name), b'x' * 500)
+                      for name in 'abc']
+
+    def test_converts_local_copies(self):
+        backend = FakeBackend()
+        results = img2tiledexrtool.convert_img_2_exr(
+            backend, self.files, staging=self.staging)
+        self.assertEqual([r.status for r in results], [None] * 3)
+        for converted in backend.converted:
+            self.assertTrue(converted.startswith(self.scratch))
+        options = img2tiledexrtool.conversion_options()
+        for result in results:
+            self.assertIsNotNone(result.stage_in_time)
+            self.assertIsNotNone(result.stage_out_time)
+            self.assertEqual(result.bytes_out, 1024)
+            self.assertFalse(img2tiledexrtool.is_stale(
+                result.file_in, result.file_out, options))
+            manifest = img2tiledexrtool.read_manifest(result.file_out)
+            self.assertEqual(manifest['source']['path'], result.file_in)
+        # the batch's directory is gone
+        self.assertEqual(os.listdir(self.scratch), [])
+
+    def test_failures_write_nothing_back(self):
+        results = img2tiledexrtool.convert_img_2_exr(
+            FailStagedBackend(fail=['b.tga']), self.files,
+            staging=self.staging)
+        statuses = dict((os.path.basename(r.file_in), r.status)
+                        for r in results)
+        self.assertEqual(statuses['b.tga'], "failed on purpose")
+        self.assertEqual(sorted(os.listdir(self.path('share'))),
+                         ['a.tga', 'a_tiled.exr', 'a_tiled.exr.manifest.json',
+                          'b.tga', 'c.tga', 'c_tiled.exr',
+                          'c_tiled.exr.manifest.json'])
+
+    def test_existing_exrs_are_not_staged(self):
+        img2tiledexrtool.convert_img_2_exr(FakeBackend(), self.files[:1])
+        backend = FakeBackend()
+        results = img2tiledexrtool.convert_img_2_exr(
+            backend, self.files, staging=self.staging)
+        self.assertEqual(sorted(r.status is None for r in results),
+                         [False, True, True])
+        self.assertEqual(len(backend.converted), 2)
+
+
+class ThrottleTest(TempDirTestCase):
+    def test_copy_keeps_mtime(self):
+        src = self.write('a.tga', b'x' * 3000)
+        os.utime(src, (1500000000, 1500000000))
+        throttle = batch_staging.VolumeThrottle(block_size=1024)
+        self.assertTrue(throttle.copy(src, self.path('b.tga'), src))
+        self.assertEqual(os.path.getmtime(self.path('b.tga')), 1500000000)
+        with open(self.path('b.tga'), 'rb') as f:
+            self.assertEqual(f.read(), b'x' * 3000)
+
+    def test_bandwidth(self):
+        src = self.write('a.tga', b'x' * 4096)
+        throttle = batch_staging.VolumeThrottle(bytes_per_second=10240,
+                                                block_size=1024)
+        start = time.time()
+        throttle.copy(src, self.path('b.tga'), src)
+        # the first block goes right away, three wait 0.1s each
+        self.assertGreaterEqual(time.time() - start, 0.25)
+
+    def test_cancelled_copy(self):
+        src = self.write('a.tga')
+        cancel_event = threading.Event()
+        cancel_event.set()
+        throttle = batch_staging.VolumeThrottle()
+        self.assertFalse(throttle.copy(src, self.path('b.tga'), src,
+                                       cancel_event))
+
+    def test_transfers_per_volume(self):
+        throttle = batch_staging.VolumeThrottle(transfers=1)
+        self.assertEqual(throttle.volume(self.path('a.tga')),
+                         throttle.volume(self.path('sub', 'b.tga')))
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with throttle.slot(self.path('a.tga')):
+                held.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait(5)
+        volume = throttle.volume(self.path('a.tga'))
+        self.assertFalse(throttle.slots[volume].acquire(False))
+        release.set()
+        thread.join(5)
+        self.assertTrue(throttle.slots[volume].acquire(False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import time
+import unittest
+
+from img2tiledexrtool import img2tiledexrtool
+from img2tiledexrtool import store as conversion_store
+
+from .helpers import FakeBackend, TempDirTestCase, write_file
+
+
+class StoreTest(TempDirTestCase):
+    def setUp(self):
+        super(StoreTest, self).setUp()
+        self.store = conversion_store.ConversionStore(self.path('store'))
+
+    def tearDown(self):
+        self.store.close()
+        super(StoreTest, self).tearDown()
+
+    def convert(self, files, backend=None):
+        backend = backend or FakeBackend()
+        results = img2tiledexrtool.convert_img_2_exr(
+            backend, files, store=self.store, overwrite=False)
+        return dict((os.path.basename(r.file_in), r.status) for r in results)
+
+    def test_same_content_is_converted_once(self):
+        a = self.write('shot1/a.tga', b'same pixels')
+        b = self.write('shot2/a.tga', b'same pixels')
+        self.assertEqual(self.convert([a]), {'a.tga': None})
+        backend = FakeBackend()
+        results = self.convert([b], backend)
+        self.assertEqual(results, {'a.tga': img2tiledexrtool.STATUS_STORED})
+        self.assertEqual(backend.converted, [])
+        self.assertTrue(os.path.isfile(self.path('shot2', 'a_tiled.exr')))
+        self.assertFalse(img2tiledexrtool.is_stale(
+            b, self.path('shot2', 'a_tiled.exr'),
+            img2tiledexrtool.conversion_options()))
+
+    def test_other_options_miss(self):
+        source = self.write('a.tga')
+        self.convert([source])
+        source_hash = self.store.source_hash(source)
+        options = img2tiledexrtool.conversion_options()
+        self.assertIsNotNone(self.store.lookup(source_hash, options))
+        options['tile_size'] = 32
+        self.assertIsNone(self.store.lookup(source_hash, options))
+
+    def test_object_path_comes_from_the_key(self):
+        source = self.write('a.tga')
+        self.convert([source])
+        source_hash = self.store.source_hash(source)
+        options = img2tiledexrtool.conversion_options()
+        key = conversion_store.store_key(source_hash, options)
+        # a row written on windows
+        with self.store.db:
+            self.store.db.execute(
+                'UPDATE objects SET path = ?',
+                ('objects\\{}\\{}.exr'.format(key[:2], key),))
+        self.assertEqual(self.store.lookup(source_hash, options),
+                         self.store.object_path(key))
+        self.assertEqual(self.store.gc()['orphans'], 0)
+
+    def test_source_hash_is_cached(self):
+        source = self.write('a.tga', b'one')
+        first = self.store.source_hash(source)
+        self.assertEqual(self.store.source_hash(source), first)
+        write_file(source, b'other')
+        os.utime(source, (0, 0))
+        self.assertNotEqual(self.store.source_hash(source), first)
+
+    def test_evicts_least_recently_used(self):
+        files = [self.write('{}.tga'.format(name), name.encode('ascii'))
+                 for name in 'abc']
+        self.convert(files)
+        options = img2tiledexrtool.conversion_options()
+        # b was used longest ago
+        for last_used, source in enumerate((files[1], files[2], files[0])):
+            with self.store.db:
+                self.store.db.execute(
+                    'UPDATE objects SET last_used = ? WHERE source_hash = ?',
+                    (last_used, self.store.source_hash(source)))
+        size = self.store.size()
+        self.assertEqual(self.store.evict(size - 1), 1)
+        self.assertIsNone(self.store.lookup(
+            self.store.source_hash(files[1]), options))
+        self.assertIsNotNone(self.store.lookup(
+            self.store.source_hash(files[0]), options))
+
+    def test_gc_removes_missing_and_orphans(self):
+        files = [self.write('a.tga', b'a'), self.write('b.tga', b'b')]
+        self.convert(files)
+        options = img2tiledexrtool.conversion_options()
+        key = conversion_store.store_key(self.store.source_hash(files[0]),
+                                         options)
+        os.remove(self.store.object_path(key))
+        orphan = write_file(self.store.object_path('ff' + 'f' * 38))
+        # an exr without a row yet may be being added elsewhere
+        result = self.store.gc()
+        self.assertEqual((result['missing'], result['orphans']), (1, 0))
+        self.assertTrue(os.path.isfile(orphan))
+        old = time.time() - conversion_store.TEMP_AGE - 10
+        os.utime(orphan, (old, old))
+        result = self.store.gc()
+        self.assertEqual(result['orphans'], 1)
+        self.assertFalse(os.path.isfile(orphan))
+        self.assertEqual(self.store.stats()['objects'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import unittest
+
+from img2tiledexrtool import tuning
+
+from .helpers import FakeBackend, TempDirTestCase
+
+
+def measurement(compression, tile_size, output_bytes, read_time=1.0,
+                encode_time=1.0, texture_class='NORMAL', failed=0):
+    return tuning.Measurement(texture_class, compression, tile_size, 2,
+                              4000, encode_time, output_bytes, read_time,
+                              failed)
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_longest_class_wins(self):
+        self.assertEqual(tuning.classify('/tex/rock_NORMALS.tif'), 'NORMALS')
+        self.assertEqual(tuning.classify('/tex/rock_normal.tif'), 'NORMAL')
+        self.assertEqual(tuning.classify('/tex/rock_ao.tif'), 'AO')
+        self.assertEqual(tuning.classify('/tex/rock_CLR.tif'),
+                         tuning.OTHER_CLASS)
+        self.assertEqual(tuning.classify('/tex/rock_CLR.tif', ['CLR']), 'CLR')
+
+
+class SampleTest(TempDirTestCase):
+    def test_sample_is_repeatable(self):
+        files = [self.write('rock{}_NORMAL.tga'.format(i)) for i in range(6)]
+        files.append(self.write('rock_CLR.tga'))
+        samples = tuning.sample_textures(files + [self.path('gone.tga')],
+                                         per_class=2, seed=3)
+        self.assertEqual(list(samples), ['NORMAL', tuning.OTHER_CLASS])
+        self.assertEqual(len(samples['NORMAL']), 2)
+        self.assertEqual(samples[tuning.OTHER_CLASS], [files[-1]])
+        self.assertEqual(tuning.sample_textures(files, per_class=2, seed=3),
+                         samples)
+
+
+class RecommendTest(unittest.TestCase):
+    def test_smallest_wins_when_equally_fast(self):
+        best = tuning.recommend([measurement('zip', 64, 1500),
+                                 measurement('zips', 64, 1000),
+                                 measurement('piz', 64, 1200)])
+        self.assertEqual(best['NORMAL']['compression'], 'zips')
+        self.assertEqual(best['NORMAL']['score'], 2.25)
+
+    def test_weights(self):
+        measurements = [measurement('zips', 64, 1000, read_time=3.0),
+                        measurement('zips', 128, 1100, read_time=1.0)]
+        self.assertEqual(tuning.recommend(measurements)['NORMAL']['tile_size'],
+                         128)
+        self.assertEqual(tuning.recommend(measurements, {'read': 0.0})
+                         ['NORMAL']['tile_size'], 64)
+
+    def test_lossy_and_failed_are_left_out(self):
+        measurements = [measurement('zip', 64, 1500),
+                        measurement('dwaa', 64, 300),
+                        measurement('zips', 64, 1000, failed=1)]
+        self.assertEqual(tuning.recommend(measurements)['NORMAL']
+                         ['compression'], 'zip')
+        self.assertEqual(tuning.recommend(measurements, allow_lossy=True)
+                         ['NORMAL']['compression'], 'dwaa')
+
+
+class TuneTest(TempDirTestCase):
+    def test_measures_every_combination(self):
+        files = [self.write('rock_NORMAL.tga', b'x' * 4096),
+                 self.write('rock_CLR.tga', b'x' * 2048)]
+        workdir = self.path('scratch')
+        measurements = tuning.tune(FakeBackend(), files,
+                                   compressions=('zip', 'piz'),
+                                   tile_sizes=(32, 64), workdir=workdir)
+        self.assertEqual(len(measurements), 8)
+        for m in measurements:
+            self.assertEqual((m.files, m.failed), (1, 0))
+            self.assertEqual(m.output_bytes, 1024)
+        # the exrs are removed once measured
+        self.assertEqual(os.listdir(workdir), [])
+        table = tuning.format_table(measurements,
+                                    tuning.recommend(measurements))
+        self.assertEqual(len(table.splitlines()), 9)
+        self.assertEqual(len([l for l in table.splitlines()
+                              if l.endswith('*')]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
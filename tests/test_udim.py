@@ -0,0 +1,86 @@
+import os
+import unittest
+
+from img2tiledexrtool import udim
+
+from .helpers import TempDirTestCase
+
+
+class PatternTest(unittest.TestCase):
+    def test_node_pattern(self):
+        self.assertEqual(udim.node_pattern('/tex/skin.1001.tif',
+                                           udim.UV_TILING_MARI),
+                         '/tex/skin.<UDIM>.tif')
+        self.assertEqual(udim.node_pattern('/tex/skin_u0_v1.tif',
+                                           udim.UV_TILING_ZBRUSH),
+                         '/tex/skin_u<U>_v<V>.tif')
+        self.assertEqual(udim.node_pattern('/tex/skin_u1_v1.tif',
+                                           udim.UV_TILING_MUDBOX),
+                         '/tex/skin_<UVTILE>.tif')
+        self.assertEqual(udim.node_pattern('/tex/smoke.0012.exr',
+                                           use_frame_extension=True),
+                         '/tex/smoke.<f>.exr')
+        self.assertEqual(udim.node_pattern('/tex/skin.tif'), '/tex/skin.tif')
+
+    def test_pattern_regex(self):
+        regex = udim.pattern_regex('/tex/skin.<UDIM>.tif')
+        self.assertTrue(regex.match('skin.1001.tif'))
+        self.assertTrue(regex.match('skin.1999.tif'))
+        self.assertFalse(regex.match('skin.0001.tif'))
+        self.assertFalse(regex.match('skin.1001_tiled.exr'))
+
+    def test_is_pattern(self):
+        self.assertTrue(udim.is_pattern('skin.<UDIM>.tif'))
+        self.assertTrue(udim.is_pattern('smoke.####.exr'))
+        self.assertFalse(udim.is_pattern('skin.1001.tif'))
+
+
+class ExpandTest(TempDirTestCase):
+    def setUp(self):
+        super(ExpandTest, self).setUp()
+        for name in ('skin.1001.tif', 'skin.1002.tif', 'skin.1001_tiled.exr',
+                     'eye.tif'):
+            self.write(name)
+
+    def test_expand_pattern(self):
+        files = udim.expand_pattern(self.path('skin.<UDIM>.tif'))
+        self.assertEqual(files, [self.path('skin.1001.tif'),
+                                 self.path('skin.1002.tif')])
+        self.assertEqual(udim.expand_pattern(self.path('missing.<UDIM>.tif')),
+                         [])
+        self.assertTrue(udim.exists(self.path('eye.tif')))
+
+    def test_tile_groups_finish_when_all_tiles_are_done(self):
+        pattern = self.path('skin.<UDIM>.tif')
+        groups = udim.TileGroups([pattern, self.path('eye.tif')])
+        self.assertEqual(len(groups.files), 3)
+        self.assertEqual(groups.finish(self.path('skin.1001.tif'), None), [])
+        self.assertEqual(groups.finish(self.path('skin.1002.tif'), 'failed'),
+                         [(pattern, 'failed')])
+        self.assertEqual(groups.finish(self.path('eye.tif'), None),
+                         [(self.path('eye.tif'), None)])
+
+    def test_tile_groups_shared_file(self):
+        pattern = self.path('skin.<UDIM>.tif')
+        single = self.path('skin.1001.tif')
+        groups = udim.TileGroups([pattern, single])
+        self.assertEqual(groups.files[single], [pattern, single])
+        self.assertEqual(groups.finish(single, None), [(single, None)])
+        self.assertEqual(groups.finish(self.path('skin.1002.tif'), None),
+                         [(pattern, None)])
+
+    def test_tile_groups_other_spellings(self):
+        pattern = self.path('skin.<UDIM>.tif')
+        single = os.path.join(self.root, '.', 'skin.1001.tif')
+        groups = udim.TileGroups([pattern, single])
+        # one file to convert, spelled like the pattern expanded it
+        self.assertEqual(list(groups.files), [self.path('skin.1001.tif'),
+                                              self.path('skin.1002.tif')])
+        self.assertEqual(groups.sources(single), [pattern, single])
+        self.assertEqual(groups.finish(self.path('skin.1002.tif'), None), [])
+        self.assertEqual(groups.finish(single, None),
+                         [(pattern, None), (single, None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
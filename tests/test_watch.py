@@ -0,0 +1,100 @@
+import os
+import threading
+import unittest
+
+from img2tiledexrtool import watch
+
+from .helpers import TempDirTestCase, write_file
+
+
+class SourceMatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.matcher = watch.SourceMatcher(['/tex/skin.<UDIM>.tif',
+                                            '/tex/eye.tif',
+                                            '/other/leaf.tga'])
+
+    def test_files_and_patterns(self):
+        self.assertEqual(self.matcher.match('/tex/skin.1002.tif'),
+                         '/tex/skin.<UDIM>.tif')
+        self.assertEqual(self.matcher.match('/tex/eye.tif'), '/tex/eye.tif')
+        self.assertIsNone(self.matcher.match('/tex/skin.tif'))
+        self.assertIsNone(self.matcher.match('/other/skin.1002.tif'))
+
+    def test_directories(self):
+        self.assertEqual(self.matcher.directories(),
+                         sorted(os.path.normcase(os.path.abspath(d))
+                                for d in ('/tex', '/other')))
+
+
+class SnapshotTest(TempDirTestCase):
+    def test_only_sources(self):
+        for name in ('a.tga', 'a_tiled.exr', 'a.1234abcd.converting.exr',
+                     'notes.txt', 'sub/b.png'):
+            self.write(name)
+        self.assertEqual(sorted(watch.snapshot(self.root)),
+                         [self.path('a.tga')])
+        self.assertEqual(sorted(watch.snapshot(self.root, recursive=True)),
+                         [self.path('a.tga'), self.path('sub', 'b.png')])
+        self.assertEqual(watch.snapshot(self.path('missing')), {})
+
+
+class SourceWatcherTest(TempDirTestCase):
+    def watcher(self, callback=None, **kwargs):
+        return watch.SourceWatcher(callback or (lambda changed: None),
+                                   [self.root], use_inotify=False, **kwargs)
+
+    def test_reports_changes_after_the_first_poll(self):
+        self.write('a.tga')
+        watcher = self.watcher(debounce=0)
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.poll(), [])
+        write_file(self.path('a.tga'), b'changed')
+        self.write('b.tga')
+        self.assertEqual(watcher.poll(),
+                         [self.path('a.tga'), self.path('b.tga')])
+        self.assertEqual(watcher.poll(), [])
+
+    def test_waits_until_a_file_settles(self):
+        watcher = self.watcher(debounce=60)
+        watcher.poll()
+        path = self.write('a.tga')
+        self.assertEqual(watcher.poll(), [])
+        write_file(path, b'more of it')
+        self.assertEqual(watcher.poll(), [])
+        # a minute passed since it last changed
+        stat, since = watcher.pending[path]
+        watcher.pending[path] = (stat, since - 60)
+        self.assertEqual(watcher.poll(), [path])
+
+    def test_deleted_before_settling(self):
+        watcher = self.watcher(debounce=60)
+        watcher.poll()
+        path = self.write('a.tga')
+        watcher.poll()
+        os.remove(path)
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.pending, {})
+
+    def test_thread_calls_back(self):
+        changes = []
+        called = threading.Event()
+
+        def callback(changed):
+            changes.append(changed)
+            called.set()
+
+        watcher = self.watcher(callback, interval=0.05, debounce=0)
+        watcher.poll()
+        watcher.start()
+        try:
+            self.write('a.tga')
+            self.assertTrue(called.wait(5))
+        finally:
+            watcher.stop()
+            watcher.join(5)
+        self.assertEqual(changes, [[self.path('a.tga')]])
+        self.assertFalse(watcher.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()